@@ -6,225 +6,450 @@ Inspired by classic games like Zork
 Enhanced version with expanded cave system and descriptive room names
 """
 
-import random
-
-import random
+import json
+import os
 import time
+from collections import ChainMap
+from collections.abc import Mapping
+from types import MappingProxyType
 
-class Room:
-    """Represents a room in the adventure game"""
-    def __init__(self, name, description, exits=None, items=None):
+import metrics
+from cavemap import VIEW_COLUMNS, VIEW_ROWS, MapLayout, MapView
+from dice import RollStream
+from items import GUANO, ITEMS, AmbiguousItemError, Inventory
+from output import CONSOLE, ConsoleOutput
+from routes import RouteIndex, find_path
+from rules import STANDARD_RULES
+
+# Rooms searched at most by one 'travel' in a generated world
+PATH_SEARCH_LIMIT = 20000
+
+class RoomTemplate:
+    """The static, shared part of a room: name, description, exits and starting items
+
+    description may be given as a (buffer, start, end) reference into a
+    compiled world file, in which case it is decoded on first use.
+    """
+    __slots__ = ('key', 'name', '_description', 'exits', 'items', '_rendered')
+    
+    def __init__(self, name, description, exits=None, items=None, key=None):
+        self.key = key
         self.name = name
-        self.description = description
-        self.exits = exits if exits else {}
-        self.items = items if items else []
+        self._description = description
+        self.exits = MappingProxyType(dict(exits) if exits else {})
+        self.items = ITEMS.names(items) if items else ()
+        self._rendered = None
+    
+    @property
+    def description(self):
+        text = self._description
+        if text.__class__ is tuple:
+            data, start, end = text
+            text = self._description = str(data[start:end], 'utf-8')
+        return text
+
+
+def _render_plain(template, items):
+    lines = [f"\n{template.name}", "=" * len(template.name), template.description]
+    if items:
+        lines.append(f"\nYou see: {', '.join(items)}")
+    if template.exits:
+        lines.append(f"\nExits: {', '.join(template.exits.keys())}")
+    return "\n".join(lines)
+
+
+def _render_ansi(template, items):
+    lines = [f"\n\x1b[1;36m{template.name}\x1b[0m", "=" * len(template.name), template.description]
+    if items:
+        lines.append(f"\nYou see: \x1b[33m{', '.join(items)}\x1b[0m")
+    if template.exits:
+        lines.append(f"\nExits: \x1b[32m{', '.join(template.exits.keys())}\x1b[0m")
+    return "\n".join(lines)
+
+
+def _render_json(template, items):
+    return json.dumps({'room': template.key, 'name': template.name, 'description': template.description,
+                       'items': list(items), 'exits': list(template.exits)})
+
+
+# Output style -> function rendering a room's description from (template, items)
+ROOM_STYLES = {'plain': _render_plain, 'ansi': _render_ansi, 'json': _render_json}
+
+
+class Room:
+    """Represents a room in the adventure game
+
+    A Room pairs a shared RoomTemplate with the items currently in it.
+    Rooms that have never changed are shared between games and hold their
+    items as a tuple; Game.own_room() makes a private copy with a list.
+
+    Rendered descriptions are cached per output style: on the template for
+    shared rooms, on the room itself once it has its own items. Change
+    items through remove_item() so the cache is dropped; a cache made
+    before World.set_exit() replaced the exits is ignored.
+    """
+    __slots__ = ('template', 'items', '_rendered')
+    
+    def __init__(self, template, items=None):
+        self.template = template
+        self.items = items if items is not None else template.items
+        self._rendered = None
+    
+    @property
+    def key(self):
+        return self.template.key
+    
+    @property
+    def name(self):
+        return self.template.name
+    
+    @property
+    def description(self):
+        return self.template.description
+    
+    @property
+    def exits(self):
+        return self.template.exits
+    
+    @property
+    def shared(self):
+        return isinstance(self.items, tuple)
+    
+    def remove_item(self, item):
+        """Remove an item from this (owned) room"""
+        self.items.remove(item)
+        self._rendered = None
+    
+    def render(self, style='plain'):
+        """Return the room description in an output style, rendering it on first use"""
+        template = self.template
+        owner = template if self.items is template.items else self
+        cache = owner._rendered
+        if cache is None or cache[0] is not template.exits:
+            cache = owner._rendered = (template.exits, {})
+        text = cache[1].get(style)
+        if text is None:
+            text = cache[1][style] = ROOM_STYLES[style](template, self.items)
+        return text
+    
+    def describe(self, output=CONSOLE):
+        """Write the room description to an output sink"""
+        if output.text:
+            output.write_rendered(self.render(output.style))
+
+
+class RoomTable(Mapping):
+    """Room templates by key, each with a stable room number
+
+    This version holds every template in memory. Compiled world files use
+    a subclass that looks rooms up in the file and decodes them on demand.
+    Tables of generated rooms set lazy: visiting every room would build
+    them all, so nothing should iterate over them.
+    """
+    lazy = False
+    
+    def __init__(self, templates):
+        self._templates = dict(templates)
+        for key, template in self._templates.items():
+            template.key = key
+        self._keys = tuple(self._templates)
+        self._index = {key: i for i, key in enumerate(self._keys)}
+    
+    def __getitem__(self, key):
+        return self._templates[key]
+    
+    def __iter__(self):
+        return iter(self._keys)
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def key_at(self, index):
+        """Return the key of room number index"""
+        return self._keys[index]
+    
+    def index_of(self, key):
+        """Return the room number of key"""
+        return self._index[key]
+    
+    def exits_of(self, key):
+        """Return the exits of a room"""
+        return self[key].exits
     
-    def describe(self):
-        """Print the room description"""
-        print(f"\n{self.name}")
-        print("=" * len(self.name))
-        print(self.description)
+    def layout(self, start):
+        """Return a MapLayout placing these rooms on a grid around start"""
+        return MapLayout(self, start)
+
+
+class SharedRooms(dict):
+    """The pristine Room objects shared by every game, created on first lookup
+
+    Only rooms that have been looked up are stored; iterate the world's
+    templates to visit every room.
+    """
+    def __init__(self, templates):
+        super().__init__()
+        self.templates = templates
+    
+    def __missing__(self, key):
+        room = self[key] = Room(self.templates[key])
+        return room
+
+
+class World:
+    """The shared, read-only cave: room templates, special-room roles and shared rooms
+
+    roles maps what a room does in the game to its key:
+        trap       entering it kills the player
+        bat        entering it starts the bat fight until the bat is defeated
+        lair       entering it starts the guardian fight
+        lair_back  entering it starts the guardian fight with a surprise attack
+        lair_exit  where retreating from the guardian leads
+        bat_exit   where retreating from the bat leads
+    """
+    __slots__ = ('templates', 'rooms', 'start', 'roles', '_routes', '_names', '_layout')
+    
+    def __init__(self, templates, start, roles=None, rooms=None):
+        if not isinstance(templates, RoomTable):
+            templates = RoomTable(templates)
+        self.templates = templates
+        self.rooms = rooms if rooms is not None else SharedRooms(templates)
+        self.start = start
+        self.roles = MappingProxyType(dict(roles) if roles else {})
+        self._routes = None
+        self._names = None
+        self._layout = None
+    
+    def routes(self):
+        """Return the RouteIndex over this world's exits, building it on first use"""
+        if self.templates.lazy:
+            raise ValueError("Generated worlds have no route index; use World.path()")
+        if self._routes is None:
+            self._routes = RouteIndex({key: t.exits for key, t in self.templates.items()})
+        return self._routes
+    
+    def path(self, source, destination):
+        """Return the directions of a shortest path between two rooms, or None
+
+        Generated worlds are searched from source outwards, without
+        generating any room, and only up to PATH_SEARCH_LIMIT rooms away.
+        """
+        if self.templates.lazy:
+            return find_path(self.templates.exits_of, source, destination, PATH_SEARCH_LIMIT)
+        return self.routes().path(source, destination)
+    
+    def layout(self):
+        """Return the map layout of this world, computing it on first use"""
+        if self._layout is None:
+            self._layout = self.templates.layout(self.start)
+        return self._layout
+    
+    def set_exit(self, key, direction, target):
+        """Add, change or (with target None) remove an exit in every game"""
+        template = self.templates[key]
+        exits = dict(template.exits)
+        if target is None:
+            exits.pop(direction, None)
+        else:
+            exits[direction] = target
+        template.exits = MappingProxyType(exits)
+        if self._routes is not None:
+            self._routes.set_exit(key, direction, target)
+        self._layout = None
+    
+    def find_room(self, text):
+        """Return the key of the room best matching a name typed by the player
+
+        Accepts room keys or names, with or without a leading "the", and
+        any unambiguous part of a name starting at a word ("shrine",
+        "stalac"). Generated worlds only accept keys: their names repeat,
+        and indexing them would generate every room.
+        """
+        key = '_'.join(text.lower().split())
+        if key in self.templates:
+            return key
+        if self.templates.lazy:
+            return None
+        if self._names is None:
+            self._names = {}
+            for key, template in self.templates.items():
+                for name in (key.replace('_', ' '), template.name.lower()):
+                    name = name.replace("'", "").replace("(", "").replace(")", "")
+                    self._names[name] = key
+                    if name.startswith('the '):
+                        self._names[name[4:]] = key
         
-        if self.items:
-            print(f"\nYou see: {', '.join(self.items)}")
+        text = ' '.join(text.lower().replace("'", "").replace('_', ' ').split())
+        if text in self._names:
+            return self._names[text]
+        matches = {key for name, key in self._names.items() if (' ' + name).find(' ' + text) >= 0}
+        return matches.pop() if len(matches) == 1 else None
+
+
+
+DEFAULT_WORLD = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'caves.json')
+
+_worlds = {}
+
+
+def get_world(path=None):
+    """Return the shared world loaded from path (the standard cave by default)
+
+    Each world file is loaded once per process and shared by every game.
+    Files ending in .cave are compiled world files; anything else is read
+    as JSON.
+    """
+    path = path or DEFAULT_WORLD
+    world = _worlds.get(path)
+    if world is None:
+        from worldfile import load_world
+        world = _worlds[path] = load_world(path)
+    return world
+
+
+# Argument grammars understood by Command
+NO_ARGS, ONE_WORD, REST_OF_LINE = range(3)
+
+
+class Command:
+    """A registered verb: its handler and the grammar of its arguments"""
+    __slots__ = ('handler', 'grammar', 'missing', 'args', 'prefixes', 'kind', 'required')
+    
+    def __init__(self, handler, grammar="", missing=None, args=()):
+        self.handler = handler
+        self.grammar = grammar
+        self.missing = missing
+        self.args = tuple(args)
+        self.prefixes = frozenset()
+        self.kind = NO_ARGS
+        self.required = False
         
-        if self.exits:
-            print(f"\nExits: {', '.join(self.exits.keys())}")
+        for token in grammar.split():
+            optional = token.startswith('[')
+            token = token.strip('[]')
+            if token.startswith('<'):
+                self.kind = REST_OF_LINE if token.endswith('...>') else ONE_WORD
+                self.required = not optional
+            else:
+                self.prefixes = frozenset(token.split('|'))
+    
+    def run(self, game, parts):
+        """Parse the words after the verb and call the handler"""
+        if self.kind == NO_ARGS:
+            self.handler(game, *self.args)
+            return
+        
+        words = parts[1:]
+        if words and words[0] in self.prefixes:
+            # A leading "with"/"using" must be followed by an argument
+            words = words[1:]
+            if not words:
+                game.say(self.missing)
+                return
+        
+        if not words:
+            if self.required:
+                game.say(self.missing)
+            else:
+                self.handler(game, *self.args)
+        elif self.kind == ONE_WORD:
+            self.handler(game, *self.args, words[0])
+        else:
+            self.handler(game, *self.args, ' '.join(words))
 
 
 class Game:
     """Main game class"""
-    def __init__(self):
+    __slots__ = ('output', 'rng', 'rules', 'world', 'current_room', 'inventory', 'rooms', 'running',
+                 'player_hp', 'player_max_hp', 'guardian_hp', 'bat_hp', 'has_shield',
+                 'in_combat', 'combat_enemy', 'surprised_guardian', 'bat_defeated',
+                 'visited', 'map_view', 'operator')
+    
+    # Verb/alias -> Command, filled in by register_command()
+    commands = {}
+    # Extra commands only operators may use
+    operator_commands = {}
+    
+    def __init__(self, output=None, rng=None, world=None, rules=None, operator=False):
+        self.output = output if output is not None else CONSOLE
+        self.operator = operator
+        self.rng = rng if rng is not None else RollStream()
+        self.rules = rules if rules is not None else STANDARD_RULES
         self.current_room = None
-        self.inventory = []
-        self.rooms = {}
+        self.inventory = Inventory()
+        self.world = world
+        self.rooms = None
         self.running = True
-        self.player_hp = 10
-        self.player_max_hp = 10
-        self.guardian_hp = 20
-        self.bat_hp = 5
+        self.player_hp = self.rules.player_hp
+        self.player_max_hp = self.rules.player_hp
         self.has_shield = False
         self.in_combat = False
         self.combat_enemy = None
         self.surprised_guardian = False
-        self.bat_defeated = False
+        self.map_view = None
+        self.setup_enemies()
         self.setup_rooms()
     
+    def say(self, message="", *args):
+        """Send a line of text to the output sink
+
+        Arguments are only formatted into the message if the sink displays
+        text, so headless sinks pay nothing for it.
+        """
+        if self.output.text:
+            self.output.write(message, args)
+    
+    def emit(self, kind, **data):
+        """Send a structured game event to the output sink"""
+        if self.output.events:
+            self.output.event(kind, data)
+    
+    def setup_enemies(self):
+        """Give the guardian and the bat their full strength"""
+        self.guardian_hp = self.rules.guardian_hp
+        self.bat_hp = self.rules.bat_hp
+        self.bat_defeated = False
+    
+    def item_damage(self, name):
+        """Return the damage range of attacking with an item, or None if it is no weapon"""
+        return ITEMS[name].damage_for(self.rules)
+    
+    def item_hp_bonus(self, name):
+        """Return the maximum HP gained by taking an item"""
+        return ITEMS[name].hp_bonus_for(self.rules)
+    
     def setup_rooms(self):
-        """Initialize all game rooms"""
-        
-        # ===== ORIGINAL 5 ROOMS (Enhanced) =====
-        
-        # Room 1: Cave Entrance -> The Swallow's Nest
-        self.rooms['swallows_nest'] = Room(
-            "The Swallow's Nest",
-            "The cave entrance is damp and smells bad from the swallows that inhabit the entrance. "
-            "Their nests cling to the rocky ceiling above, and the sound of chirping echoes through "
-            "the passage. Bird droppings coat the ground, and you step carefully to avoid them. "
-            "A cold draft flows from deeper within the cave.",
-            {"north": "the_arsenal", "east": "echoing_chamber", "west": "crystal_pool"}
-        )
-        
-        # Room 2: Dark Room with Dagger -> The Arsenal
-        self.rooms['the_arsenal'] = Room(
-            "The Arsenal",
-            "You are in a dark room. The walls are cold and slick with moisture. As your eyes adjust, "
-            "you notice ancient weapon racks along the walls, most of them empty and rusted with age. "
-            "This must have been an armory long ago, perhaps used by those who once defended the cave. "
-            "Broken shields and shattered sword fragments litter the corners.",
-            {"east": "warning_chamber", "south": "swallows_nest", "west": "forgotten_shrine"},
-            ["shiny dagger"]
-        )
-        
-        # Room 3: Bright Room with Sign -> The Warning Chamber
-        self.rooms['warning_chamber'] = Room(
-            "The Warning Chamber",
-            "A bright room illuminated by an unknown source - the light seems to emanate from the very "
-            "walls themselves, casting no shadows. A weathered wooden sign has been driven into the "
-            "ground in the center of the room. It reads:\n\n"
-            "  \"If you forget to get it pick go back and get it before heading east,\n"
-            "   go North if you're done with this\"\n\n"
-            "The message is stained with what looks like old blood. The atmosphere feels ominous.",
-            {"west": "the_arsenal", "north": "death_trap", "east": "guardians_lair", "south": "underground_river"}
-        )
-        
-        # Room 4: Poison Gas Trap -> The Death Trap
-        self.rooms['death_trap'] = Room(
-            "The Death Trap",
-            "This room appears empty and unremarkable...",
-            {}
-        )
-        
-        # Room 5: Treasure Room -> The Guardian's Lair
-        self.rooms['guardians_lair'] = Room(
-            "The Guardian's Lair",
-            "A man dressed in ancient armor stands before a massive iron-bound treasure chest. "
-            "His armor is worn but still imposing, and a wicked-looking sword hangs at his side. "
-            "The chest behind him glimmers with the promise of gold. His eyes narrow as you enter, "
-            "and his hand moves to his weapon.\n\n"
-            "He shouts: \"You can't have my gold! I'm going to kill you!\"",
-            {}
-        )
-        
-        # ===== NEW ADDITIONAL ROOMS =====
-        
-        # The Crystal Pool
-        self.rooms['crystal_pool'] = Room(
-            "The Crystal Pool",
-            "A serene underground pool glows with an ethereal blue light. Crystal formations around "
-            "the water's edge refract the light into dancing patterns on the cave walls. The water "
-            "is perfectly still and impossibly clear - you can see ancient coins scattered across "
-            "the bottom, likely offerings from long ago. The air here feels peaceful, almost sacred.",
-            {"east": "swallows_nest", "north": "mushroom_grove"}
-        )
-        
-        # The Mushroom Grove
-        self.rooms['mushroom_grove'] = Room(
-            "The Mushroom Grove",
-            "Bioluminescent mushrooms of various sizes cover every surface - the floor, walls, even "
-            "parts of the ceiling. They cast an eerie green glow throughout the chamber. Some fungi "
-            "are as tall as your knee, others barely the size of your thumb. The air is thick with "
-            "spores, making it slightly difficult to breathe. A faint humming sound emanates from "
-            "the largest mushrooms.",
-            {"south": "crystal_pool", "east": "forgotten_shrine", "north": "bat_colony"}
-        )
-        
-        # The Forgotten Shrine
-        self.rooms['forgotten_shrine'] = Room(
-            "The Forgotten Shrine",
-            "This chamber was clearly built with purpose. A stone altar stands in the center, covered "
-            "with the remains of ancient offerings - dried flowers, rusted coins, and small carved "
-            "figures. Strange symbols are carved into the walls, and a feeling of reverence still "
-            "lingers in the air despite the passage of time. Something metallic glints behind the altar.",
-            {"west": "mushroom_grove", "east": "the_arsenal", "south": "fossil_gallery"},
-            ["ancient shield"]
-        )
-        
-        # The Echoing Chamber
-        self.rooms['echoing_chamber'] = Room(
-            "The Echoing Chamber",
-            "This vast chamber has incredible acoustics. Every footstep, every breath echoes back at "
-            "you multiple times, creating an eerie chorus of sound. The ceiling is so high it "
-            "disappears into darkness above. Strange wind currents whistle through unseen cracks, "
-            "creating haunting moans and whistles.",
-            {"west": "swallows_nest", "north": "stalactite_forest", "south": "fossil_gallery"}
-        )
-        
-        # The Fossil Gallery
-        self.rooms['fossil_gallery'] = Room(
-            "The Fossil Gallery",
-            "The walls here are embedded with countless fossils - ancient sea creatures frozen in "
-            "stone for millions of years. Ammonites spiral in perfect geometric patterns, trilobites "
-            "march across the rock face, and creatures you don't recognize stare out with empty eye "
-            "sockets. This entire cave system must have once been underwater, an ancient seabed now "
-            "lifted high into the mountains.",
-            {"north": "echoing_chamber", "east": "forgotten_shrine"}
-        )
-        
-        # The Stalactite Forest
-        self.rooms['stalactite_forest'] = Room(
-            "The Stalactite Forest",
-            "Massive stalactites hang from the ceiling like stone icicles, some reaching almost to "
-            "the floor to meet their stalagmite counterparts. You weave between these stone pillars "
-            "carefully - some look sharp enough to impale. Water drips steadily from their points, "
-            "each drop adding another microscopic layer of mineral deposits. The formations cast "
-            "strange shadows in your light.",
-            {"south": "echoing_chamber", "east": "bat_colony", "north": "collapsed_tunnel"}
-        )
-        
-        # The Bat Colony
-        self.rooms['bat_colony'] = Room(
-            "The Bat Colony",
-            "Hundreds - no, thousands - of bats hang from the ceiling, their tiny bodies clustered "
-            "together in a writhing mass. They stir restlessly at your presence, and you hear the "
-            "rustle of leathery wings and high-pitched chirping. The floor is thick with guano, and "
-            "the smell is overwhelming. You try to move quietly to avoid disturbing them further.",
-            {"south": "mushroom_grove", "west": "stalactite_forest"}
-        )
-        
-        # The Collapsed Tunnel
-        self.rooms['collapsed_tunnel'] = Room(
-            "The Collapsed Tunnel",
-            "This passage has partially caved in at some point in the distant past. Large boulders "
-            "and rubble block what was once a wider corridor. You can see gaps between the rocks "
-            "where you might be able to squeeze through, but it looks precarious. Dust still hangs "
-            "in the air, disturbed by your arrival. You wonder what lies beyond the rubble... or "
-            "what caused the collapse in the first place. Wait - is that a small opening near the floor?",
-            {"south": "stalactite_forest", "east": "underground_river", "down": "hidden_tunnel"}
-        )
-        
-        # Hidden Tunnel (secret path to Guardian's Lair)
-        self.rooms['hidden_tunnel'] = Room(
-            "The Hidden Tunnel",
-            "You've squeezed through a narrow opening into a cramped, dark tunnel. The passage is barely "
-            "wide enough to crawl through. As you move forward, you notice the tunnel slopes downward and "
-            "curves to the right. You can hear faint sounds ahead - the echo of a voice, perhaps? The air "
-            "feels different here, warmer. You realize this tunnel must lead somewhere important.",
-            {"up": "collapsed_tunnel", "forward": "guardians_lair_back"}
-        )
-        
-        # Guardian's Lair (back entrance)
-        self.rooms['guardians_lair_back'] = Room(
-            "The Guardian's Lair (Behind)",
-            "You emerge from the hidden tunnel behind the massive treasure chest! The guardian stands "
-            "on the other side, facing the main entrance. He hasn't noticed you yet - you have the element "
-            "of surprise! You could attack now while his back is turned, or try to sneak around.",
-            {"back": "hidden_tunnel"}
-        )
-        
-        # The Underground River
-        self.rooms['underground_river'] = Room(
-            "The Underground River",
-            "A dark river cuts through this chamber, its waters flowing swiftly and silently from "
-            "somewhere deep within the mountain. The current looks treacherous, and you cannot see "
-            "the bottom. Small blind fish occasionally break the surface. The sound of rushing water "
-            "fills the chamber, and the air is cool and humid. Smooth stones line the bank where you "
-            "stand.",
-            {"north": "warning_chamber", "west": "collapsed_tunnel"}
-        )
-        
-        # Set starting room
-        self.current_room = self.rooms['swallows_nest']
+        """Attach the game to the shared world and place the player at the start"""
+        if self.world is None:
+            self.world = get_world()
+        self.rooms = self.world.rooms
+        self.current_room = self.rooms[self.world.start]
+        self.visited = {self.world.start}
+    
+    def own_room(self, key):
+        """Return a private, mutable copy of a room for this game
+
+        Rooms start out shared between every game. The first change to a
+        room's items copies it into this game's own layer of rooms, which
+        sits in front of the shared rooms.
+        """
+        room = self.rooms[key]
+        if room.shared:
+            if self.rooms is self.world.rooms:
+                self.rooms = ChainMap({}, self.world.rooms)
+            room = self.rooms[key] = Room(room.template, list(room.items))
+            # Compare keys: the shared room and its template may have been
+            # evicted and rebuilt since the player walked in
+            if self.current_room.key == key:
+                self.current_room = room
+        return room
+    
+    def enter_room(self, key):
+        """Put the player in a room and describe it"""
+        self.current_room = self.rooms[key]
+        self.visited.add(key)
+        self.emit('room_entered', room=key)
+        self.current_room.describe(self.output)
     
     def move(self, direction):
         """Move to a different room"""
@@ -232,116 +457,151 @@ class Game:
         
         # Don't allow movement during combat
         if self.in_combat:
-            print("You can't move while in combat! Use 'retreat' to flee.")
+            self.say("You can't move while in combat! Use 'retreat' to flee.")
             return
         
         if direction in self.current_room.exits:
             next_room_key = self.current_room.exits[direction]
+            roles = self.world.roles
             
             # Special handling for The Death Trap (poison trap)
-            if next_room_key == 'death_trap':
-                print("\n" + "="*60)
-                print("As you step into the room, you hear a faint *click* beneath your foot...")
-                print("A hidden pressure plate!")
-                print("\nWith a hiss, poisonous gas begins pouring from vents in the walls!")
-                print("You try to run back, but the gas fills your lungs instantly.")
-                print("Your vision blurs... the world spins... and then darkness.")
-                print("="*60)
-                print("\n💀 YOU DIED 💀")
-                print("\nGAME OVER - You triggered the ancient trap")
+            if next_room_key == roles.get('trap'):
+                self.emit('trap_triggered', room=next_room_key)
+                self.say("\n" + "="*60)
+                self.say("As you step into the room, you hear a faint *click* beneath your foot...")
+                self.say("A hidden pressure plate!")
+                self.say("\nWith a hiss, poisonous gas begins pouring from vents in the walls!")
+                self.say("You try to run back, but the gas fills your lungs instantly.")
+                self.say("Your vision blurs... the world spins... and then darkness.")
+                self.say("="*60)
+                self.say("\n💀 YOU DIED 💀")
+                self.say("\nGAME OVER - You triggered the ancient trap")
+                self.emit('player_died', room=next_room_key, cause='trap')
                 self.running = False
                 return
             
             # Special handling for Bat Colony (bat enemy)
-            if next_room_key == 'bat_colony' and not self.bat_defeated:
-                self.current_room = self.rooms[next_room_key]
-                self.current_room.describe()
-                print("\n" + "="*60)
-                print("A large bat swoops down from the ceiling, screeching!")
-                print("It's attacking you!")
-                print("="*60)
+            if next_room_key == roles.get('bat') and not self.bat_defeated:
+                self.enter_room(next_room_key)
+                self.say("\n" + "="*60)
+                self.say("A large bat swoops down from the ceiling, screeching!")
+                self.say("It's attacking you!")
+                self.say("="*60)
                 self.start_combat('bat')
                 return
             
             # Special handling for The Guardian's Lair (treasure room from front)
-            if next_room_key == 'guardians_lair':
-                self.current_room = self.rooms[next_room_key]
-                self.current_room.describe()
+            if next_room_key == roles.get('lair'):
+                self.enter_room(next_room_key)
                 self.start_combat('guardian', surprised=False)
                 return
             
             # Special handling for Guardian's Lair from behind (surprise attack)
-            if next_room_key == 'guardians_lair_back':
-                self.current_room = self.rooms[next_room_key]
-                self.current_room.describe()
-                print("\nYou have the element of surprise! You can attack first.")
+            if next_room_key == roles.get('lair_back'):
+                self.enter_room(next_room_key)
+                self.say("\nYou have the element of surprise! You can attack first.")
                 self.surprised_guardian = True
                 self.start_combat('guardian', surprised=True)
                 return
             
-            self.current_room = self.rooms[next_room_key]
-            self.current_room.describe()
+            self.enter_room(next_room_key)
         else:
-            print("You can't go that way!")
+            self.say("You can't go that way!")
+    
+    def travel(self, destination):
+        """Walk the shortest path to a room, stopping if anything happens on the way"""
+        if self.in_combat:
+            self.say("You can't travel while in combat! Use 'retreat' to flee.")
+            return
+        
+        target = self.world.find_room(destination)
+        if target is None:
+            self.say("You don't know of any place called '{}'.", destination)
+            return
+        if target == self.current_room.key:
+            self.say("You're already there.")
+            return
+        
+        path = self.world.path(self.current_room.key, target)
+        if path is None:
+            self.say("You can't find a way to {} from here.", self.rooms[target].name)
+            return
+        
+        # Each step goes through move(), so traps and fights stop the journey
+        for direction in path:
+            if not self.running or self.in_combat:
+                break
+            self.move(direction)
     
     def start_combat(self, enemy_type, surprised=False):
         """Initialize combat with an enemy"""
         self.in_combat = True
         self.combat_enemy = enemy_type
+        self.emit('combat_started', enemy=enemy_type, surprised=surprised)
         
         if enemy_type == 'guardian' and not surprised:
-            print("\n" + "="*60)
-            print("COMBAT BEGINS!")
-            print("="*60)
+            self.say("\n" + "="*60)
+            self.say("COMBAT BEGINS!")
+            self.say("="*60)
             self.show_combat_status()
         elif enemy_type == 'guardian' and surprised:
-            print("\n" + "="*60)
-            print("SURPRISE ATTACK!")
-            print("="*60)
-            print("You have the first strike! The guardian hasn't noticed you yet.")
+            self.say("\n" + "="*60)
+            self.say("SURPRISE ATTACK!")
+            self.say("="*60)
+            self.say("You have the first strike! The guardian hasn't noticed you yet.")
             self.show_combat_status()
         elif enemy_type == 'bat':
-            print("\nCOMBAT: Large Bat")
+            self.say("\nCOMBAT: Large Bat")
             self.show_combat_status()
     
     def show_combat_status(self):
         """Display current combat status"""
-        print(f"\nYour HP: {self.player_hp}/{self.player_max_hp}")
+        self.say("\nYour HP: {}/{}", self.player_hp, self.player_max_hp)
         
         if self.combat_enemy == 'guardian':
-            print(f"Guardian HP: {self.guardian_hp}/20")
+            self.say("Guardian HP: {}/{}", self.guardian_hp, self.rules.guardian_hp)
         elif self.combat_enemy == 'bat':
-            print(f"Bat HP: {self.bat_hp}/5")
+            self.say("Bat HP: {}/{}", self.bat_hp, self.rules.bat_hp)
         
-        has_dagger = "shiny dagger" in self.inventory
-        if has_dagger:
-            print("Weapon equipped: Shiny Dagger")
+        weapon = self.inventory.weapon(self.rules)
+        if weapon is not None:
+            self.say("Weapon equipped: {}", weapon.name.title())
         else:
-            print("Weapon: Bare hands")
+            self.say("Weapon: Bare hands")
         
         if self.has_shield:
-            print("Shield: Equipped")
-        print()
+            self.say("Shield: Equipped")
+        self.say()
     
     def attack(self, weapon=None):
         """Player attacks during combat"""
         if not self.in_combat:
-            print("You're not in combat!")
+            self.say("You're not in combat!")
             return
         
         # Determine damage
-        if weapon and weapon.lower() in ['dagger', 'shiny dagger'] and "shiny dagger" in self.inventory:
-            player_damage = random.randint(2, 16)
-            print(f"🗡️  You strike with your shiny dagger!")
+        item = None
+        if weapon:
+            try:
+                item = ITEMS.resolve(weapon, self.inventory)
+            except AmbiguousItemError as error:
+                self.say("Which do you mean: {}?", ', '.join(error.names))
+                return
+        damage = self.item_damage(item) if item is not None else None
+        if damage is not None:
+            player_damage = self.rng.randint(*damage)
+            self.say("🗡️  You strike with your {}!", item)
         else:
-            player_damage = random.randint(1, 4)
-            print(f"👊 You attack with your bare hands!")
+            player_damage = self.rng.randint(*self.rules.bare_hands_damage)
+            self.say("👊 You attack with your bare hands!")
         
         # Apply damage to enemy
         if self.combat_enemy == 'guardian':
             self.guardian_hp -= player_damage
-            print(f"   You deal {player_damage} damage!")
-            print(f"   Guardian HP: {max(0, self.guardian_hp)}/20")
+            self.emit('damage_dealt', source='player', target='guardian', amount=player_damage,
+                      hp=self.guardian_hp)
+            self.say("   You deal {} damage!", player_damage)
+            self.say("   Guardian HP: {}/{}", max(0, self.guardian_hp), self.rules.guardian_hp)
             
             # Check if guardian is defeated
             if self.guardian_hp <= 0:
@@ -350,25 +610,29 @@ class Game:
             
             # Guardian counter-attacks (unless surprised on first turn)
             if self.surprised_guardian:
-                print("\nThe guardian spins around, startled by your attack!")
-                print("He draws his sword to defend himself!")
+                self.say("\nThe guardian spins around, startled by your attack!")
+                self.say("He draws his sword to defend himself!")
                 self.surprised_guardian = False
             else:
                 self.guardian_counterattack()
                 
         elif self.combat_enemy == 'bat':
             self.bat_hp -= player_damage
-            print(f"   You deal {player_damage} damage!")
-            print(f"   Bat HP: {max(0, self.bat_hp)}/5")
+            self.emit('damage_dealt', source='player', target='bat', amount=player_damage,
+                      hp=self.bat_hp)
+            self.say("   You deal {} damage!", player_damage)
+            self.say("   Bat HP: {}/{}", max(0, self.bat_hp), self.rules.bat_hp)
             
             # Check if bat is defeated
             if self.bat_hp <= 0:
-                print("\n" + "="*60)
-                print("The bat screeches one last time and falls to the ground!")
-                print("You notice something among the guano on the floor...")
-                print("You found: bat guano")
-                print("="*60)
-                self.inventory.append("bat guano")
+                self.say("\n" + "="*60)
+                self.say("The bat screeches one last time and falls to the ground!")
+                self.say("You notice something among the guano on the floor...")
+                self.say("You found: bat guano")
+                self.say("="*60)
+                self.inventory.add(GUANO)
+                self.emit('enemy_defeated', enemy='bat')
+                self.emit('item_taken', item=GUANO, room=self.current_room.key)
                 self.bat_defeated = True
                 self.in_combat = False
                 self.combat_enemy = None
@@ -379,333 +643,372 @@ class Game:
     
     def guardian_counterattack(self):
         """Guardian attacks the player"""
-        guardian_damage = random.randint(1, 8)
-        print(f"\n⚔️  The Guardian strikes back with his sword!")
-        print(f"   The Guardian deals {guardian_damage} damage!")
+        guardian_damage = self.rng.randint(*self.rules.guardian_damage)
+        self.say("\n⚔️  The Guardian strikes back with his sword!")
+        self.say("   The Guardian deals {} damage!", guardian_damage)
         self.player_hp -= guardian_damage
-        print(f"   Your HP: {max(0, self.player_hp)}/{self.player_max_hp}")
+        self.emit('damage_dealt', source='guardian', target='player', amount=guardian_damage,
+                  hp=self.player_hp)
+        self.say("   Your HP: {}/{}", max(0, self.player_hp), self.player_max_hp)
         
         if self.player_hp <= 0:
-            print("\n" + "="*60)
-            print("💀 YOU DIED 💀")
-            print("="*60)
-            print("\nThe guardian's blade proves too much for you.")
-            print("Your vision fades as you collapse to the cold stone floor...")
-            print("\nGAME OVER - You were slain by the guardian")
+            self.say("\n" + "="*60)
+            self.say("💀 YOU DIED 💀")
+            self.say("="*60)
+            self.say("\nThe guardian's blade proves too much for you.")
+            self.say("Your vision fades as you collapse to the cold stone floor...")
+            self.say("\nGAME OVER - You were slain by the guardian")
+            self.emit('player_died', room=self.current_room.key, cause='guardian')
             self.running = False
             self.in_combat = False
     
     def bat_counterattack(self):
         """Bat attacks the player"""
-        bat_damage = random.randint(0, 3)
+        bat_damage = self.rng.randint(*self.rules.bat_damage)
+        self.emit('damage_dealt', source='bat', target='player', amount=bat_damage,
+                  hp=self.player_hp - bat_damage)
         if bat_damage == 0:
-            print(f"\n🦇 The bat swoops at you but misses!")
+            self.say("\n🦇 The bat swoops at you but misses!")
         else:
-            print(f"\n🦇 The bat scratches you with its claws!")
-            print(f"   The bat deals {bat_damage} damage!")
+            self.say("\n🦇 The bat scratches you with its claws!")
+            self.say("   The bat deals {} damage!", bat_damage)
             self.player_hp -= bat_damage
-            print(f"   Your HP: {max(0, self.player_hp)}/{self.player_max_hp}")
+            self.say("   Your HP: {}/{}", max(0, self.player_hp), self.player_max_hp)
         
         if self.player_hp <= 0:
-            print("\n" + "="*60)
-            print("💀 YOU DIED 💀")
-            print("="*60)
-            print("\nThe bat's relentless attacks have overwhelmed you.")
-            print("\nGAME OVER - You were killed by a bat")
+            self.say("\n" + "="*60)
+            self.say("💀 YOU DIED 💀")
+            self.say("="*60)
+            self.say("\nThe bat's relentless attacks have overwhelmed you.")
+            self.say("\nGAME OVER - You were killed by a bat")
+            self.emit('player_died', room=self.current_room.key, cause='bat')
             self.running = False
             self.in_combat = False
     
     def retreat(self):
         """Flee from combat"""
         if not self.in_combat:
-            print("You're not in combat!")
+            self.say("You're not in combat!")
             return
         
-        print("\n" + "="*60)
-        print("You retreat from combat!")
-        print("="*60)
+        self.say("\n" + "="*60)
+        self.say("You retreat from combat!")
+        self.say("="*60)
+        self.emit('retreated', enemy=self.combat_enemy, room=self.current_room.key)
         
         if self.combat_enemy == 'guardian':
-            print("You flee from the Guardian's Lair!")
-            print("The guardian doesn't pursue you beyond his chamber.")
-            print("Your HP and the guardian's HP remain as they were.")
+            self.say("You flee from the Guardian's Lair!")
+            self.say("The guardian doesn't pursue you beyond his chamber.")
+            self.say("Your HP and the guardian's HP remain as they were.")
             # Move back to warning chamber
-            self.current_room = self.rooms['warning_chamber']
+            destination = self.world.roles['lair_exit']
         elif self.combat_enemy == 'bat':
-            print("You flee from the bat!")
-            print("It returns to roosting with the others.")
-            print("Your HP and the bat's HP remain as they were.")
+            self.say("You flee from the bat!")
+            self.say("It returns to roosting with the others.")
+            self.say("Your HP and the bat's HP remain as they were.")
             # Move back to previous room (stalactite forest or mushroom grove)
-            self.current_room = self.rooms['stalactite_forest']
+            destination = self.world.roles['bat_exit']
         
         self.in_combat = False
         self.combat_enemy = None
-        self.current_room.describe()
+        self.enter_room(destination)
     
     def win_game(self):
         """Player wins the game"""
-        print(f"   Guardian HP: 0/20")
-        print("\n" + "="*60)
-        print("⚔️  VICTORY! ⚔️")
-        print("="*60)
-        print("\nWith a final, decisive blow, the guardian staggers backward!")
-        print("His sword clatters to the ground as he falls to his knees.")
-        print("'You... you have bested me...' he gasps, then collapses.")
-        print("\nYou approach the massive treasure chest and throw it open.")
-        print("Gold coins, precious gems, and ancient artifacts spill out,")
-        print("glittering in the dim light!")
-        print("\n" + "="*60)
-        print("🏆 ✨ CONGRATULATIONS! YOU WIN! ✨ 🏆")
-        print("="*60)
-        print(f"\nYou have claimed the legendary treasure of the cave!")
-        print(f"Final HP: {self.player_hp}/{self.player_max_hp}")
+        self.say("   Guardian HP: 0/{}", self.rules.guardian_hp)
+        self.say("\n" + "="*60)
+        self.say("⚔️  VICTORY! ⚔️")
+        self.say("="*60)
+        self.say("\nWith a final, decisive blow, the guardian staggers backward!")
+        self.say("His sword clatters to the ground as he falls to his knees.")
+        self.say("'You... you have bested me...' he gasps, then collapses.")
+        self.say("\nYou approach the massive treasure chest and throw it open.")
+        self.say("Gold coins, precious gems, and ancient artifacts spill out,")
+        self.say("glittering in the dim light!")
+        self.say("\n" + "="*60)
+        self.say("🏆 ✨ CONGRATULATIONS! YOU WIN! ✨ 🏆")
+        self.say("="*60)
+        self.say("\nYou have claimed the legendary treasure of the cave!")
+        self.say("Final HP: {}/{}", self.player_hp, self.player_max_hp)
+        self.emit('game_won', room=self.current_room.key, hp=self.player_hp)
         self.running = False
         self.in_combat = False
     
     def take(self, item):
         """Pick up an item from the current room"""
-        item = item.lower()
-        
-        # Check if item exists in current room
-        for room_item in self.current_room.items:
-            if item in room_item.lower():
-                self.inventory.append(room_item)
-                self.current_room.items.remove(room_item)
-                print(f"You picked up the {room_item}.")
-                
-                # Special handling for the shield
-                if "shield" in room_item.lower():
-                    self.has_shield = True
-                    self.player_max_hp += 5
-                    self.player_hp += 5
-                    print("The ancient shield feels surprisingly light and well-balanced!")
-                    print(f"Your maximum hit points increased to {self.player_max_hp}!")
-                    print(f"Current HP: {self.player_hp}/{self.player_max_hp}")
-                
-                return
+        try:
+            name = ITEMS.resolve(item, self.current_room.items)
+        except AmbiguousItemError as error:
+            self.say("Which do you mean: {}?", ', '.join(error.names))
+            return
+        if name is None:
+            self.say("There is no {} here.", item.lower())
+            return
         
-        print(f"There is no {item} here.")
+        self.inventory.add(name)
+        self.own_room(self.current_room.key).remove_item(name)
+        self.emit('item_taken', item=name, room=self.current_room.key)
+        self.say("You picked up the {}.", name)
+        
+        # Items like the shield make the player tougher
+        bonus = self.item_hp_bonus(name)
+        if bonus:
+            self.has_shield = True
+            self.player_max_hp += bonus
+            self.player_hp += bonus
+            self.say("The {} feels surprisingly light and well-balanced!", name)
+            self.say("Your maximum hit points increased to {}!", self.player_max_hp)
+            self.say("Current HP: {}/{}", self.player_hp, self.player_max_hp)
     
     def use(self, item):
         """Use an item from inventory"""
-        item = item.lower()
-        
-        for inv_item in self.inventory:
-            if item in inv_item.lower():
-                # Special handling for bat guano (healing item)
-                if "guano" in inv_item.lower():
-                    if self.player_hp >= self.player_max_hp:
-                        print(f"You're already at full health ({self.player_hp}/{self.player_max_hp})!")
-                        print("You decide not to use the guano right now.")
-                        return
-                    
-                    print(f"You cautiously consume the bat guano...")
-                    print("Despite the awful taste, you feel reinvigorated!")
-                    heal_amount = self.player_max_hp - self.player_hp
-                    self.player_hp = self.player_max_hp
-                    print(f"You healed {heal_amount} HP!")
-                    print(f"Current HP: {self.player_hp}/{self.player_max_hp}")
-                    self.inventory.remove(inv_item)
-                    return
-                else:
-                    print(f"You can't use the {inv_item} right now.")
-                    return
-        
-        print(f"You don't have a {item}.")
+        try:
+            name = ITEMS.resolve(item, self.inventory)
+        except AmbiguousItemError as error:
+            self.say("Which do you mean: {}?", ', '.join(error.names))
+            return
+        if name is None:
+            self.say("You don't have a {}.", item.lower())
+            return
+        
+        # Healing items like the bat guano
+        if not ITEMS[name].heals:
+            self.say("You can't use the {} right now.", name)
+            return
+        if self.player_hp >= self.player_max_hp:
+            self.say("You're already at full health ({}/{})!", self.player_hp, self.player_max_hp)
+            self.say("You decide not to use the {} right now.", name.split()[-1])
+            return
+        
+        self.say("You cautiously consume the {}...", name)
+        self.say("Despite the awful taste, you feel reinvigorated!")
+        heal_amount = self.player_max_hp - self.player_hp
+        self.player_hp = self.player_max_hp
+        self.say("You healed {} HP!", heal_amount)
+        self.say("Current HP: {}/{}", self.player_hp, self.player_max_hp)
+        self.inventory.remove(name)
+        self.emit('item_used', item=name, healed=heal_amount)
     
     def show_inventory(self):
         """Display the player's inventory"""
         if self.inventory:
-            print(f"\nInventory: {', '.join(self.inventory)}")
+            self.say("\nInventory: {}", ', '.join(self.inventory))
         else:
-            print("\nYour inventory is empty.")
+            self.say("\nYour inventory is empty.")
     
     def show_status(self):
         """Display player's current status"""
-        print("\n" + "="*60)
-        print("PLAYER STATUS")
-        print("="*60)
-        print(f"Hit Points: {self.player_hp}/{self.player_max_hp}")
-        print(f"Shield Equipped: {'Yes' if self.has_shield else 'No'}")
+        self.say("\n" + "="*60)
+        self.say("PLAYER STATUS")
+        self.say("="*60)
+        self.say("Hit Points: {}/{}", self.player_hp, self.player_max_hp)
+        self.say("Shield Equipped: {}", 'Yes' if self.has_shield else 'No')
         
         # Show weapon status
-        if "shiny dagger" in self.inventory:
-            print("Weapon: Shiny Dagger (2-16 damage)")
+        weapon = self.inventory.weapon(self.rules)
+        if weapon is not None:
+            self.say("Weapon: {} ({}-{} damage)", weapon.name.title(), *self.item_damage(weapon.name))
         else:
-            print("Weapon: Bare hands (1-4 damage)")
+            self.say("Weapon: Bare hands ({}-{} damage)", *self.rules.bare_hands_damage)
         
         # Show inventory
         if self.inventory:
-            print(f"Inventory: {', '.join(self.inventory)}")
+            self.say("Inventory: {}", ', '.join(self.inventory))
         else:
-            print("Inventory: Empty")
-        print("="*60)
+            self.say("Inventory: Empty")
+        self.say("="*60)
+    
+    def show_metrics(self):
+        """Display the server's command metrics"""
+        stats = metrics.METRICS
+        if stats is None:
+            self.say("Metrics are not enabled.")
+            return
+        
+        self.say("\n" + "="*60)
+        self.say("SERVER METRICS")
+        self.say("="*60)
+        self.say("Collecting for {:.0f}s, {} commands", time.time() - stats.started,
+                 sum(stats.commands.values()))
+        for name, count in stats.commands.most_common(8):
+            latency = stats.command_latency[name]
+            self.say("  {:<16} {:>8}  p50 <= {:.3g}ms  p99 <= {:.3g}ms", name, count,
+                     latency.quantile(0.5) * 1000, latency.quantile(0.99) * 1000)
+        if stats.outcomes:
+            self.say("Outcomes: {}", ', '.join(f"{name} {count}" for name, count in sorted(stats.outcomes.items())))
+        self.say("Errors: {}", ', '.join(f"{name} {count}" for name, count in sorted(stats.errors.items())) or 'none')
+        self.say("="*60)
     
     def show_help(self):
         """Display available commands"""
-        print("\n" + "="*60)
-        print("AVAILABLE COMMANDS")
-        print("="*60)
-        print("MOVEMENT:")
-        print("  go <direction>    - Move in a direction")
-        print("  <direction>       - Shortcut: north/south/east/west/up/down/forward/back")
-        print("                      or n/s/e/w/u/d/f/b")
-        print("\nCOMBAT:")
-        print("  attack            - Attack with bare hands")
-        print("  attack <weapon>   - Attack with a specific weapon (e.g., 'attack dagger')")
-        print("  retreat           - Flee from combat")
-        print("\nITEMS:")
-        print("  take <item>       - Pick up an item")
-        print("  use <item>        - Use an item from your inventory")
-        print("  inventory (i)     - Show your inventory")
-        print("\nINFORMATION:")
-        print("  status (st)       - Show your hit points and equipment")
-        print("  look (l)          - Look around the current room")
-        print("  map               - Show the cave map")
-        print("  help (h)          - Show this help message")
-        print("\nGAME:")
-        print("  quit (q)          - Quit the game")
-        print("="*60)
-    
-    def show_map(self):
-        """Display an ASCII map of the cave system"""
-        print("\n" + "="*60)
-        print("CAVE SYSTEM MAP")
-        print("="*60)
-        print("""
-                    [The Collapsed]
-                    [   Tunnel    ]
-                          |
-                        north
-                          |
-        [Bat Colony]--[Stalactite]
-             |         [  Forest  ]
-            west            |
-             |            south
-        [Mushroom]          |
-        [  Grove  ]--[Echoing Chmb]--[Fossil]
-             |              |         [Gallery]
-           south          west           |
-             |              |          north
-        [Crystal]----[Swallow's]--[Forgotten]
-        [  Pool ]    [   Nest  ]  [ Shrine  ]
-                          |             |
-                        north         east
-                          |             |
-                     [The Arsenal]------+
-                          |
-                        east
-                          |
-                    [Underground]
-                    [   River   ]
-                          |
-                        north
-                          |
-                     [Warning Chmb]
-                       /    |    \\
-                    north  east  west
-                     /      |      \\
-              [Death    [Guardian's  
-               Trap]     Lair - GOAL]
-              (DANGER!)   
-        """)
-        print("="*60)
-        print("Legend: Your goal is to reach the Guardian's Lair!")
-        print("        Avoid the Death Trap at all costs!")
-        print("="*60)
+        self.say("\n" + "="*60)
+        self.say("AVAILABLE COMMANDS")
+        self.say("="*60)
+        self.say("MOVEMENT:")
+        self.say("  go <direction>    - Move in a direction")
+        self.say("  <direction>       - Shortcut: north/south/east/west/up/down/forward/back")
+        self.say("                      or n/s/e/w/u/d/f/b")
+        self.say("  travel <room>     - Walk the shortest path to a room")
+        self.say("\nCOMBAT:")
+        self.say("  attack            - Attack with bare hands")
+        self.say("  attack <weapon>   - Attack with a specific weapon (e.g., 'attack dagger')")
+        self.say("  retreat           - Flee from combat")
+        self.say("  odds              - Show your chances in the current fight")
+        self.say("\nITEMS:")
+        self.say("  take <item>       - Pick up an item")
+        self.say("  use <item>        - Use an item from your inventory")
+        self.say("  inventory (i)     - Show your inventory")
+        self.say("\nINFORMATION:")
+        self.say("  status (st)       - Show your hit points and equipment")
+        self.say("  look (l)          - Look around the current room")
+        self.say("  map [full]        - Show the cave map around you (or all of it)")
+        self.say("  help (h)          - Show this help message")
+        self.say("\nGAME:")
+        self.say("  quit (q)          - Quit the game")
+        if self.operator:
+            self.say("\nOPERATOR:")
+            self.say("  metrics           - Show server command statistics (when enabled)")
+        self.say("="*60)
     
-    def parse_command(self, command):
-        """Parse and execute player commands"""
-        parts = command.lower().strip().split()
-        
-        if not parts:
+    def show_odds(self):
+        """Display the exact odds of the current fight"""
+        if not self.in_combat:
+            self.say("You're not in combat!")
             return
         
-        action = parts[0]
-        
-        if action in ['quit', 'q', 'exit']:
-            print("\nThanks for playing Cave Adventure!")
-            self.running = False
-        
-        elif action in ['help', 'h', '?']:
-            self.show_help()
-        
-        elif action in ['map', 'm']:
-            self.show_map()
-        
-        elif action in ['look', 'l']:
-            self.current_room.describe()
-        
-        elif action in ['inventory', 'i', 'inv']:
-            self.show_inventory()
+        from combat_odds import ALWAYS_ATTACK, OPTIMAL, odds_for_game
         
-        elif action in ['status', 'st', 'stats']:
-            self.show_status()
+        weapon = self.inventory.weapon(self.rules)
+        odds = odds_for_game(self, ALWAYS_ATTACK)
+        self.say("\nIf you keep attacking with your {}:", weapon.name if weapon is not None else "bare hands")
+        self.say("  Chance to win: {:.1%}", odds.win)
+        self.say("  Chance to die: {:.1%}", odds.death)
+        self.say("  Expected attacks: {:.1f}", odds.expected_turns)
         
-        elif action in ['go', 'move', 'walk']:
-            if len(parts) > 1:
-                self.move(parts[1])
-            else:
-                print("Go where? Specify a direction (north, south, east, west).")
-        
-        elif action in ['north', 'south', 'east', 'west', 'n', 's', 'e', 'w', 'down', 'd', 'up', 'u', 'forward', 'f', 'back', 'b']:
-            # Allow direct direction commands
-            direction_map = {
-                'n': 'north', 's': 'south', 'e': 'east', 'w': 'west',
-                'd': 'down', 'u': 'up', 'f': 'forward', 'b': 'back'
-            }
-            direction = direction_map.get(action, action)
-            self.move(direction)
+        healing = [name for name in self.inventory.kinds() if ITEMS[name].heals]
+        if healing:
+            best = odds_for_game(self, OPTIMAL)
+            self.say("Using your {} at the right moment: {:.1%} to win", healing[0], best.win)
+    
+    def show_map(self, mode=None):
+        """Display a map of the cave around the player; 'map full' shows all of it"""
+        if not self.output.text:
+            return
+        layout = self.world.layout()
+        if mode in ('full', 'all') and self.world.templates.lazy:
+            # Drawing every generated room would flood the screen and build them all
+            self.say("This cave is far too large to map whole. Here is the area around you.")
+            mode = None
+        if mode in ('full', 'all'):
+            view = MapView(layout)
+        elif mode is not None:
+            self.say("Use 'map' for the area around you or 'map full' for the whole cave.")
+            return
+        else:
+            # Kept between calls so only the changed parts are redrawn
+            view = self.map_view
+            if view is None or view.layout is not layout:
+                view = self.map_view = MapView(layout, VIEW_COLUMNS, VIEW_ROWS)
+        lines = view.render(self.current_room.key, self.visited)
         
-        elif action in ['attack', 'a', 'fight', 'strike', 'hit']:
-            if len(parts) > 1 and parts[1] in ['with', 'using']:
-                # Attack with specific weapon: "attack with dagger"
-                if len(parts) > 2:
-                    weapon = ' '.join(parts[2:])
-                    self.attack(weapon)
-                else:
-                    print("Attack with what weapon?")
-            elif len(parts) > 1:
-                # Attack with weapon: "attack dagger"
-                weapon = ' '.join(parts[1:])
-                self.attack(weapon)
-            else:
-                # Just "attack" - use bare hands
-                self.attack()
+        self.say("\n" + "="*60)
+        self.say("CAVE SYSTEM MAP")
+        self.say("="*60)
+        self.say("\n".join(lines))
+        self.say("="*60)
+        self.say("Legend: @ = you are here ({})   * = visited", self.current_room.name)
+        self.say("Your goal is to reach the Guardian's Lair!")
+        self.say("="*60)
+    
+    def quit(self):
+        """Quit the game"""
+        self.say("\nThanks for playing Cave Adventure!")
+        self.emit('game_quit', room=self.current_room.key)
+        self.running = False
+    
+    def look(self):
+        """Describe the current room again"""
+        self.current_room.describe(self.output)
+    
+    @classmethod
+    def register_command(cls, names, handler, grammar="", missing=None, args=(), operator=False):
+        """Add a verb and its aliases to the command table
+
+        grammar describes the words after the verb:
+            ""                          no arguments (extra words are ignored)
+            "<direction>"               exactly one word
+            "<item...>"                 the rest of the line
+            "[with|using] [<weapon...>]" optional leading words, optional rest
+        Angle brackets name a required argument, square brackets make it
+        optional. missing is said when a required argument is absent, and
+        args are passed to the handler before any parsed argument.
+        Operator commands are only understood in games started with
+        operator=True.
+        """
+        table = 'operator_commands' if operator else 'commands'
+        if table not in cls.__dict__:
+            setattr(cls, table, dict(getattr(cls, table)))
+        command = Command(handler, grammar, missing, args)
+        commands = getattr(cls, table)
+        for name in names:
+            commands[name] = command
+        return command
+    
+    @classmethod
+    def rebind_commands(cls):
+        """Point inherited commands at this class's overrides of their handlers
+
+        Commands hold the functions they were registered with, so a
+        subclass that overrides a handler calls this once after defining it.
+        """
+        commands = dict(cls.commands)
+        rebound = {}
+        for name, command in commands.items():
+            handler = getattr(cls, command.handler.__name__, command.handler)
+            if handler is not command.handler:
+                if command not in rebound:
+                    rebound[command] = Command(handler, command.grammar, command.missing, command.args)
+                commands[name] = rebound[command]
+        cls.commands = commands
+    
+    def parse_command(self, command):
+        """Parse and execute player commands"""
+        parts = command.lower().split()
         
-        elif action in ['retreat', 'flee', 'run', 'escape']:
-            self.retreat()
+        if not parts:
+            return
         
-        elif action in ['take', 'get', 'grab', 'pick', 'pickup']:
-            if len(parts) > 1:
-                item = ' '.join(parts[1:])
-                self.take(item)
-            else:
-                print("Take what?")
+        entry = self.commands.get(parts[0])
+        if entry is None and self.operator:
+            entry = self.operator_commands.get(parts[0])
+        if entry is None:
+            self.say("I don't understand that command. Type 'help' for available commands.")
+            self.emit('unknown_command', command=command)
+        elif entry.kind == NO_ARGS:
+            entry.handler(self, *entry.args)
+        else:
+            entry.run(self, parts)
         
-        elif action in ['use']:
-            if len(parts) > 1:
-                item = ' '.join(parts[1:])
-                self.use(item)
-            else:
-                print("Use what?")
+        self.output.flush()
+    
+    def show_intro(self):
+        """Display the title banner and the starting room"""
+        self.say("\n" + "="*60)
+        self.say("           ⚔️  CAVE ADVENTURE  ⚔️")
+        self.say("        A Text-Based Adventure Game")
+        self.say("="*60)
+        self.say("\nYou stand before the entrance to a mysterious cave system.")
+        self.say("Legends speak of treasure deep within, guarded by an ancient")
+        self.say("warrior. Many have entered... few have returned.")
+        self.say("\nType 'help' for commands or 'map' to see the cave layout.")
+        self.say("="*60)
         
-        else:
-            print("I don't understand that command. Type 'help' for available commands.")
+        self.current_room.describe(self.output)
+        self.output.flush()
     
     def play(self):
         """Main game loop"""
-        print("\n" + "="*60)
-        print("           ⚔️  CAVE ADVENTURE  ⚔️")
-        print("        A Text-Based Adventure Game")
-        print("="*60)
-        print("\nYou stand before the entrance to a mysterious cave system.")
-        print("Legends speak of treasure deep within, guarded by an ancient")
-        print("warrior. Many have entered... few have returned.")
-        print("\nType 'help' for commands or 'map' to see the cave layout.")
-        print("="*60)
-        
-        self.current_room.describe()
+        self.show_intro()
         
         while self.running:
             try:
@@ -713,17 +1016,63 @@ class Game:
                 if command:
                     self.parse_command(command)
             except KeyboardInterrupt:
-                print("\n\nThanks for playing!")
+                self.say("\n\nThanks for playing!")
                 break
             except EOFError:
-                print("\n\nThanks for playing!")
+                self.say("\n\nThanks for playing!")
                 break
+        
+        self.output.flush()
+
+
+Game.register_command(('quit', 'q', 'exit'), Game.quit)
+Game.register_command(('help', 'h', '?'), Game.show_help)
+Game.register_command(('map', 'm'), Game.show_map, "[<mode>]")
+Game.register_command(('look', 'l'), Game.look)
+Game.register_command(('inventory', 'i', 'inv'), Game.show_inventory)
+Game.register_command(('status', 'st', 'stats'), Game.show_status)
+Game.register_command(('go', 'move', 'walk'), Game.move, "<direction>",
+                      "Go where? Specify a direction (north, south, east, west).")
+for _direction in ('north', 'south', 'east', 'west', 'down', 'up', 'forward', 'back'):
+    Game.register_command((_direction, _direction[0]), Game.move, args=(_direction,))
+Game.register_command(('travel', 'goto', 't'), Game.travel, "<room...>", "Travel where?")
+Game.register_command(('attack', 'a', 'fight', 'strike', 'hit'), Game.attack,
+                      "[with|using] [<weapon...>]", "Attack with what weapon?")
+Game.register_command(('retreat', 'flee', 'run', 'escape'), Game.retreat)
+Game.register_command(('odds', 'chances'), Game.show_odds)
+Game.register_command(('take', 'get', 'grab', 'pick', 'pickup'), Game.take, "<item...>", "Take what?")
+Game.register_command(('use',), Game.use, "<item...>", "Use what?")
+Game.register_command(('metrics',), Game.show_metrics, operator=True)
 
 
 def main():
     """Entry point for the game"""
-    game = Game()
-    game.play()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Play Cave Adventure")
+    parser.add_argument('--world', help="world file to play (JSON or compiled .cave)")
+    parser.add_argument('--endless', action='store_true', help="explore a huge procedurally generated cave")
+    parser.add_argument('--seed', type=int, help="seed for dice rolls and the endless cave")
+    parser.add_argument('--event-log', metavar='PATH', help="append game events to PATH")
+    parser.add_argument('--color', action='store_true', help="colour room descriptions (ANSI terminals)")
+    args = parser.parse_args()
+    
+    if args.endless:
+        from procgen import generate_world
+        world = generate_world(args.seed)
+    else:
+        world = get_world(args.world)
+    output = ConsoleOutput(style='ansi') if args.color else CONSOLE
+    if args.event_log:
+        from eventlog import EventLog
+        event_log = EventLog(args.event_log)
+        output = event_log.session(output)
+    game = Game(output, rng=RollStream(args.seed), world=world, operator=True)
+    try:
+        game.play()
+    finally:
+        if args.event_log:
+            event_log.close()
 
 
 if __name__ == "__main__":
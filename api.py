@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Cave Adventure - HTTP/JSON API
+
+A stateless HTTP front end: every request loads the session's game from
+a session store, runs the command and saves the game back as a snapshot
+(see snapshot.py). Any number of API nodes can share one store behind a
+load balancer, and any node can serve any session.
+
+    POST   /session                         start a game
+    POST   /command  {"session", "command"}  run a command
+    GET    /session/<id>                    the game's state
+    DELETE /session/<id>                    end a session
+
+Every response is a JSON object. Commands answer with the game's output
+as a list: plain lines as {"text": ...}, room descriptions as objects
+with room, name, description, items and exits.
+
+Stores are chosen with a URL: "memory", "sqlite:<path>" or "dbm:<path>".
+A small LRU cache of live games sits in front of the store, each game
+with the snapshot it was last saved as. Every request still reads the
+session's snapshot from the store, and only uses the cached game if the
+store holds the same bytes, so a hot session skips decoding but a
+session that was played on another node in the meantime is always
+reloaded. Saves always go through to the store, or with --autosave to a
+WriteBehindStore (see persistence.py) that commits them in batches.
+"""
+
+import io
+import json
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import snapshot
+from adventure import Game, get_world
+from output import JsonOutput
+
+MAX_COMMAND = 1024
+MAX_BODY = 16 * 1024
+
+# Requests for the same session are serialized on one of this many locks
+LOCK_STRIPES = 256
+
+
+class ApiError(Exception):
+    """A request that cannot be served, with its HTTP status"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MemoryStore:
+    """Sessions in a dict; for tests and single-node use"""
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def put(self, key, data):
+        with self._lock:
+            self._data[key] = data
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def put_many(self, items):
+        """Store (key, data) pairs at once; data None deletes the key"""
+        with self._lock:
+            for key, data in items:
+                if data is None:
+                    self._data.pop(key, None)
+                else:
+                    self._data[key] = data
+
+    def keys(self):
+        return list(self._data)
+
+    def close(self):
+        pass
+
+
+class SQLiteStore:
+    """Sessions in an SQLite table, shared by every node using the file"""
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data BLOB NOT NULL)")
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM sessions WHERE id = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, data):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO sessions (id, data) VALUES (?, ?)", (key, data))
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (key,))
+
+    def put_many(self, items):
+        """Store (key, data) pairs in one transaction; data None deletes the key"""
+        items = list(items)
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO sessions (id, data) VALUES (?, ?)",
+                                     [(key, data) for key, data in items if data is not None])
+                self._db.executemany("DELETE FROM sessions WHERE id = ?",
+                                     [(key,) for key, data in items if data is None])
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def keys(self):
+        with self._lock:
+            return [key for key, in self._db.execute("SELECT id FROM sessions")]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class DbmStore:
+    """Sessions in a local dbm key-value file"""
+    def __init__(self, path):
+        import dbm
+        self.path = path
+        self._db = dbm.open(path, 'c')
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._db.get(key.encode())
+
+    def put(self, key, data):
+        with self._lock:
+            self._db[key.encode()] = data
+
+    def delete(self, key):
+        with self._lock:
+            try:
+                del self._db[key.encode()]
+            except KeyError:
+                pass
+
+    def put_many(self, items):
+        """Store (key, data) pairs; data None deletes the key (not atomic)"""
+        for key, data in items:
+            if data is None:
+                self.delete(key)
+            else:
+                self.put(key, data)
+
+    def keys(self):
+        with self._lock:
+            return [key.decode() for key in self._db.keys()]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def open_store(url):
+    """Return the session store for a URL: memory, sqlite:<path> or dbm:<path>"""
+    kind, _, path = url.partition(':')
+    if kind == 'memory':
+        return MemoryStore()
+    if kind == 'sqlite' and path:
+        return SQLiteStore(path)
+    if kind == 'dbm' and path:
+        return DbmStore(path)
+    raise ValueError(f"Unknown session store: {url!r}")
+
+
+class HotCache:
+    """The most recently used live games, by session id
+
+    Entries are (game, snapshot) pairs: the snapshot is the version token
+    the entry is checked against before the game is used.
+    """
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self._games = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._games.get(key)
+            if entry is not None:
+                self._games.move_to_end(key)
+            return entry
+
+    def put(self, key, game, data):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._games[key] = (game, data)
+            self._games.move_to_end(key)
+            if len(self._games) > self.capacity:
+                self._games.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._games.pop(key, None)
+
+
+def _state(game):
+    return {
+        'running': game.running,
+        'room': game.current_room.key,
+        'hp': game.player_hp,
+        'max_hp': game.player_max_hp,
+        'in_combat': game.in_combat,
+        'inventory': list(game.inventory),
+    }
+
+
+class GameApi:
+    """The API's operations, independent of HTTP
+
+    Each method returns the JSON response body as bytes; failures raise
+    ApiError.
+    """
+    def __init__(self, store, cache_size=1000, world=None):
+        self.store = store
+        self.cache = HotCache(cache_size)
+        self.world = world if world is not None else get_world()
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def _lock(self, session_id):
+        return self._locks[hash(session_id) % LOCK_STRIPES]
+
+    def _load(self, session_id):
+        data = self.store.get(session_id)
+        if data is None:
+            self.cache.discard(session_id)
+            raise ApiError(404, "No such session")
+        entry = self.cache.get(session_id)
+        if entry is not None and entry[1] == data:
+            return entry[0]
+        # Not cached, or saved by another node since: use the stored game
+        return snapshot.loads(data, world=self.world)
+
+    def _save(self, session_id, game):
+        try:
+            data = snapshot.dumps(game)
+        except snapshot.SnapshotError as error:
+            self.cache.discard(session_id)
+            raise ApiError(500, f"Could not save the game: {error}") from None
+        self.store.put(session_id, data)
+        self.cache.put(session_id, game, data)
+
+    def _run(self, game, func, *args):
+        """Call a Game method and return its output as a JSON array"""
+        buffer = io.StringIO()
+        game.output = JsonOutput(buffer)
+        func(*args)
+        game.output.flush()
+        return '[' + ','.join(buffer.getvalue().splitlines()) + ']'
+
+    def _respond(self, session_id, output, game):
+        return (f'{{"session":{json.dumps(session_id)},"output":{output},'
+                f'"state":{json.dumps(_state(game))}}}').encode('utf-8')
+
+    def create(self):
+        session_id = secrets.token_urlsafe(16)
+        game = Game(world=self.world)
+        output = self._run(game, game.show_intro)
+        with self._lock(session_id):
+            self._save(session_id, game)
+        return self._respond(session_id, output, game)
+
+    def command(self, session_id, command):
+        if not isinstance(session_id, str) or not isinstance(command, str):
+            raise ApiError(400, "Expected a JSON object with 'session' and 'command' strings")
+        if len(command) > MAX_COMMAND:
+            raise ApiError(400, "That command is too long")
+        with self._lock(session_id):
+            game = self._load(session_id)
+            if not game.running:
+                raise ApiError(409, "This game is over")
+            output = self._run(game, game.parse_command, command.strip())
+            self._save(session_id, game)
+        return self._respond(session_id, output, game)
+
+    def state(self, session_id):
+        with self._lock(session_id):
+            game = self._load(session_id)
+        return json.dumps({'session': session_id, 'state': _state(game)}).encode('utf-8')
+
+    def delete(self, session_id):
+        with self._lock(session_id):
+            self.cache.discard(session_id)
+            self.store.delete(session_id)
+        return b'{}'
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Routes HTTP requests to the server's GameApi"""
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, route):
+        try:
+            body = route()
+        except ApiError as error:
+            self._send(error.status, json.dumps({'error': str(error)}).encode('utf-8'))
+        else:
+            self._send(200, body)
+
+    def _body(self):
+        header = self.headers['Content-Length']
+        try:
+            length = int(header) if header is not None else 0
+        except ValueError:
+            raise ApiError(400, "Invalid Content-Length") from None
+        if length < 0:
+            raise ApiError(400, "Invalid Content-Length")
+        if length > MAX_BODY:
+            raise ApiError(413, "Request too large")
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            raise ApiError(400, "Request body is not JSON") from None
+        if not isinstance(body, dict):
+            raise ApiError(400, "Expected a JSON object")
+        return body
+
+    def _session_id(self):
+        prefix, _, session_id = self.path.partition('/session/')
+        if prefix or not session_id:
+            raise ApiError(404, "Not found")
+        return session_id
+
+    def do_POST(self):
+        api = self.server.api
+
+        def route():
+            body = self._body()
+            if self.path == '/session':
+                return api.create()
+            if self.path == '/command':
+                return api.command(body.get('session'), body.get('command'))
+            raise ApiError(404, "Not found")
+        self._handle(route)
+
+    def do_GET(self):
+        self._handle(lambda: self.server.api.state(self._session_id()))
+
+    def do_DELETE(self):
+        self._handle(lambda: self.server.api.delete(self._session_id()))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(api, host='127.0.0.1', port=8080):
+    """Return an HTTP server (not yet serving) for a GameApi"""
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    server.api = api
+    return server
+
+
+def main():
+    """Run the API server from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve Cave Adventure over HTTP/JSON")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--store', default='memory',
+                        help="Session store: memory, sqlite:<path> or dbm:<path> (default memory)")
+    parser.add_argument('--cache-size', type=int, default=1000,
+                        help="Live games kept in memory (0 to always load from the store)")
+    parser.add_argument('--autosave', type=float, metavar='SECONDS',
+                        help="Save sessions in the background every SECONDS instead of on every command")
+    parser.add_argument('--recover', action='store_true',
+                        help="Check the store for broken sessions before serving")
+    args = parser.parse_args()
+
+    store = open_store(args.store)
+    if args.recover:
+        from persistence import recover
+        kept, removed = recover(store)
+        print(f"Recovered {kept} sessions, removed {removed} broken ones")
+    if args.autosave:
+        from persistence import WriteBehindStore
+        store = WriteBehindStore(store, args.autosave)
+    server = make_server(GameApi(store, args.cache_size), args.host, args.port)
+    print(f"Cave Adventure API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    finally:
+        server.server_close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
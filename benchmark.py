@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Cave Adventure - Benchmarks
+
+Measures the costs that matter when hosting many games:
+
+    construct       Game() construction (games/s)
+    command.<mix>   Game.parse_command throughput per kind of command, each
+                    run in a game where it succeeds (see COMMAND_MIXES)
+    playthrough     scripted games from the entrance to the guardian (games/s)
+    combat          attacks in a guardian fight (attacks/s)
+    describe        Room.describe rendering to a text sink (rooms/s)
+    memory          memory retained per live session (bytes/session)
+
+Output goes to a NullOutput (or a text sink that discards its lines for
+describe) so only the game logic is timed. Each timing is the best of
+several rounds, with the garbage collector off as in timeit, and the whole
+suite is run several times (--runs); a benchmark's value is its best run,
+since noise from the rest of the machine only ever makes runs slower.
+
+Results can be saved as JSON and compared against a stored baseline.
+Anything that got worse by more than the tolerance is reported as a
+regression and the exit status is 1. The tolerance is widened to the
+spread seen between runs (in the baseline or now), so a benchmark that
+is noisy on this machine is not flagged for its noise:
+
+    python3 benchmark.py --output baseline.json
+    python3 benchmark.py --baseline baseline.json --tolerance 0.1
+"""
+
+import gc
+import json
+import platform
+import time
+import tracemalloc
+
+from adventure import Game, get_world
+from dice import RollStream
+from items import DAGGER, GUANO
+from output import NullOutput
+
+RESULTS_VERSION = 2
+
+
+def _start(game):
+    pass
+
+
+def _carrying_dagger(game):
+    game.parse_command('north')
+    game.parse_command('take dagger')
+    game.parse_command('south')
+
+
+def _in_arsenal(game):
+    game.parse_command('north')
+
+
+def _hurt_with_guano(game):
+    game.inventory.add(GUANO)
+    game.player_hp = 1
+
+
+def _fighting_guardian(game):
+    for command in COMBAT_SETUP:
+        game.parse_command(command)
+
+
+# Command mixes: (prepare, commands, repeatable). prepare puts a new game
+# in a state where the commands succeed. Repeatable mixes are cycled in
+# order in one game (movement pairs bring the player back to the starting
+# room); the others change the game for good, an item taken or used or
+# the guardian hurt, so each of their commands runs in a game of its own.
+COMMAND_MIXES = {
+    'look': (_start, ['look'], True),
+    'move': (_start, ['north', 'south'], True),
+    'go': (_start, ['go north', 'go south'], True),
+    'inventory': (_carrying_dagger, ['inventory'], True),
+    'status': (_carrying_dagger, ['status'], True),
+    'take': (_in_arsenal, [f'take {DAGGER}'], False),
+    'use': (_hurt_with_guano, ['use guano'], False),
+    'attack': (_fighting_guardian, ['attack dagger'], False),
+    'help': (_start, ['help'], True),
+    'unknown': (_start, ['xyzzy'], True),
+}
+
+# The secret path of test_playthrough.txt: shield, dagger, then the
+# surprise attack. The fight is finished with FINISHING_BLOW.
+PLAYTHROUGH = ['west', 'north', 'east', 'take shield', 'east', 'take dagger', 'south',
+               'east', 'north', 'north', 'down', 'forward']
+FINISHING_BLOW = 'attack dagger'
+
+# Walks from the entrance into the guardian's lair with the dagger
+COMBAT_SETUP = ['north', 'take dagger', 'east', 'east']
+
+# Commands played by every session of the memory benchmark before measuring
+MEMORY_SCRIPT = ['north', 'take dagger', 'south']
+
+
+class TextSink(NullOutput):
+    """Accepts text like a console but throws it away"""
+    text = True
+
+
+def _timed(func):
+    """Time one call to func() with the garbage collector off"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _best(func, rounds):
+    """Return the shortest of several timed calls to func()"""
+    return min(_timed(func) for _ in range(rounds))
+
+
+def bench_commands(prepare, commands, repeatable=True, repeat=50000, rounds=5):
+    """Return commands/second for a command mix, in games set up by prepare"""
+    if not repeatable:
+        return bench_one_shot(prepare, commands, repeat // 10, rounds)
+    game = Game(NullOutput())
+    prepare(game)
+    parse = game.parse_command
+    batch = (commands * (repeat // len(commands) + 1))[:repeat]
+
+    def run():
+        for command in batch:
+            parse(command)
+    return repeat / _best(run, rounds)
+
+
+def bench_one_shot(prepare, commands, repeat=5000, rounds=5):
+    """Return commands/second for commands that each get a freshly prepared game"""
+    output = NullOutput()
+    best = float('inf')
+    for _ in range(rounds):
+        games = []
+        for seed in range(repeat):
+            game = Game(output, rng=RollStream(seed))
+            prepare(game)
+            games.append((game.parse_command, commands[seed % len(commands)]))
+
+        def run():
+            for parse, command in games:
+                parse(command)
+        best = min(best, _timed(run))
+    return repeat / best
+
+
+def bench_dispatch(repeat=50000, rounds=5):
+    """Return {mix name: commands/second} for every command mix"""
+    return {name: bench_commands(*mix, repeat, rounds) for name, mix in COMMAND_MIXES.items()}
+
+
+def bench_construct(repeat=20000, rounds=5):
+    """Return games/second for Game() construction"""
+    world = get_world()
+    output = NullOutput()
+
+    def run():
+        for _ in range(repeat):
+            Game(output, world=world)
+    return repeat / _best(run, rounds)
+
+
+def bench_playthrough(repeat=2000, rounds=5):
+    """Return games/second for scripted games played to the end"""
+    output = NullOutput()
+
+    def run():
+        for seed in range(repeat):
+            game = Game(output, rng=RollStream(seed))
+            parse = game.parse_command
+            for command in PLAYTHROUGH:
+                parse(command)
+            while game.running and game.in_combat:
+                parse(FINISHING_BLOW)
+    return repeat / _best(run, rounds)
+
+
+def bench_combat(repeat=2000, rounds=5):
+    """Return attacks/second in guardian fights, not counting the walk there"""
+    output = NullOutput()
+    best = float('inf')
+    for _ in range(rounds):
+        games = []
+        for seed in range(repeat):
+            game = Game(output, rng=RollStream(seed))
+            _fighting_guardian(game)
+            games.append(game)
+        attacks = 0
+
+        def run():
+            nonlocal attacks
+            for game in games:
+                parse = game.parse_command
+                while game.running and game.in_combat:
+                    parse(FINISHING_BLOW)
+                    attacks += 1
+        best = min(best, _timed(run) / attacks)
+    return 1 / best
+
+
+def bench_describe(repeat=20000, rounds=5):
+    """Return rooms/second for Room.describe over every room of the cave"""
+    game = Game(NullOutput())
+    rooms = [game.rooms[key] for key in game.world.templates]
+    batch = (rooms * (repeat // len(rooms) + 1))[:repeat]
+    output = TextSink()
+
+    def run():
+        for room in batch:
+            room.describe(output)
+    return repeat / _best(run, rounds)
+
+
+def bench_memory(sessions=5000):
+    """Return bytes retained per live session that has played MEMORY_SCRIPT"""
+    world = get_world()
+    output = NullOutput()
+    # Warm up shared state (world, command table, caches) before measuring
+    Game(output, world=world).parse_command('look')
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        games = []
+        for _ in range(sessions):
+            game = Game(output, world=world)
+            for command in MEMORY_SCRIPT:
+                game.parse_command(command)
+            games.append(game)
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return retained / sessions
+
+
+def run_once(scale=1.0, rounds=5):
+    """Run every benchmark once; return {name: (value, unit)}"""
+    def n(count):
+        return max(1, int(count * scale))
+
+    results = {'construct': (bench_construct(n(20000), rounds), 'games/s')}
+    for name, mix in COMMAND_MIXES.items():
+        results[f'command.{name}'] = (bench_commands(*mix, n(50000), rounds), 'commands/s')
+    results['playthrough'] = (bench_playthrough(n(2000), rounds), 'games/s')
+    results['combat'] = (bench_combat(n(2000), rounds), 'attacks/s')
+    results['describe'] = (bench_describe(n(20000), rounds), 'rooms/s')
+    results['memory'] = (bench_memory(n(5000)), 'bytes/session')
+    return results
+
+
+def run_all(scale=1.0, rounds=5, runs=3):
+    """Run every benchmark runs times; return {name: {"value", "samples", "unit", "better"}}
+
+    samples has one value per run, and value is the best of them. scale
+    multiplies the repeat counts (use less than 1 for a quick run).
+    """
+    samples = {}
+    units = {}
+    for _ in range(runs):
+        for name, (value, unit) in run_once(scale, rounds).items():
+            samples.setdefault(name, []).append(value)
+            units[name] = unit
+    results = {}
+    for name, values in samples.items():
+        better = 'lower' if units[name].startswith('bytes') else 'higher'
+        results[name] = {'value': min(values) if better == 'lower' else max(values), 'samples': values,
+                         'unit': units[name], 'better': better}
+    return results
+
+
+def spread(result):
+    """Return how far apart a benchmark's runs were, relative to its value"""
+    samples = result.get('samples') or [result['value']]
+    return (max(samples) - min(samples)) / result['value'] if result['value'] else 0.0
+
+
+def save_results(results, path):
+    """Write results to a JSON file along with where they were measured"""
+    document = {
+        'version': RESULTS_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+        f.write("\n")
+
+
+def load_results(path):
+    """Read the results of a JSON file written by save_results()"""
+    with open(path, encoding='utf-8') as f:
+        document = json.load(f)
+    if document.get('version') != RESULTS_VERSION:
+        raise ValueError(f"{path}: unsupported results version {document.get('version')!r}")
+    return document['results']
+
+
+def compare(results, baseline, tolerance=0.10):
+    """Return [(name, old, new, change, limit)] for every benchmark in both
+
+    change is the relative improvement: positive is better, whichever way
+    the benchmark counts. limit is the tolerance, or the spread between
+    runs in either set of results if that is larger; a change below -limit
+    is a regression.
+    """
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]['value'], result['value']
+        change = (new - old) / old if old else 0.0
+        if result['better'] == 'lower':
+            change = -change
+        limit = max(tolerance, spread(result), spread(baseline[name]))
+        rows.append((name, old, new, change, limit))
+    return rows
+
+
+def main():
+    """Run the benchmarks, print them and optionally save or compare them"""
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Benchmark Cave Adventure")
+    parser.add_argument('--output', metavar='PATH', help="Save the results as JSON")
+    parser.add_argument('--baseline', metavar='PATH', help="Compare against saved results")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="Relative slowdown reported as a regression (default 0.10)")
+    parser.add_argument('--runs', type=int, default=3,
+                        help="Times to run the whole suite; the best run counts (default 3)")
+    parser.add_argument('--quick', action='store_true', help="Fewer repetitions, noisier numbers")
+    args = parser.parse_args()
+    if args.runs < 1:
+        parser.error("--runs must be at least 1")
+
+    results = run_all(0.1 if args.quick else 1.0, 3 if args.quick else 5, args.runs)
+    if args.output:
+        save_results(results, args.output)
+
+    if not args.baseline:
+        for name, result in results.items():
+            print(f"{name:20} {result['value']:14,.0f} {result['unit']}")
+        return
+
+    regressions = 0
+    for name, old, new, change, limit in compare(results, load_results(args.baseline), args.tolerance):
+        flag = "  REGRESSION" if change < -limit else ""
+        regressions += bool(flag)
+        print(f"{name:20} {old:14,.0f} -> {new:14,.0f} {results[name]['unit']:14} {change:+7.1%} "
+              f"(limit {limit:.0%}){flag}")
+    if regressions:
+        print(f"\n{regressions} benchmark(s) regressed by more than their limit")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
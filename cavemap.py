@@ -0,0 +1,216 @@
+"""
+Cave Adventure - Map Drawing
+
+Lays the rooms of a world out on a grid by walking its exits from the
+starting room, and draws that grid as text:
+
+    [*]-[@]-[ ]     @ you are here
+     |       |      * visited
+    [ ] [*]-[ ]
+
+Passages are only drawn between rooms that ended up next to each other;
+a cave is rarely flat enough for every passage to fit.
+
+A MapLayout is computed once per world and shared by every game. Each
+game that opens the map gets its own MapView, which keeps the drawn
+lines of its viewport and on later calls only redraws the cells whose
+marks changed, scrolling the viewport when the player nears its edge.
+"""
+
+from collections import deque
+
+# Grid step for each direction. Directions without a compass meaning are
+# laid out as the compass direction they most resemble.
+OFFSETS = {
+    'north': (0, -1), 'south': (0, 1), 'east': (1, 0), 'west': (-1, 0),
+    'northeast': (1, -1), 'northwest': (-1, -1), 'southeast': (1, 1), 'southwest': (-1, 1),
+    'up': (0, -1), 'down': (0, 1), 'forward': (1, 0), 'back': (-1, 0),
+}
+
+# Grid step -> passage character and its place relative to the room it
+# starts from. Passages the other way round are drawn from the far room.
+_CONNECTORS = {(1, 0): ('-', 3, 0), (0, 1): ('|', 1, 1), (1, 1): ('\\', 3, 1), (-1, 1): ('/', -1, 1)}
+
+# Each room takes 4 columns and 2 lines of text, including passages
+CELL_WIDTH = 4
+CELL_HEIGHT = 2
+
+# Default viewport in rooms, sized for an 80x24 terminal
+VIEW_COLUMNS = 19
+VIEW_ROWS = 8
+
+YOU = '@'
+VISITED = '*'
+UNVISITED = ' '
+
+
+class MapLayout:
+    """Grid positions for every room of a world, laid out from its exits
+
+    Rooms are placed breadth first from the start, each one step from the
+    room it was reached from in the direction of the exit. When that cell
+    is taken the room goes to the nearest free cell instead. Rooms that
+    cannot be reached from the start are laid out to the right.
+    """
+    def __init__(self, templates, start):
+        self.templates = templates
+        self.positions = {}
+        self.cells = {}
+        self._place(start, (0, 0))
+        self._spread(start)
+        for key in templates:
+            if key not in self.positions:
+                left, top, right, bottom = self._measure()
+                self._place(key, (right + 2, top))
+                self._spread(key)
+        self._bounds = self._measure()
+
+    def _measure(self):
+        cols = [col for col, row in self.cells]
+        rows = [row for col, row in self.cells]
+        return min(cols), min(rows), max(cols), max(rows)
+
+    def _place(self, key, cell):
+        if cell in self.cells:
+            cell = self._free_near(cell)
+        self.positions[key] = cell
+        self.cells[cell] = key
+
+    def _free_near(self, cell):
+        col, row = cell
+        radius = 1
+        while True:
+            for dc in range(-radius, radius + 1):
+                for dr in (-radius, radius) if abs(dc) < radius else range(-radius, radius + 1):
+                    candidate = (col + dc, row + dr)
+                    if candidate not in self.cells:
+                        return candidate
+            radius += 1
+
+    def _spread(self, start):
+        queue = deque([start])
+        while queue:
+            key = queue.popleft()
+            col, row = self.positions[key]
+            for direction, target in self.templates[key].exits.items():
+                if target not in self.positions:
+                    dc, dr = OFFSETS.get(direction, (1, 0))
+                    self._place(target, (col + dc, row + dr))
+                    queue.append(target)
+
+    def position(self, key):
+        """Return the (column, row) of a room"""
+        return self.positions[key]
+
+    def at(self, col, row):
+        """Return the key of the room at (column, row), or None"""
+        return self.cells.get((col, row))
+
+    def exits(self, key):
+        return self.templates[key].exits
+
+    def bounds(self):
+        """Return (left, top, right, bottom), inclusive"""
+        return self._bounds
+
+
+class MapView:
+    """One player's view of a layout, redrawn incrementally
+
+    columns and rows limit the viewport in rooms; None shows the whole
+    layout.
+    """
+    def __init__(self, layout, columns=None, rows=None):
+        self.layout = layout
+        self.columns = columns
+        self.rows = rows
+        self.window = None
+        self._canvas = []
+        self._lines = []
+        self._dirty = set()
+        self._marked = set()
+        self._player = None
+
+    def _fit(self, col, row):
+        """Return the window (left, top, columns, rows) to show around (col, row)"""
+        left, top, right, bottom = self.layout.bounds()
+        width, height = right - left + 1, bottom - top + 1
+        columns = width if self.columns is None else min(self.columns, width)
+        rows = height if self.rows is None else min(self.rows, height)
+        left = max(left, min(col - columns // 2, right - columns + 1))
+        top = max(top, min(row - rows // 2, bottom - rows + 1))
+        return left, top, columns, rows
+
+    def _needs_scroll(self, col, row):
+        if self.window is None:
+            return True
+        left, top, columns, rows = self.window
+        margin_x, margin_y = columns // 4, rows // 4
+        bounds = self.layout.bounds()
+        # Scroll when the player is near an edge, unless the edge is the map's
+        return not ((left + margin_x <= col or left == bounds[0])
+                    and (col < left + columns - margin_x or left + columns > bounds[2])
+                    and (top + margin_y <= row or top == bounds[1])
+                    and (row < top + rows - margin_y or top + rows > bounds[3]))
+
+    def _draw(self, window):
+        """Draw every room and passage in the window"""
+        self.window = left, top, columns, rows = window
+        width, height = columns * CELL_WIDTH - 1, rows * CELL_HEIGHT - 1
+        canvas = [[' '] * width for _ in range(height)]
+        layout = self.layout
+        for row in range(top, top + rows):
+            for col in range(left, left + columns):
+                key = layout.at(col, row)
+                if key is None:
+                    continue
+                x, y = (col - left) * CELL_WIDTH, (row - top) * CELL_HEIGHT
+                canvas[y][x:x + 3] = '[', UNVISITED, ']'
+                for target in layout.exits(key).values():
+                    tc, tr = layout.position(target)
+                    step = (tc - col, tr - row)
+                    if step in _CONNECTORS:
+                        char, cx, cy = _CONNECTORS[step]
+                        cx, cy = x + cx, y + cy
+                    elif (-step[0], -step[1]) in _CONNECTORS:
+                        char, cx, cy = _CONNECTORS[(-step[0], -step[1])]
+                        cx, cy = x + step[0] * CELL_WIDTH + cx, y + step[1] * CELL_HEIGHT + cy
+                    else:
+                        continue
+                    if 0 <= cx < width and 0 <= cy < height:
+                        canvas[cy][cx] = char
+        self._canvas = canvas
+        self._lines = [''] * height
+        self._dirty = set(range(height))
+        self._marked = set()
+        self._player = None
+
+    def _mark(self, key, char):
+        left, top, columns, rows = self.window
+        col, row = self.layout.position(key)
+        if left <= col < left + columns and top <= row < top + rows:
+            y = (row - top) * CELL_HEIGHT
+            self._canvas[y][(col - left) * CELL_WIDTH + 1] = char
+            self._dirty.add(y)
+
+    def render(self, player, visited):
+        """Return the map lines with the player at room key player
+
+        visited is the set of room keys the player has been to.
+        """
+        col, row = self.layout.position(player)
+        if self._needs_scroll(col, row):
+            self._draw(self._fit(col, row))
+        new = visited - self._marked
+        for key in new:
+            self._mark(key, VISITED)
+        self._marked |= new
+        if self._player != player:
+            if self._player is not None:
+                self._mark(self._player, VISITED if self._player in visited else UNVISITED)
+            self._mark(player, YOU)
+            self._player = player
+        for y in self._dirty:
+            self._lines[y] = ''.join(self._canvas[y]).rstrip()
+        self._dirty.clear()
+        return self._lines
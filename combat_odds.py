@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Cave Adventure - Exact Combat Odds
+
+Treats a fight as a finite Markov chain over
+(player_hp, enemy_hp, surprised, has_guano) for a fixed enemy, weapon and
+maximum HP, and solves it exactly with memoized dynamic programming.
+Results for every starting state are kept in precomputed tables so a
+lookup costs a single dict access.
+"""
+
+from functools import lru_cache
+
+from combat_sim import ENEMY_DAMAGE, ENEMY_HP, PLAYER_HP, SHIELD_BONUS
+from items import DAGGER, ITEMS
+from rules import STANDARD_RULES
+
+
+class Odds:
+    """Outcome probabilities of a fight from a given state"""
+    __slots__ = ('win', 'death', 'retreat', 'expected_turns', 'action')
+
+    def __init__(self, win, death, retreat, expected_turns, action):
+        self.win = win
+        self.death = death
+        self.retreat = retreat
+        self.expected_turns = expected_turns
+        self.action = action
+
+    def __repr__(self):
+        return (f"Odds(win={self.win:.4f}, death={self.death:.4f}, retreat={self.retreat:.4f}, "
+                f"expected_turns={self.expected_turns:.2f}, action={self.action!r})")
+
+
+class Policy:
+    """How the player behaves during a fight
+
+    retreat_at: retreat as soon as HP is at or below this value (0 = never)
+    guano_at:   eat the bat guano once HP is at or below this value (0 = never)
+    optimal:    ignore the thresholds and pick whichever of attack / use guano
+                maximizes the chance of winning
+    """
+    __slots__ = ('retreat_at', 'guano_at', 'optimal')
+
+    def __init__(self, retreat_at=0, guano_at=0, optimal=False):
+        self.retreat_at = retreat_at
+        self.guano_at = guano_at
+        self.optimal = optimal
+
+    def key(self):
+        return (self.retreat_at, self.guano_at, self.optimal)
+
+    def __repr__(self):
+        if self.optimal:
+            return "Policy(optimal=True)"
+        return f"Policy(retreat_at={self.retreat_at}, guano_at={self.guano_at})"
+
+
+ALWAYS_ATTACK = Policy()
+OPTIMAL = Policy(optimal=True)
+
+
+def _distribution(damage_range):
+    low, high = damage_range
+    p = 1.0 / (high - low + 1)
+    return tuple((d, p) for d in range(low, high + 1))
+
+
+def make_solver(enemy='guardian', dagger=True, max_hp=None, policy=ALWAYS_ATTACK, rules=STANDARD_RULES,
+                damage=None):
+    """Return a memoized solve(player_hp, enemy_hp, surprised, has_guano) -> Odds
+
+    max_hp defaults to the rules' player_hp; damage, a (low, high) range,
+    replaces the dagger's or bare hands' damage for other weapons.
+    """
+    if enemy not in ENEMY_DAMAGE:
+        raise ValueError(f"Unknown enemy: {enemy}")
+    if max_hp is None:
+        max_hp = rules.player_hp
+    if damage is None:
+        damage = rules.dagger_damage if dagger else rules.bare_hands_damage
+
+    player_dist = _distribution(damage)
+    enemy_dist = _distribution(rules.enemy_damage(enemy))
+    can_surprise = enemy == 'guardian'
+
+    def attack(php, ehp, surprised, guano):
+        win = death = retreat = turns = 0.0
+        for dealt, p_dealt in player_dist:
+            left = ehp - dealt
+            if left <= 0:
+                win += p_dealt
+                continue
+            if surprised:
+                sub = solve(php, left, False, guano)
+                win += p_dealt * sub.win
+                death += p_dealt * sub.death
+                retreat += p_dealt * sub.retreat
+                turns += p_dealt * sub.expected_turns
+                continue
+            for taken, p_taken in enemy_dist:
+                p = p_dealt * p_taken
+                hp = php - taken
+                if hp <= 0:
+                    death += p
+                    continue
+                sub = solve(hp, left, False, guano)
+                win += p * sub.win
+                death += p * sub.death
+                retreat += p * sub.retreat
+                turns += p * sub.expected_turns
+        return Odds(win, death, retreat, 1.0 + turns, 'attack')
+
+    def eat(php, ehp, surprised):
+        sub = solve(max_hp, ehp, surprised, False)
+        return Odds(sub.win, sub.death, sub.retreat, sub.expected_turns, 'use guano')
+
+    @lru_cache(maxsize=None)
+    def solve(php, ehp, surprised, guano):
+        surprised = surprised and can_surprise
+        guano = guano and php < max_hp
+        if policy.optimal:
+            best = attack(php, ehp, surprised, guano)
+            if guano:
+                healed = eat(php, ehp, surprised)
+                if healed.win > best.win:
+                    best = healed
+            return best
+        if php <= policy.retreat_at:
+            return Odds(0.0, 0.0, 1.0, 0.0, 'retreat')
+        if guano and php <= policy.guano_at:
+            return eat(php, ehp, surprised)
+        return attack(php, ehp, surprised, guano)
+
+    return solve
+
+
+class OddsTable:
+    """Precomputed odds for every state of every standard loadout"""
+    def __init__(self, policy=ALWAYS_ATTACK):
+        self.policy = policy
+        self.table = {}
+        for enemy in sorted(ENEMY_HP):
+            for dagger in (False, True):
+                for shield in (False, True):
+                    max_hp = PLAYER_HP + (SHIELD_BONUS if shield else 0)
+                    solve = make_solver(enemy, dagger, max_hp, policy)
+                    for php in range(1, max_hp + 1):
+                        for ehp in range(1, ENEMY_HP[enemy] + 1):
+                            for surprised in (False, True):
+                                for guano in (False, True):
+                                    self.table[(enemy, dagger, shield, php, ehp, surprised, guano)] = \
+                                        solve(php, ehp, surprised, guano)
+
+    def lookup(self, enemy, dagger, shield, player_hp, enemy_hp, surprised=False, guano=False):
+        """Return the Odds for a state, or None if it is outside the table"""
+        return self.table.get((enemy, dagger, shield, player_hp, enemy_hp,
+                               surprised and enemy == 'guardian', guano))
+
+
+_tables = {}
+
+
+def get_table(policy=ALWAYS_ATTACK):
+    """Return the shared OddsTable for a policy, building it on first use"""
+    key = policy.key()
+    table = _tables.get(key)
+    if table is None:
+        table = _tables[key] = OddsTable(policy)
+    return table
+
+
+def odds_for_game(game, policy=ALWAYS_ATTACK):
+    """Return the Odds of the fight the game is currently in, or None"""
+    if not game.in_combat or game.combat_enemy not in ENEMY_HP:
+        return None
+    enemy = game.combat_enemy
+    enemy_hp = game.guardian_hp if enemy == 'guardian' else game.bat_hp
+    # The best weapon carried, and whether anything carried heals
+    weapon = game.inventory.weapon(game.rules)
+    dagger = weapon is not None and weapon.name == DAGGER
+    damage = weapon.damage_for(game.rules) if weapon is not None and not dagger else None
+    guano = any(ITEMS[name].heals for name in game.inventory.kinds())
+    odds = None
+    # The table assumes the max HP of the standard loadout, which other HP items change
+    table_max_hp = PLAYER_HP + (SHIELD_BONUS if game.has_shield else 0)
+    if game.rules == STANDARD_RULES and damage is None and game.player_max_hp == table_max_hp:
+        odds = get_table(policy).lookup(enemy, dagger, game.has_shield, game.player_hp, enemy_hp,
+                                        game.surprised_guardian, guano)
+    if odds is None:
+        # Non-standard rules, weapon, max HP or state; solve it directly
+        solve = make_solver(enemy, dagger, game.player_max_hp, policy, game.rules, damage)
+        odds = solve(game.player_hp, enemy_hp, game.surprised_guardian, guano)
+    return odds
+
+
+def main():
+    """Print exact odds for the standard loadouts"""
+    for enemy in sorted(ENEMY_HP):
+        for dagger in (False, True):
+            for shield in (False, True):
+                max_hp = PLAYER_HP + (SHIELD_BONUS if shield else 0)
+                for surprised in (False, True):
+                    if surprised and enemy != 'guardian':
+                        continue
+                    odds = get_table().lookup(enemy, dagger, shield, max_hp, ENEMY_HP[enemy], surprised)
+                    print(f"{enemy:8} dagger={dagger!s:5} shield={shield!s:5} surprised={surprised!s:5} "
+                          f"win={odds.win:7.3%} death={odds.death:7.3%} turns={odds.expected_turns:.2f}")
+
+
+if __name__ == "__main__":
+    main()
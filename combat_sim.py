@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Cave Adventure - Headless Combat Simulator
+
+Runs large batches of fights using the same rules as Game.attack,
+Game.guardian_counterattack and Game.bat_counterattack, without any
+console output, so balance questions can be answered in seconds.
+"""
+
+import random
+from collections import Counter
+
+from rules import STANDARD_RULES
+
+# The standard rules' damage ranges (inclusive, as passed to random.randint)
+DAGGER_DAMAGE = STANDARD_RULES.dagger_damage
+BARE_HANDS_DAMAGE = STANDARD_RULES.bare_hands_damage
+GUARDIAN_DAMAGE = STANDARD_RULES.guardian_damage
+BAT_DAMAGE = STANDARD_RULES.bat_damage
+
+# Starting values
+PLAYER_HP = STANDARD_RULES.player_hp
+SHIELD_BONUS = STANDARD_RULES.shield_bonus
+GUARDIAN_HP = STANDARD_RULES.guardian_hp
+BAT_HP = STANDARD_RULES.bat_hp
+
+ENEMY_DAMAGE = {'guardian': GUARDIAN_DAMAGE, 'bat': BAT_DAMAGE}
+ENEMY_HP = {'guardian': GUARDIAN_HP, 'bat': BAT_HP}
+
+
+class FightStats:
+    """Aggregated results of a batch of simulated fights"""
+    def __init__(self, enemy):
+        self.enemy = enemy
+        self.fights = 0
+        self.wins = 0
+        self.deaths = 0
+        self.turns_to_kill = Counter()     # player attacks needed, wins only
+        self.turns_to_die = Counter()      # player attacks made, deaths only
+        self.hp_remaining = Counter()      # player HP left, wins only
+        self.enemy_hp_remaining = Counter()  # enemy HP left, deaths only
+
+    @property
+    def win_rate(self):
+        return self.wins / self.fights if self.fights else 0.0
+
+    @property
+    def average_turns(self):
+        total = sum(t * c for t, c in self.turns_to_kill.items())
+        total += sum(t * c for t, c in self.turns_to_die.items())
+        return total / self.fights if self.fights else 0.0
+
+    def merge(self, other):
+        """Fold another batch of results into this one"""
+        self.fights += other.fights
+        self.wins += other.wins
+        self.deaths += other.deaths
+        self.turns_to_kill.update(other.turns_to_kill)
+        self.turns_to_die.update(other.turns_to_die)
+        self.hp_remaining.update(other.hp_remaining)
+        self.enemy_hp_remaining.update(other.enemy_hp_remaining)
+        return self
+
+    def summary(self):
+        """Return a short human-readable report"""
+        lines = [
+            f"Fights: {self.fights}",
+            f"Win rate: {self.win_rate:.2%}",
+            f"Average turns: {self.average_turns:.2f}",
+            "Turns to kill: " + _format_histogram(self.turns_to_kill),
+            "HP remaining: " + _format_histogram(self.hp_remaining),
+        ]
+        return "\n".join(lines)
+
+
+def _format_histogram(counter):
+    if not counter:
+        return "-"
+    return ", ".join(f"{k}:{counter[k]}" for k in sorted(counter))
+
+
+def _roll_buffer(rng, damage_range, size):
+    """Pre-draw a block of damage rolls"""
+    low, high = damage_range
+    return rng.choices(range(low, high + 1), k=size)
+
+
+def simulate(fights, enemy='guardian', dagger=True, shield=False, surprised=False,
+             player_hp=None, enemy_hp=None, seed=None, batch_size=65536, rules=None):
+    """Simulate many fights and return a FightStats
+
+    Each turn the player attacks first. The enemy counterattacks unless it
+    was just killed, or it is the guardian's first turn after a surprise
+    entrance from guardians_lair_back. rules are the CombatRules to fight
+    by (the standard rules by default).
+    """
+    if enemy not in ENEMY_DAMAGE:
+        raise ValueError(f"Unknown enemy: {enemy}")
+
+    rules = rules if rules is not None else STANDARD_RULES
+    rng = random.Random(seed)
+    player_damage = rules.dagger_damage if dagger else rules.bare_hands_damage
+    enemy_damage = rules.enemy_damage(enemy)
+    if player_hp is not None:
+        start_hp = player_hp
+    else:
+        start_hp = rules.player_hp + (rules.shield_bonus if shield else 0)
+    start_enemy_hp = enemy_hp if enemy_hp is not None else rules.enemy_hp(enemy)
+    free_hit = surprised and enemy == 'guardian'
+
+    # Every player hit deals at least the minimum damage, which bounds
+    # how many rolls a single fight can consume.
+    max_turns = -(-start_enemy_hp // max(1, player_damage[0]))
+    batch_size = max(batch_size, max_turns * 4)
+
+    stats = FightStats(enemy)
+    wins = deaths = 0
+    turns_to_kill = stats.turns_to_kill
+    turns_to_die = stats.turns_to_die
+    hp_remaining = stats.hp_remaining
+    enemy_hp_remaining = stats.enemy_hp_remaining
+
+    p_rolls = _roll_buffer(rng, player_damage, batch_size)
+    e_rolls = _roll_buffer(rng, enemy_damage, batch_size)
+    pi = ei = 0
+    limit = batch_size - max_turns
+
+    for _ in range(fights):
+        if pi > limit:
+            p_rolls = _roll_buffer(rng, player_damage, batch_size)
+            pi = 0
+        if ei > limit:
+            e_rolls = _roll_buffer(rng, enemy_damage, batch_size)
+            ei = 0
+
+        php = start_hp
+        ehp = start_enemy_hp
+        free = free_hit
+        turns = 0
+        while True:
+            ehp -= p_rolls[pi]
+            pi += 1
+            turns += 1
+            if ehp <= 0:
+                wins += 1
+                turns_to_kill[turns] += 1
+                hp_remaining[php] += 1
+                break
+            if free:
+                free = False
+                continue
+            php -= e_rolls[ei]
+            ei += 1
+            if php <= 0:
+                deaths += 1
+                turns_to_die[turns] += 1
+                enemy_hp_remaining[ehp] += 1
+                break
+
+    stats.fights = fights
+    stats.wins = wins
+    stats.deaths = deaths
+    return stats
+
+
+def main():
+    """Print win rates for the standard loadouts"""
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Simulate Cave Adventure fights")
+    parser.add_argument('-n', '--fights', type=int, default=1000000)
+    parser.add_argument('--enemy', choices=sorted(ENEMY_DAMAGE), default='guardian')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    for dagger in (False, True):
+        for shield in (False, True):
+            for surprised in (False, True):
+                if surprised and args.enemy != 'guardian':
+                    continue
+                start = time.perf_counter()
+                stats = simulate(args.fights, args.enemy, dagger, shield, surprised, seed=args.seed)
+                elapsed = time.perf_counter() - start
+                print(f"\n{args.enemy} | dagger={dagger} shield={shield} surprised={surprised} "
+                      f"({stats.fights / elapsed:,.0f} fights/s)")
+                print(stats.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Cave Adventure - Dice
+
+Every Game owns a RollStream: a seeded source of dice rolls whose whole
+state is (seed, number of rolls used). That makes sessions reproducible,
+keeps games in the same process independent, and lets a snapshot store
+the RNG in a few bytes.
+
+Raw 32-bit values are generated in blocks from a single getrandbits()
+call, and a roll maps a raw value onto its range with a multiply and
+shift instead of calling random.randint for every roll.
+"""
+
+import random
+import sys
+from array import array
+
+BLOCK_SIZE = 64
+
+
+def new_seed():
+    """Return a fresh random 64-bit seed"""
+    return random.getrandbits(64)
+
+
+class RollStream:
+    """A seeded, replayable stream of dice rolls
+
+    The generator itself is only created on the first roll, so creating or
+    restoring a stream is cheap for games that never fight.
+    """
+    __slots__ = ('seed', 'position', '_random', '_block', '_index')
+
+    def __init__(self, seed=None, position=0):
+        self.seed = new_seed() if seed is None else seed
+        self.position = position
+        self._random = None
+        self._block = ()
+        self._index = 0
+
+    def _refill(self):
+        index = 0
+        if self._random is None:
+            self._random = random.Random(self.seed)
+            # Catch up with rolls made before a restore, a block at a time
+            blocks, index = divmod(self.position, BLOCK_SIZE)
+            for _ in range(blocks):
+                self._random.getrandbits(32 * BLOCK_SIZE)
+        bits = self._random.getrandbits(32 * BLOCK_SIZE)
+        block = array('I', bits.to_bytes(4 * BLOCK_SIZE, 'little'))
+        if sys.byteorder == 'big':
+            block.byteswap()
+        self._block = block
+        self._index = index
+
+    def randint(self, low, high):
+        """Return a roll between low and high inclusive"""
+        if self._index >= len(self._block):
+            self._refill()
+        value = self._block[self._index]
+        self._index += 1
+        self.position += 1
+        return low + ((value * (high - low + 1)) >> 32)
+
+    def rolls(self, low, high, count):
+        """Return a list of count rolls between low and high inclusive"""
+        randint = self.randint
+        return [randint(low, high) for _ in range(count)]
+
+    def skip(self, count):
+        """Advance the stream as if count rolls had been made"""
+        self.position += count
+        if self._random is None:
+            return
+        index = self._index + count
+        if index > BLOCK_SIZE:
+            ahead, index = divmod(index, BLOCK_SIZE)
+            for _ in range(ahead - 1):
+                self._random.getrandbits(32 * BLOCK_SIZE)
+            self._refill()
+        self._index = index
+
+    def state(self):
+        """Return (seed, position), enough to recreate the stream exactly"""
+        return self.seed, self.position
+
+    @classmethod
+    def from_state(cls, state):
+        seed, position = state
+        return cls(seed, position)
+
+    def __repr__(self):
+        return f"RollStream(seed={self.seed}, position={self.position})"
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Cave Adventure - Event Log
+
+Records the structured events games emit (see Game.emit) to an
+append-only log, one compact JSON object per line:
+
+    {"t":1760000000123,"s":"3f9c0d2a71e4b6a8","e":"player_died","room":"bat_colony","cause":"bat"}
+
+t is the time in milliseconds, s the session id and e the event kind; the
+rest is the event's data. Every session starts with a session_started
+event.
+
+Lines are buffered in memory and written in batches. When the file grows
+past max_bytes it is renamed to <path>.1 (older files shift to .2, .3,
+...) and a new file is started, so files are only ever appended to and
+at most `backups` old files are kept.
+
+The Aggregator reads logs back as a stream, one event at a time, and
+builds per-room death heatmaps, room reach rates, funnel stats and fight
+summaries. Memory use is bounded by the number of rooms plus a fixed
+number of sessions still in progress, however long the logs are.
+
+    python3 eventlog.py events.log events.log.1 --sessions 100000
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+# Funnel stages in order: (name, event kind, matching data or None)
+FUNNEL = (
+    ('started', 'session_started', None),
+    ('found dagger', 'item_taken', {'item': 'shiny dagger'}),
+    ('found shield', 'item_taken', {'item': 'ancient shield'}),
+    ('fought guardian', 'combat_started', {'enemy': 'guardian'}),
+    ('won', 'game_won', None),
+)
+
+# Events after which a session makes no more progress
+FINAL_EVENTS = ('player_died', 'game_won', 'game_quit')
+
+
+class EventLog:
+    """Buffered, rotating, append-only event log shared by many sessions
+
+    Safe to use from several threads. Lines are written once buffer_size
+    bytes have collected, or on flush() and close().
+    """
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, backups=5, buffer_size=64 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.buffer_size = buffer_size
+        self._lines = []
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+
+    def session(self, output=None):
+        """Return an output sink that logs the events of one new session
+
+        Text is passed on to output (if any) unchanged.
+        """
+        session = EventLogOutput(self, os.urandom(8).hex(), output)
+        self.record(session.session_id, 'session_started', {})
+        return session
+
+    def record(self, session_id, kind, data):
+        line = json.dumps({'t': int(time.time() * 1000), 's': session_id, 'e': kind, **data},
+                          separators=(',', ':')) + "\n"
+        with self._lock:
+            self._lines.append(line)
+            self._buffered += len(line)
+            if self._buffered >= self.buffer_size:
+                self._write()
+
+    def _write(self):
+        if not self._lines:
+            return
+        if self._size >= self.max_bytes:
+            self._rotate()
+        text = ''.join(self._lines)
+        self._file.write(text)
+        self._file.flush()
+        self._size += len(text.encode('utf-8'))
+        self._lines = []
+        self._buffered = 0
+
+    def _rotate(self):
+        self._file.close()
+        if self.backups > 0:
+            for number in range(self.backups - 1, 0, -1):
+                older = f"{self.path}.{number}"
+                if os.path.exists(older):
+                    os.replace(older, f"{self.path}.{number + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = 0
+
+    def flush(self):
+        """Write out everything buffered so far"""
+        with self._lock:
+            self._write()
+
+    def close(self):
+        with self._lock:
+            self._write()
+            self._file.close()
+
+    def files(self):
+        """Return the log files that exist, oldest first"""
+        names = [f"{self.path}.{number}" for number in range(self.backups, 0, -1)]
+        return [name for name in names + [self.path] if os.path.exists(name)]
+
+
+class EventLogOutput:
+    """Output sink that writes a session's events to an EventLog
+
+    Text goes to the wrapped output sink; without one it is discarded.
+    """
+    events = True
+
+    def __init__(self, log, session_id, output=None):
+        self.log = log
+        self.session_id = session_id
+        self.output = output
+        self.text = output is not None and output.text
+        self.style = output.style if output is not None else 'plain'
+
+    def write(self, message, args=()):
+        self.output.write(message, args)
+
+    def write_rendered(self, text):
+        self.output.write_rendered(text)
+
+    def event(self, kind, data):
+        self.log.record(self.session_id, kind, data)
+        if self.output is not None and self.output.events:
+            self.output.event(kind, data)
+
+    def flush(self):
+        if self.output is not None:
+            self.output.flush()
+
+
+def read_events(paths):
+    """Yield every event in the given log files, in order, as dicts"""
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class _Progress:
+    """What the aggregator remembers about a session still in progress"""
+    __slots__ = ('room', 'visited', 'stages', 'enemy')
+
+    def __init__(self):
+        self.room = None
+        self.visited = set()
+        self.stages = 0
+        self.enemy = None
+
+
+class Aggregator:
+    """Streaming statistics over an event log
+
+    At most max_sessions sessions are tracked at once; when more are in
+    progress, the one heard from least recently is forgotten: it still
+    counts towards everything it already reached, but if it carries on it
+    is counted as a new session would be.
+    """
+    def __init__(self, max_sessions=100000):
+        self.max_sessions = max_sessions
+        self.sessions = 0
+        self.events = 0
+        self.deaths = defaultdict(Counter)      # room -> cause -> count
+        self.reached = Counter()                # room -> sessions that entered it
+        self.entries = Counter()                # room -> times entered
+        self.funnel = Counter()                 # stage name -> sessions
+        self.fights = defaultdict(Counter)      # enemy -> started/won/lost/retreated
+        self.damage = defaultdict(Counter)      # source -> total/hits/misses
+        self.evicted = 0
+        self._open = OrderedDict()
+
+    def _progress(self, session_id):
+        progress = self._open.get(session_id)
+        if progress is None:
+            progress = self._open[session_id] = _Progress()
+            if len(self._open) > self.max_sessions:
+                self._open.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._open.move_to_end(session_id)
+        return progress
+
+    def add(self, event):
+        """Count one event (a dict as written by EventLog)"""
+        self.events += 1
+        kind = event['e']
+        progress = self._progress(event['s'])
+        if kind == 'session_started':
+            self.sessions += 1
+        elif kind == 'room_entered':
+            room = event['room']
+            self.entries[room] += 1
+            if room not in progress.visited:
+                progress.visited.add(room)
+                self.reached[room] += 1
+            progress.room = room
+        elif kind == 'player_died':
+            self.deaths[event['room']][event['cause']] += 1
+            if progress.enemy is not None:
+                self.fights[progress.enemy]['lost'] += 1
+        elif kind == 'combat_started':
+            progress.enemy = event['enemy']
+            self.fights[progress.enemy]['started'] += 1
+        elif kind == 'enemy_defeated':
+            self.fights[event['enemy']]['won'] += 1
+            progress.enemy = None
+        elif kind == 'game_won':
+            self.fights['guardian']['won'] += 1
+        elif kind == 'retreated':
+            self.fights[event['enemy']]['retreated'] += 1
+            progress.enemy = None
+        elif kind == 'damage_dealt':
+            damage = self.damage[event['source']]
+            damage['total'] += event['amount']
+            damage['hits' if event['amount'] else 'misses'] += 1
+
+        for stage, (name, stage_kind, match) in enumerate(FUNNEL):
+            if (kind == stage_kind and not progress.stages >> stage & 1
+                    and (match is None or all(event.get(k) == v for k, v in match.items()))):
+                progress.stages |= 1 << stage
+                self.funnel[name] += 1
+
+        if kind in FINAL_EVENTS:
+            del self._open[event['s']]
+
+    def add_all(self, events):
+        for event in events:
+            self.add(event)
+        return self
+
+    def heatmap(self, width=40):
+        """Return the death heatmap as text lines, deadliest room first"""
+        totals = {room: sum(causes.values()) for room, causes in self.deaths.items()}
+        if not totals:
+            return ["No deaths recorded."]
+        most = max(totals.values())
+        lines = []
+        for room, total in sorted(totals.items(), key=lambda item: (-item[1], item[0])):
+            bar = '#' * max(1, round(total / most * width))
+            causes = ', '.join(f"{cause} {count}" for cause, count in self.deaths[room].most_common())
+            lines.append(f"{room:24} {total:8} {bar}  ({causes})")
+        return lines
+
+    def report(self):
+        """Return every statistic as text"""
+        sessions = self.sessions or 1
+        lines = [f"{self.events} events from {self.sessions} sessions", "", "Deaths by room:"]
+        lines += ["  " + line for line in self.heatmap()]
+        lines += ["", "Funnel:"]
+        for name, _, _ in FUNNEL:
+            lines.append(f"  {name:20} {self.funnel[name]:8} {self.funnel[name] / sessions:7.1%}")
+        lines += ["", "Rooms reached (least visited first):"]
+        for room, count in sorted(self.reached.items(), key=lambda item: (item[1], item[0])):
+            lines.append(f"  {room:24} {count:8} {count / sessions:7.1%}  entered {self.entries[room]} times")
+        lines += ["", "Fights:"]
+        for enemy, counts in sorted(self.fights.items()):
+            lines.append(f"  {enemy:10} started {counts['started']}, won {counts['won']}, "
+                         f"lost {counts['lost']}, retreated {counts['retreated']}")
+        for source, damage in sorted(self.damage.items()):
+            attacks = damage['hits'] + damage['misses']
+            lines.append(f"  {source:10} dealt {damage['total']} damage in {attacks} attacks "
+                         f"({damage['total'] / attacks:.2f} per attack)")
+        if self.evicted:
+            lines.append(f"\n{self.evicted} unfinished sessions were dropped from tracking")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            'events': self.events,
+            'sessions': self.sessions,
+            'deaths': {room: dict(causes) for room, causes in self.deaths.items()},
+            'reached': dict(self.reached),
+            'entries': dict(self.entries),
+            'funnel': {name: self.funnel[name] for name, _, _ in FUNNEL},
+            'fights': {enemy: dict(counts) for enemy, counts in self.fights.items()},
+            'damage': {source: dict(damage) for source, damage in self.damage.items()},
+        }
+
+
+def main():
+    """Summarize event log files from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize Cave Adventure event logs")
+    parser.add_argument('paths', nargs='+', metavar='log', help="Log files, oldest first")
+    parser.add_argument('--sessions', type=int, default=100000,
+                        help="Most unfinished sessions tracked at once")
+    parser.add_argument('--json', action='store_true', help="Print the statistics as JSON")
+    args = parser.parse_args()
+
+    aggregator = Aggregator(args.sessions).add_all(read_events(args.paths))
+    if args.json:
+        print(json.dumps(aggregator.to_dict(), indent=2))
+    else:
+        print(aggregator.report())
+
+
+if __name__ == "__main__":
+    main()
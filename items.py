@@ -0,0 +1,238 @@
+"""
+Cave Adventure - Items
+
+Every item name the game knows is registered once in the ITEMS index,
+which gives it a small integer id and its properties:
+
+    damage        (low, high) damage when attacking with it, or None
+    max_hp_bonus  added to the player's maximum (and current) HP when taken
+    heals         using it restores the player to full health
+
+damage and max_hp_bonus may also name a field of CombatRules (see
+rules.py): the dagger's damage is 'dagger_damage' and the shield's bonus
+'shield_bonus', so a Game with other rules gets other values. World
+files can define their own items with define(); names a world uses
+without defining them are registered on the fly without properties, so
+any world can still be played.
+
+The index also resolves what a player types to an item name: an exact
+name or alias first, otherwise the start of the name or of any of its
+words ("dag", "shiny d", "guano"). Every prefix is stored up front, so a
+lookup costs the same however many items exist. Only the items present
+(in the room, in the inventory) are considered, and a text that fits
+more than one of them raises AmbiguousItemError.
+"""
+
+import threading
+
+from rules import STANDARD_RULES
+
+
+class AmbiguousItemError(LookupError):
+    """What the player typed fits more than one item"""
+    def __init__(self, text, names):
+        super().__init__(f"'{text}' could mean: {', '.join(names)}")
+        self.text = text
+        self.names = names
+
+
+class Item:
+    """A kind of item and what it does"""
+    __slots__ = ('id', 'name', 'aliases', 'damage', 'max_hp_bonus', 'heals')
+
+    def __init__(self, name, aliases=(), damage=None, max_hp_bonus=0, heals=False):
+        self.id = None
+        self.name = name
+        self.aliases = tuple(aliases)
+        self.damage = damage
+        self.max_hp_bonus = max_hp_bonus
+        self.heals = heals
+
+    def damage_for(self, rules):
+        """Return the damage range under rules, or None if it is no weapon"""
+        damage = self.damage
+        return getattr(rules, damage) if isinstance(damage, str) else damage
+
+    def hp_bonus_for(self, rules):
+        """Return the maximum HP gained by taking it under rules"""
+        bonus = self.max_hp_bonus
+        return getattr(rules, bonus) if isinstance(bonus, str) else bonus
+
+    def properties(self):
+        return (self.aliases, self.damage, self.max_hp_bonus, self.heals)
+
+    def __repr__(self):
+        return f"Item({self.name!r})"
+
+
+class ItemIndex:
+    """Items by name and id, plus the exact and prefix tables for resolving names"""
+    def __init__(self, items=()):
+        self._items = {}
+        self._by_id = []
+        self._exact = {}
+        self._prefixes = {}
+        self._lock = threading.Lock()
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        """Register an item, giving it the next id"""
+        with self._lock:
+            if item.name in self._items:
+                raise ValueError(f"Item {item.name!r} is already registered")
+            item.id = len(self._by_id)
+            self._by_id.append(item)
+            self._items[item.name] = item
+            name = item.name.lower()
+            words = name.split()
+            for text in {name, *words, *(alias.lower() for alias in item.aliases)}:
+                self._exact.setdefault(text, []).append(item.name)
+                for end in range(1, len(text) + 1):
+                    names = self._prefixes.setdefault(text[:end], [])
+                    if item.name not in names:
+                        names.append(item.name)
+        return item
+
+    def get(self, name):
+        """Return the Item called name, registering a plain item if it is new"""
+        item = self._items.get(name)
+        if item is None:
+            try:
+                item = self.add(Item(name))
+            except ValueError:
+                # Registered by another thread in the meantime
+                item = self._items[name]
+        return item
+
+    __getitem__ = get
+
+    def define(self, item):
+        """Register an item with properties and return the registered Item
+
+        A name so far only seen without properties takes the new ones and
+        keeps its id; defining a name again the same way does nothing, and
+        differently raises ValueError.
+        """
+        with self._lock:
+            known = self._items.get(item.name)
+            if known is not None:
+                if known.properties() == item.properties():
+                    return known
+                if known.properties() != Item(item.name).properties() or item.aliases:
+                    raise ValueError(f"Item {item.name!r} is already defined differently")
+                known.damage = item.damage
+                known.max_hp_bonus = item.max_hp_bonus
+                known.heals = item.heals
+                return known
+        return self.add(item)
+
+    def by_id(self, item_id):
+        return self._by_id[item_id]
+
+    def names(self, names):
+        """Register any new names and return them as a tuple"""
+        names = tuple(names)
+        for name in names:
+            if name not in self._items:
+                self.get(name)
+        return names
+
+    def __contains__(self, name):
+        return name in self._items
+
+    def __iter__(self):
+        return iter(self._by_id)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def resolve(self, text, present):
+        """Return the name of the item in present that text refers to, or None
+
+        present is any container of item names. Raises AmbiguousItemError
+        if text fits several different items in it.
+        """
+        text = ' '.join(text.lower().split())
+        for table in (self._exact, self._prefixes):
+            found = [name for name in table.get(text, ()) if name in present]
+            if len(found) == 1:
+                return found[0]
+            if found:
+                raise AmbiguousItemError(text, found)
+        return None
+
+
+class Inventory:
+    """The items a player carries, as counts by name
+
+    Membership and counting are O(1). Iterating yields one name per item
+    carried, kinds in the order they were first picked up.
+    """
+    __slots__ = ('_counts',)
+
+    def __init__(self, names=()):
+        self._counts = {}
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        self._counts[name] = self._counts.get(name, 0) + 1
+
+    def remove(self, name):
+        """Remove one item called name; KeyError if there is none"""
+        count = self._counts[name]
+        if count == 1:
+            del self._counts[name]
+        else:
+            self._counts[name] = count - 1
+
+    def count(self, name):
+        return self._counts.get(name, 0)
+
+    def kinds(self):
+        """Return the distinct names carried"""
+        return self._counts.keys()
+
+    def weapon(self, rules=STANDARD_RULES):
+        """Return the carried Item with the highest damage under rules, or None"""
+        best = None
+        best_damage = None
+        for name in self._counts:
+            item = ITEMS[name]
+            damage = item.damage_for(rules)
+            if damage is not None and (best is None or damage[1] > best_damage[1]):
+                best, best_damage = item, damage
+        return best
+
+    def __contains__(self, name):
+        return name in self._counts
+
+    def __iter__(self):
+        for name, count in self._counts.items():
+            for _ in range(count):
+                yield name
+
+    def __len__(self):
+        return sum(self._counts.values())
+
+    def __bool__(self):
+        return bool(self._counts)
+
+    def __repr__(self):
+        return f"Inventory({list(self)!r})"
+
+
+DAGGER = "shiny dagger"
+SHIELD = "ancient shield"
+GUANO = "bat guano"
+
+ITEMS = ItemIndex([
+    Item(DAGGER, damage='dagger_damage'),
+    Item(SHIELD, max_hp_bonus='shield_bonus'),
+    Item(GUANO, heals=True),
+])
+
+# The items above are registered first, so their ids are the same in every
+# process; ids of items registered later depend on what was loaded when
+CATALOG_SIZE = len(ITEMS)
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Cave Adventure - Load Generator
+
+Simulates many players at once, each with their own Game, to find out how
+many a machine can serve. Every synthetic player sends real commands to
+Game.parse_command and waits a think time between them; a player whose
+game ends starts a new one.
+
+What a player types next is drawn from a Markov model over kinds of
+command, given the kind they typed last:
+
+    move     a direction from the current room's exits
+    take     an item lying in the room (a move when there is none)
+    attack   "attack dagger"
+    retreat  "retreat"
+    use      "use guano"
+
+The 'start' row picks a new game's first command, and while the player
+is in a fight the 'combat' row is used whatever came before. Models are
+JSON objects of {row: {kind: weight}}; DEFAULT_MODEL is a cautious
+explorer.
+
+Sessions are spread over worker threads or processes. Each worker keeps
+its players in a heap ordered by when they next act, so a few workers
+can drive thousands of sessions. Sessions join over the ramp time
+(all at once, evenly, or in steps), and the report shows, per interval,
+the active sessions, commands per second, latency percentiles and the
+process memory, followed by per-command latencies for the whole run.
+
+    python3 loadgen.py --sessions 5000 --workers 8 --processes --ramp 30 --duration 120
+
+Latency is the time spent in parse_command; lag is how late commands ran
+compared with when their player wanted to act, which grows once the
+workers cannot keep up.
+"""
+
+import heapq
+import io
+import json
+import math
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from adventure import Game, get_world
+from dice import RollStream
+from metrics import Histogram
+from output import BufferedOutput, OutcomeOutput
+
+KINDS = ('move', 'take', 'attack', 'retreat', 'use')
+ROWS = ('start', 'combat') + KINDS
+
+DEFAULT_MODEL = {
+    'start': {'move': 1},
+    'move': {'move': 6, 'take': 3, 'use': 1},
+    'take': {'move': 8, 'take': 2},
+    'attack': {'move': 9, 'take': 1},
+    'retreat': {'move': 8, 'use': 2},
+    'use': {'move': 10},
+    'combat': {'attack': 8, 'retreat': 1, 'use': 1},
+}
+
+COMMANDS = {'attack': "attack dagger", 'retreat': "retreat", 'use': "use guano"}
+
+
+def _think_none(rng, mean):
+    return 0.0
+
+
+def _think_constant(rng, mean):
+    return mean
+
+
+def _think_uniform(rng, mean):
+    return rng.uniform(0.0, 2 * mean)
+
+
+def _think_exponential(rng, mean):
+    return rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+
+
+def _think_lognormal(rng, mean):
+    # sigma 1, with mu chosen so the mean comes out as asked
+    return rng.lognormvariate(math.log(mean) - 0.5, 1.0) if mean > 0 else 0.0
+
+
+THINK_TIMES = {
+    'none': _think_none,
+    'constant': _think_constant,
+    'uniform': _think_uniform,
+    'exponential': _think_exponential,
+    'lognormal': _think_lognormal,
+}
+
+RAMPS = ('instant', 'linear', 'step')
+
+
+def check_model(model):
+    """Validate a model and return it as {row: (kinds, cumulative weights)}"""
+    rows = {}
+    for row in ('start', 'combat'):
+        if row not in model:
+            raise ValueError(f"The model needs a '{row}' row")
+    for row, weights in model.items():
+        if row not in ROWS:
+            raise ValueError(f"Unknown model row: {row}")
+        unknown = set(weights) - set(KINDS)
+        if unknown:
+            raise ValueError(f"Unknown command kind in row '{row}': {', '.join(sorted(unknown))}")
+        kinds = [kind for kind, weight in weights.items() if weight > 0]
+        if not kinds:
+            raise ValueError(f"Row '{row}' has no positive weights")
+        total = 0
+        cumulative = []
+        for kind in kinds:
+            total += weights[kind]
+            cumulative.append(total)
+        rows[row] = (kinds, cumulative)
+    return rows
+
+
+def start_offset(index, sessions, ramp, profile, steps=5):
+    """Return when session number index joins, in seconds from the start"""
+    if profile == 'instant' or ramp <= 0 or sessions <= 1:
+        return 0.0
+    if profile == 'linear':
+        return ramp * index / sessions
+    if profile == 'step':
+        return ramp * (index * steps // sessions) / steps
+    raise ValueError(f"Unknown ramp profile: {profile}")
+
+
+def rss_bytes():
+    """Return the resident memory of this process, or None where unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Player:
+    """One synthetic player and their current game"""
+    __slots__ = ('game', 'sink', 'buffer', 'last')
+
+    def __init__(self):
+        self.game = None
+        self.sink = None
+        self.buffer = None
+        self.last = 'start'
+
+    def next_command(self, model, rng):
+        """Draw the next command from the model; return (kind, command)"""
+        game = self.game
+        kinds, cumulative = model.get('combat' if game.in_combat else self.last, model['start'])
+        kind = rng.choices(kinds, cum_weights=cumulative)[0]
+        self.last = kind
+        if kind == 'take':
+            items = game.current_room.items
+            if items:
+                return kind, f"take {rng.choice(items)}"
+            kind = 'move'
+        if kind == 'move':
+            exits = list(game.current_room.exits)
+            if not exits:
+                return kind, "look"
+            return kind, rng.choice(exits)
+        return kind, COMMANDS[kind]
+
+
+class LoadConfig:
+    """Everything a worker needs to know, picklable for process workers"""
+    def __init__(self, sessions=1000, workers=4, duration=30.0, ramp=0.0, profile='linear', steps=5,
+                 think='exponential', think_mean=1.0, model=None, interval=5.0, seed=None, text=True):
+        self.sessions = sessions
+        self.workers = workers
+        self.duration = duration
+        self.ramp = ramp
+        self.profile = profile
+        self.steps = steps
+        self.think = think
+        self.think_mean = think_mean
+        self.model = model if model is not None else DEFAULT_MODEL
+        self.interval = interval
+        self.seed = seed
+        self.text = text
+        check_model(self.model)
+        if sessions < 1 or workers < 1:
+            raise ValueError("Need at least one session and one worker")
+        if duration <= 0 or interval <= 0:
+            raise ValueError("The duration and report interval must be positive")
+        if think not in THINK_TIMES:
+            raise ValueError(f"Unknown think time distribution: {think}")
+        if profile not in RAMPS:
+            raise ValueError(f"Unknown ramp profile: {profile}")
+
+
+class Interval:
+    """What happened during one reporting interval"""
+    __slots__ = ('commands', 'latency', 'lag', 'sessions', 'rss')
+
+    def __init__(self):
+        self.commands = 0
+        self.latency = Histogram()
+        self.lag = Histogram()
+        self.sessions = 0
+        self.rss = None
+
+    def merge(self, other, processes):
+        self.commands += other.commands
+        self.latency.merge(other.latency)
+        self.lag.merge(other.lag)
+        self.sessions += other.sessions
+        if other.rss is not None:
+            if self.rss is None:
+                self.rss = other.rss
+            elif processes:
+                self.rss += other.rss
+            else:
+                self.rss = max(self.rss, other.rss)
+        return self
+
+
+class WorkerResult:
+    """A worker's measurements, merged into the run's by LoadTest"""
+    def __init__(self):
+        self.intervals = []
+        self.latency = {}           # command kind -> Histogram
+        self.games = Counter()      # started / won / died / quit
+        self.rss_start = None
+
+    def observe(self, kind, seconds):
+        histogram = self.latency.get(kind)
+        if histogram is None:
+            histogram = self.latency[kind] = Histogram()
+        histogram.observe(seconds)
+
+
+def run_worker(config, worker, start):
+    """Play this worker's share of the sessions until the run ends
+
+    start is the run's starting time on the wall clock, the same for
+    every worker.
+    """
+    world = get_world()
+    model = check_model(config.model)
+    think = THINK_TIMES[config.think]
+    mean = config.think_mean
+    rng = random.Random(None if config.seed is None else config.seed * 1000003 + worker)
+    result = WorkerResult()
+    result.rss_start = rss_bytes()
+
+    # Seconds since the run started, measured with the precise clock
+    origin = time.perf_counter() + (start - time.time())
+    clock = time.perf_counter
+
+    heap = [(start_offset(index, config.sessions, config.ramp, config.profile, config.steps), index)
+            for index in range(worker, config.sessions, config.workers)]
+    heapq.heapify(heap)
+    players = {}
+
+    def new_game(player):
+        result.games['started'] += 1
+        # The sink sees the game's outcome events; text is formatted only with config.text
+        player.buffer = io.StringIO() if config.text else None
+        player.sink = OutcomeOutput(BufferedOutput(player.buffer) if config.text else None)
+        player.game = Game(player.sink, RollStream(rng.getrandbits(64)), world)
+        player.last = 'start'
+
+    interval = Interval()
+    boundary = config.interval
+    perf = time.perf_counter
+    while True:
+        now = clock() - origin
+        if now >= boundary or now >= config.duration:
+            interval.sessions = len(players)
+            interval.rss = rss_bytes()
+            result.intervals.append(interval)
+            if now >= config.duration or boundary >= config.duration:
+                break
+            interval = Interval()
+            boundary += config.interval
+            continue
+        if not heap:
+            time.sleep(min(boundary, config.duration) - now)
+            continue
+        due, index = heap[0]
+        if due > now:
+            time.sleep(min(due, boundary, config.duration) - now)
+            continue
+        heapq.heappop(heap)
+
+        player = players.get(index)
+        if player is None:
+            player = players[index] = Player()
+            new_game(player)
+        kind, command = player.next_command(model, rng)
+        game = player.game
+        began = perf()
+        game.parse_command(command)
+        game.output.flush()
+        seconds = perf() - began
+        if player.buffer is not None:
+            player.buffer.seek(0)
+            player.buffer.truncate()
+
+        interval.commands += 1
+        interval.latency.observe(seconds)
+        interval.lag.observe(max(0.0, now - due))
+        result.observe(kind, seconds)
+        if not game.running:
+            result.games[player.sink.outcome] += 1
+            new_game(player)
+        heapq.heappush(heap, (clock() - origin + think(rng, mean), index))
+    return result
+
+
+class LoadTest:
+    """Runs a LoadConfig over threads or processes and merges the results"""
+    def __init__(self, config, processes=False):
+        self.config = config
+        self.processes = processes
+        self.intervals = []
+        self.latency = {}
+        self.games = Counter()
+        self.rss_start = None
+
+    def run(self):
+        config = self.config
+        pool_class = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+        # Give process workers time to start before the clock runs
+        start = time.time() + (1.0 if self.processes else 0.05)
+        with pool_class(max_workers=config.workers) as pool:
+            futures = [pool.submit(run_worker, config, worker, start) for worker in range(config.workers)]
+            results = [future.result() for future in futures]
+
+        for result in results:
+            for number, interval in enumerate(result.intervals):
+                if number == len(self.intervals):
+                    self.intervals.append(Interval())
+                self.intervals[number].merge(interval, self.processes)
+            for kind, histogram in result.latency.items():
+                self.latency.setdefault(kind, Histogram()).merge(histogram)
+            self.games.update(result.games)
+            if result.rss_start is not None:
+                if self.rss_start is None:
+                    self.rss_start = result.rss_start
+                elif self.processes:
+                    self.rss_start += result.rss_start
+                else:
+                    self.rss_start = min(self.rss_start, result.rss_start)
+        return self
+
+    @property
+    def commands(self):
+        return sum(interval.commands for interval in self.intervals)
+
+    def throughput(self):
+        return self.commands / self.config.duration if self.config.duration else 0.0
+
+    def rss_growth(self):
+        """Return (start, end) memory in bytes, or None where unknown"""
+        end = self.intervals[-1].rss if self.intervals else None
+        if self.rss_start is None or end is None:
+            return None
+        return self.rss_start, end
+
+    def report(self):
+        """Return the results as text"""
+        config = self.config
+        workers = f"{config.workers} {'processes' if self.processes else 'threads'}"
+        lines = [f"{config.sessions} sessions on {workers}, {config.duration:g}s "
+                 f"(ramp {config.profile} over {config.ramp:g}s, think {config.think} "
+                 f"mean {config.think_mean:g}s)", "",
+                 f"{'time':>6} {'sessions':>9} {'cmd/s':>10} {'p50':>9} {'p99':>9} {'lag p99':>9} {'memory':>10}"]
+        for number, interval in enumerate(self.intervals):
+            elapsed = min(config.interval, config.duration - number * config.interval)
+            rate = interval.commands / elapsed if elapsed > 0 else 0.0
+            memory = f"{interval.rss / 2**20:.1f} MB" if interval.rss is not None else "n/a"
+            lines.append(f"{min((number + 1) * config.interval, config.duration):5g}s {interval.sessions:9} "
+                         f"{rate:10,.0f} {_ms(interval.latency.quantile(0.5)):>9} "
+                         f"{_ms(interval.latency.quantile(0.99)):>9} {_ms(interval.lag.quantile(0.99)):>9} "
+                         f"{memory:>10}")
+
+        lines += ["", f"{'command':10} {'count':>10} {'share':>7} {'p50':>9} {'p99':>9}"]
+        total = self.commands or 1
+        for kind, histogram in sorted(self.latency.items(), key=lambda item: -item[1].count):
+            lines.append(f"{kind:10} {histogram.count:10} {histogram.count / total:7.1%} "
+                         f"{_ms(histogram.quantile(0.5)):>9} {_ms(histogram.quantile(0.99)):>9}")
+
+        lines += ["", f"Throughput: {self.throughput():,.0f} commands/s ({self.commands:,} commands)",
+                  f"Games: {self.games['started']} started, {self.games['won']} won, {self.games['died']} died"]
+        growth = self.rss_growth()
+        if growth is not None:
+            before, after = growth
+            sessions = self.intervals[-1].sessions or 1
+            lines.append(f"Memory: {before / 2**20:.1f} MB -> {after / 2**20:.1f} MB "
+                         f"({(after - before) / sessions:,.0f} bytes per session)")
+        lines.append("(latencies are bucket upper bounds)")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        config = self.config
+        return {
+            'sessions': config.sessions,
+            'workers': config.workers,
+            'processes': self.processes,
+            'duration': config.duration,
+            'throughput': self.throughput(),
+            'commands': self.commands,
+            'games': dict(self.games),
+            'rss_start': self.rss_start,
+            'intervals': [{'end': min((number + 1) * config.interval, config.duration),
+                           'sessions': interval.sessions,
+                           'commands': interval.commands,
+                           'p50': interval.latency.quantile(0.5),
+                           'p99': interval.latency.quantile(0.99),
+                           'lag_p99': interval.lag.quantile(0.99),
+                           'rss': interval.rss}
+                          for number, interval in enumerate(self.intervals)],
+            'latency': {kind: {'count': histogram.count, 'p50': histogram.quantile(0.5),
+                               'p99': histogram.quantile(0.99), 'mean': histogram.total / histogram.count}
+                        for kind, histogram in self.latency.items()},
+        }
+
+
+def _ms(seconds):
+    if seconds == float('inf'):
+        return ">1s"
+    return f"{seconds * 1000:.3g}ms"
+
+
+def main():
+    """Run a load test from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulate many Cave Adventure players at once")
+    parser.add_argument('--sessions', type=int, default=1000, help="Concurrent players (default 1000)")
+    parser.add_argument('--workers', type=int, default=4, help="Worker threads or processes (default 4)")
+    parser.add_argument('--processes', action='store_true', help="Use worker processes instead of threads")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to run (default 30)")
+    parser.add_argument('--ramp', type=float, default=0.0, help="Seconds over which sessions join")
+    parser.add_argument('--profile', choices=RAMPS, default='linear', help="How sessions join during the ramp")
+    parser.add_argument('--steps', type=int, default=5, help="Number of steps for --profile step")
+    parser.add_argument('--think', choices=sorted(THINK_TIMES), default='exponential',
+                        help="Think time distribution (default exponential)")
+    parser.add_argument('--think-mean', type=float, default=1.0, help="Mean think time in seconds")
+    parser.add_argument('--model', help="JSON file with a Markov model of commands")
+    parser.add_argument('--interval', type=float, default=5.0, help="Seconds per report row")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--no-text', action='store_true',
+                        help="Discard game text instead of formatting it as the server would")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    model = None
+    if args.model:
+        with open(args.model, encoding='utf-8') as f:
+            model = json.load(f)
+    try:
+        config = LoadConfig(args.sessions, args.workers, args.duration, args.ramp, args.profile, args.steps,
+                            args.think, args.think_mean, model, args.interval, args.seed, not args.no_text)
+    except ValueError as error:
+        parser.error(str(error))
+
+    test = LoadTest(config, args.processes).run()
+    if args.json:
+        print(json.dumps(test.to_dict(), indent=2))
+    else:
+        print(test.report())
+
+
+if __name__ == "__main__":
+    main()
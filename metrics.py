@@ -0,0 +1,266 @@
+"""
+Cave Adventure - Instrumentation
+
+Opt-in metrics for the command hot path: latency histograms for
+parse_command and the move, attack, take, use and describe handlers,
+command counters, combat outcomes and error counts.
+
+Nothing is measured until enable() is called. enable() swaps timed
+wrappers into Game and its subclasses, Room and the command tables, and
+disable() puts the originals back, so a process that never enables
+metrics runs exactly the same code as before. Subclasses defined after
+enable() are not timed.
+
+Metrics are process-wide, shared by every game, and can be exported in
+the Prometheus text format or viewed in game by operators with the
+'metrics' command.
+"""
+
+import os
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+           1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0)
+
+# Handlers timed on their own, by method name
+HANDLERS = ('move', 'attack', 'take', 'use')
+
+METRICS = None
+
+
+class Histogram:
+    """Counts of observed durations per bucket, plus their sum"""
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def merge(self, other):
+        """Add another histogram's observations to this one"""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket holding quantile q"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """All counters and histograms of one process"""
+    def __init__(self):
+        self.started = time.time()
+        self.commands = Counter()
+        self.command_latency = {}
+        self.handler_latency = {}
+        self.outcomes = Counter()
+        self.errors = Counter()
+
+    def observe_command(self, command, seconds):
+        self.commands[command] += 1
+        histogram = self.command_latency.get(command)
+        if histogram is None:
+            histogram = self.command_latency[command] = Histogram()
+        histogram.observe(seconds)
+
+    def observe_handler(self, handler, seconds):
+        histogram = self.handler_latency.get(handler)
+        if histogram is None:
+            histogram = self.handler_latency[handler] = Histogram()
+        histogram.observe(seconds)
+
+    def prometheus(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+
+        def histograms(name, help_text, label, histograms):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for value, histogram in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label}="{value}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{label}="{value}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{{label}="{value}"}} {histogram.total:.9f}')
+                lines.append(f'{name}_count{{{label}="{value}"}} {histogram.count}')
+
+        def counters(name, help_text, label, counter):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for value, count in sorted(counter.items()):
+                lines.append(f'{name}{{{label}="{value}"}} {count}')
+
+        counters("cave_commands_total", "Commands handled, by command", "command", self.commands)
+        histograms("cave_command_duration_seconds", "Time spent in parse_command, by command",
+                   "command", self.command_latency)
+        histograms("cave_handler_duration_seconds", "Time spent in command handlers and room descriptions",
+                   "handler", self.handler_latency)
+        counters("cave_combat_outcomes_total", "How fights and fatal moves ended", "outcome", self.outcomes)
+        counters("cave_errors_total", "Commands that failed", "kind", self.errors)
+        lines.append("# HELP cave_start_time_seconds When metrics collection started")
+        lines.append("# TYPE cave_start_time_seconds gauge")
+        lines.append(f"cave_start_time_seconds {self.started:.3f}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write a Prometheus text snapshot, replacing the file atomically"""
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        os.replace(temporary, path)
+
+
+def _command_name(game, command):
+    """Label for a command: the handler's name, so aliases count together"""
+    parts = command.split()
+    if not parts:
+        return None
+    name = parts[0].lower()
+    entry = game.commands.get(name)
+    if entry is None and game.operator:
+        entry = game.operator_commands.get(name)
+    return entry.handler.__name__ if entry is not None else 'unknown'
+
+
+def _wrap_parse_command(parse_command):
+    perf_counter = time.perf_counter
+
+    def timed_parse_command(self, command):
+        metrics = METRICS
+        start = perf_counter()
+        try:
+            parse_command(self, command)
+        except Exception:
+            metrics.errors['exception'] += 1
+            raise
+        finally:
+            name = _command_name(self, command)
+            if name is not None:
+                metrics.observe_command(name, perf_counter() - start)
+                if name == 'unknown':
+                    metrics.errors['unknown_command'] += 1
+    timed_parse_command.__name__ = parse_command.__name__
+    timed_parse_command.__doc__ = parse_command.__doc__
+    return timed_parse_command
+
+
+def _outcome(game, before):
+    """Name what a fight-related command did, from the state before and after"""
+    in_combat, enemy, running, bat_defeated = before
+    if running and not game.running:
+        if game.player_hp <= 0:
+            return f'died_{enemy}'
+        # Surviving a fight that ends the game is a win; only traps end it otherwise
+        return 'won' if in_combat else 'died_trap'
+    if in_combat and not game.in_combat:
+        if game.bat_defeated and not bat_defeated:
+            return 'bat_defeated'
+        return f'retreated_{enemy}'
+    return None
+
+
+def _wrap_handler(name, handler):
+    perf_counter = time.perf_counter
+
+    def timed_handler(self, *args):
+        if getattr(type(self), name) is not timed_handler:
+            # A subclass's override is timed already; this is its call to super()
+            return handler(self, *args)
+        before = (self.in_combat, self.combat_enemy, self.running, self.bat_defeated)
+        start = perf_counter()
+        try:
+            return handler(self, *args)
+        finally:
+            METRICS.observe_handler(name, perf_counter() - start)
+            outcome = _outcome(self, before)
+            if outcome is not None:
+                METRICS.outcomes[outcome] += 1
+    timed_handler.__name__ = handler.__name__
+    timed_handler.__doc__ = handler.__doc__
+    return timed_handler
+
+
+def _wrap_describe(describe):
+    perf_counter = time.perf_counter
+
+    def timed_describe(self, *args, **kwargs):
+        start = perf_counter()
+        try:
+            return describe(self, *args, **kwargs)
+        finally:
+            METRICS.observe_handler('describe', perf_counter() - start)
+    timed_describe.__name__ = describe.__name__
+    timed_describe.__doc__ = describe.__doc__
+    return timed_describe
+
+
+_originals = {}
+
+
+def enable():
+    """Start collecting metrics in this process and return the Metrics"""
+    global METRICS
+    from adventure import Game, Room
+
+    if METRICS is not None:
+        return METRICS
+    METRICS = Metrics()
+    _originals[(Game, 'parse_command')] = Game.parse_command
+    Game.parse_command = _wrap_parse_command(Game.parse_command)
+    _originals[(Room, 'describe')] = Room.describe
+    Room.describe = _wrap_describe(Room.describe)
+
+    # retreat is wrapped for its combat outcome only. Subclasses such as
+    # SharedGame override handlers and have command tables of their own.
+    wrapped = {}
+    for cls in _game_classes(Game):
+        for name in HANDLERS + ('retreat',):
+            handler = cls.__dict__.get(name)
+            if handler is None:
+                continue
+            _originals[(cls, name)] = handler
+            wrapped[handler] = _wrap_handler(name, handler)
+            setattr(cls, name, wrapped[handler])
+        # A command table holds the handlers it was registered with
+        for command in set(cls.__dict__.get('commands', {}).values()):
+            if command.handler in wrapped:
+                _originals[(command, 'handler')] = command.handler
+                command.handler = wrapped[command.handler]
+    return METRICS
+
+
+def _game_classes(cls):
+    """Return cls and every subclass defined so far, base classes first"""
+    classes = [cls]
+    for subclass in cls.__subclasses__():
+        classes.extend(_game_classes(subclass))
+    return classes
+
+
+def disable():
+    """Stop collecting metrics and restore the uninstrumented code"""
+    global METRICS
+    for (owner, attribute), original in _originals.items():
+        setattr(owner, attribute, original)
+    _originals.clear()
+    METRICS = None
@@ -0,0 +1,151 @@
+"""
+Cave Adventure - Output Sinks
+
+Game and Room never call print() directly; they hand text and events to an
+output sink. Text is passed as a format string plus arguments and is only
+formatted by sinks that actually display it, so headless sinks skip the
+string work entirely.
+
+Text sinks also have a style ('plain', 'ansi' or 'json') that picks how
+room descriptions are rendered; rendered descriptions are cached by the
+rooms and handed over with write_rendered().
+"""
+
+import json
+import sys
+from collections import namedtuple
+
+Event = namedtuple('Event', 'kind data')
+
+
+class ConsoleOutput:
+    """Writes every line to the console immediately (the default)
+
+    style 'ansi' colours room descriptions for terminals that support it.
+    """
+    text = True
+    events = False
+
+    def __init__(self, stream=None, style='plain'):
+        self.stream = stream
+        self.style = style
+
+    def write(self, message, args=()):
+        print(message.format(*args) if args else message, file=self.stream or sys.stdout)
+
+    def write_rendered(self, text):
+        """Write text already rendered in this sink's style"""
+        self.write(text)
+
+    def event(self, kind, data):
+        pass
+
+    def flush(self):
+        pass
+
+
+class BufferedOutput(ConsoleOutput):
+    """Collects the lines of a command and writes them in one go on flush()"""
+    def __init__(self, stream=None, style='plain'):
+        super().__init__(stream, style)
+        self.lines = []
+
+    def write(self, message, args=()):
+        self.lines.append(message.format(*args) if args else message)
+
+    def flush(self):
+        if self.lines:
+            lines = self.lines
+            self.lines = []
+            lines.append("")
+            stream = self.stream or sys.stdout
+            stream.write("\n".join(lines))
+            stream.flush()
+
+
+class JsonOutput(BufferedOutput):
+    """Buffers JSON lines: {"text": ...} for each message, rooms as objects"""
+    def __init__(self, stream=None):
+        super().__init__(stream, 'json')
+
+    def write(self, message, args=()):
+        self.lines.append(json.dumps({'text': message.format(*args) if args else message}))
+
+    def write_rendered(self, text):
+        self.lines.append(text)
+
+
+class EventOutput:
+    """Records typed events (room entered, damage dealt, ...) instead of text"""
+    text = False
+    events = True
+    style = 'plain'
+
+    def __init__(self):
+        self.log = []
+
+    def write(self, message, args=()):
+        pass
+
+    def write_rendered(self, text):
+        pass
+
+    def event(self, kind, data):
+        self.log.append(Event(kind, data))
+
+    def flush(self):
+        pass
+
+
+class NullOutput:
+    """Discards everything; used for bots, replays and simulations"""
+    text = False
+    events = False
+    style = 'plain'
+
+    def write(self, message, args=()):
+        pass
+
+    def write_rendered(self, text):
+        pass
+
+    def event(self, kind, data):
+        pass
+
+    def flush(self):
+        pass
+
+
+class OutcomeOutput(NullOutput):
+    """Remembers how the game ended, passing text on to another sink if given"""
+    events = True
+
+    def __init__(self, output=None):
+        self.outcome = 'playing'
+        self.output = output
+        if output is not None:
+            self.text = output.text
+            self.style = output.style
+
+    def write(self, message, args=()):
+        if self.output is not None:
+            self.output.write(message, args)
+
+    def write_rendered(self, text):
+        if self.output is not None:
+            self.output.write_rendered(text)
+
+    def event(self, kind, data):
+        if kind == 'game_won':
+            self.outcome = 'won'
+        elif kind == 'player_died':
+            self.outcome = 'died'
+        elif kind == 'game_quit':
+            self.outcome = 'quit'
+
+    def flush(self):
+        if self.output is not None:
+            self.output.flush()
+
+
+CONSOLE = ConsoleOutput()
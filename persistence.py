@@ -0,0 +1,140 @@
+"""
+Cave Adventure - Write-Behind Persistence
+
+Saving every session to disk after every command would cost one
+transaction per command. A WriteBehindStore sits in front of a session
+store (see api.py) and turns that into one transaction per autosave
+interval, shared by every session that changed in the meantime:
+
+- put() only records the session's latest snapshot in memory. Several
+  saves of one session between autosaves are coalesced into the last.
+- Dirty tracking: a snapshot identical to the one last written (after a
+  look, help, map, ...) is dropped, so idle commands cost no I/O.
+- A background thread writes everything pending every `interval`
+  seconds, or sooner once `max_batch` sessions are waiting, with one
+  put_many() call: a single transaction on an SQLiteStore.
+- get() sees pending saves, and then the batch being written, before
+  the store, so reads never go back in time. A batch stays in flight
+  until put_many() succeeds; if it fails, it is merged back into the
+  pending saves for the next autosave.
+
+Crash consistency comes from the batch being one transaction: after a
+crash each session is exactly as it was after some autosave, never half
+written, and at most `interval` seconds of play are lost. recover()
+checks a store after an unclean shutdown and removes anything that no
+longer decodes.
+"""
+
+import threading
+
+import snapshot
+
+
+class WriteBehindStore:
+    """A session store that batches writes to another store in the background"""
+    def __init__(self, store, interval=1.0, max_batch=1000):
+        self.store = store
+        self.interval = interval
+        self.max_batch = max_batch
+        self.batches = 0
+        self.written = 0
+        self.skipped = 0
+        self.failures = 0
+        self._pending = {}
+        self._flushing = {}
+        self._saved = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._writer = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._writer.start()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            if key in self._flushing:
+                return self._flushing[key]
+        return self.store.get(key)
+
+    def put(self, key, data):
+        with self._lock:
+            if self._saved.get(key) == data and key not in self._pending and key not in self._flushing:
+                self.skipped += 1
+                return
+            self._pending[key] = data
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def delete(self, key):
+        with self._lock:
+            self._pending[key] = None
+
+    def keys(self):
+        self.flush()
+        return self.store.keys()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # The batch was put back; try again at the next autosave
+                self.failures += 1
+
+    def flush(self):
+        """Write everything pending now, in one batch"""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._flushing = self._pending
+                self._pending = {}
+            if not batch:
+                return
+            try:
+                self.store.put_many(batch.items())
+            except BaseException:
+                with self._lock:
+                    # Anything saved again since is newer than the failed batch
+                    for key, data in batch.items():
+                        self._pending.setdefault(key, data)
+                    self._flushing = {}
+                raise
+            with self._lock:
+                for key, data in batch.items():
+                    if data is None:
+                        self._saved.pop(key, None)
+                    else:
+                        self._saved[key] = data
+                self._flushing = {}
+                self.batches += 1
+                self.written += len(batch)
+
+    def close(self):
+        """Stop the writer, write what is left and close the store"""
+        self._stopping = True
+        self._wake.set()
+        self._writer.join()
+        self.flush()
+        self.store.close()
+
+
+def recover(store, world=None):
+    """Remove sessions whose snapshots no longer decode; return (kept, removed)"""
+    kept = removed = 0
+    broken = []
+    for key in store.keys():
+        data = store.get(key)
+        try:
+            snapshot.loads(data, world=world)
+        except snapshot.SnapshotError:
+            broken.append((key, None))
+        else:
+            kept += 1
+    if broken:
+        store.put_many(broken)
+        removed = len(broken)
+    return kept, removed
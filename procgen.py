@@ -0,0 +1,235 @@
+"""
+Cave Adventure - Procedural Caves
+
+Endless mode plays in a generated cave laid out on a grid of rooms,
+100,000 of them by default. Nothing is built up front: every room's name,
+description, exits and items are derived from (seed, x, y) alone, so a
+room is only generated when a player first walks into it, and generating
+it again later gives exactly the same room.
+
+The passages form a binary-tree maze (every room except the first links
+north or west) with extra passages sprinkled in, so the whole grid is
+connected and exits always lead both ways.
+
+Generated rooms are kept in LRU caches and dropped again when nobody has
+looked at them for a while. The map uses the grid positions directly
+rather than laying the whole cave out. Rooms a game changes (by taking an item) move
+into that game's own rooms as usual and are never evicted, so memory is
+bounded by what players actually visit and change.
+"""
+
+import random
+from collections import OrderedDict
+from functools import lru_cache
+
+from adventure import Room, RoomTable, RoomTemplate, World
+from dice import new_seed
+
+_MASK = 0xffffffffffffffff
+
+ADJECTIVES = ("Dripping", "Silent", "Echoing", "Crooked", "Frozen", "Glittering", "Narrow",
+              "Sunken", "Mossy", "Smoky", "Hollow", "Whispering", "Flooded", "Ancient",
+              "Shattered", "Winding")
+NOUNS = ("Gallery", "Grotto", "Passage", "Chamber", "Hall", "Tunnel", "Cavern", "Crawlway",
+         "Vault", "Fissure", "Sinkhole", "Alcove")
+OPENINGS = (
+    "The passage widens into a low room with a ceiling you could touch.",
+    "You squeeze into a tall, narrow space that disappears into darkness above.",
+    "A broad cavern opens up around you, too large for your light to reach the far wall.",
+    "The floor slopes steeply here and loose stones clatter away beneath your feet.",
+    "You enter a round chamber worn smooth by water long since gone.",
+    "The rock closes in until you have to turn sideways to move on.",
+)
+FEATURES = (
+    "Pale stalactites hang in clusters like frozen rain.",
+    "A thin stream trickles across the floor and vanishes into a crack.",
+    "Old scratch marks cover one wall, counting days nobody remembers.",
+    "Veins of quartz catch your light and throw it back in sparks.",
+    "A heap of bones lies in the corner, picked clean long ago.",
+    "Roots have forced their way through the ceiling from the world above.",
+    "Someone has stacked flat stones into a small cairn here.",
+    "The walls are slick with a greenish slime that glows faintly.",
+)
+ATMOSPHERES = (
+    "The air is cold and still.",
+    "Somewhere nearby, water drips in a slow, steady rhythm.",
+    "A faint breeze tells you there are more passages ahead.",
+    "The silence is so complete you can hear your own heartbeat.",
+    "It smells of damp earth and something older.",
+    "Distant echoes suggest you are not alone down here.",
+)
+# Items placed in generated rooms, one room in ITEM_ODDS on average
+ITEM_POOL = ("bat guano",)
+ITEM_ODDS = 40
+# One extra passage in EXTRA_ODDS on top of the maze, to make loops
+EXTRA_ODDS = 4
+
+
+def _mix(value):
+    """splitmix64 finalizer: a cheap, well-spread 64-bit hash of an integer"""
+    value = (value + 0x9e3779b97f4a7c15) & _MASK
+    value = ((value ^ (value >> 30)) * 0xbf58476d1ce4e5b9) & _MASK
+    value = ((value ^ (value >> 27)) * 0x94d049bb133111eb) & _MASK
+    return value ^ (value >> 31)
+
+
+class GeneratedRooms(RoomTable):
+    """Room templates generated on demand for a width x height grid
+
+    Room number y * width + x has the key "cave_<x>_<y>". Templates are
+    cached in an LRU of cache_size entries.
+    """
+    lazy = True
+
+    def __init__(self, seed, width, height, cache_size=4096):
+        # No templates up front: every room is generated on demand
+        super().__init__(())
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.template_at = lru_cache(maxsize=cache_size)(self._generate)
+
+    def _hash(self, index):
+        return _mix(self.seed ^ _mix(index))
+
+    def links(self, x, y):
+        """Return whether room (x, y) has passages (north, west)"""
+        if x == 0 and y == 0:
+            return False, False
+        h = self._hash(y * self.width + x)
+        if y == 0:
+            north = False
+        elif x == 0:
+            north = True
+        else:
+            north = bool(h & 1)
+        west = x > 0 and not north
+        # An extra passage in the other direction now and then
+        if (h >> 1) & 0xff < 256 // EXTRA_ODDS:
+            north = north or y > 0
+            west = west or x > 0
+        return north, west
+
+    def exits(self, x, y):
+        """Return {direction: room key} for room (x, y)"""
+        exits = {}
+        north, west = self.links(x, y)
+        if north:
+            exits['north'] = self.key_for(x, y - 1)
+        if x + 1 < self.width and self.links(x + 1, y)[1]:
+            exits['east'] = self.key_for(x + 1, y)
+        if y + 1 < self.height and self.links(x, y + 1)[0]:
+            exits['south'] = self.key_for(x, y + 1)
+        if west:
+            exits['west'] = self.key_for(x - 1, y)
+        return exits
+
+    def _generate(self, index):
+        y, x = divmod(index, self.width)
+        rng = random.Random(_mix(self._hash(index)))
+        name = f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}"
+        description = " ".join((rng.choice(OPENINGS), rng.choice(FEATURES), rng.choice(ATMOSPHERES)))
+        items = [rng.choice(ITEM_POOL)] if rng.randrange(ITEM_ODDS) == 0 else None
+        return RoomTemplate(name, description, self.exits(x, y), items, self.key_for(x, y))
+
+    def key_for(self, x, y):
+        return f"cave_{x}_{y}"
+
+    def exits_of(self, key):
+        # Only the passages are needed, so skip generating the whole room
+        y, x = divmod(self.index_of(key), self.width)
+        return self.exits(x, y)
+
+    def layout(self, start):
+        return GridLayout(self)
+
+    def __getitem__(self, key):
+        return self.template_at(self.index_of(key))
+
+    def __iter__(self):
+        return map(self.key_at, range(len(self)))
+
+    def __len__(self):
+        return self.width * self.height
+
+    def __contains__(self, key):
+        try:
+            self.index_of(key)
+        except KeyError:
+            return False
+        return True
+
+    def key_at(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        y, x = divmod(index, self.width)
+        return self.key_for(x, y)
+
+    def index_of(self, key):
+        prefix, _, coords = key.partition('_')
+        x, _, y = coords.partition('_')
+        if prefix != 'cave' or not (x.isdigit() and y.isdigit()):
+            raise KeyError(key)
+        x, y = int(x), int(y)
+        if x >= self.width or y >= self.height:
+            raise KeyError(key)
+        return y * self.width + x
+
+
+class GridLayout:
+    """Map layout of a generated cave: every room sits at its own grid position"""
+    def __init__(self, templates):
+        self.templates = templates
+
+    def position(self, key):
+        y, x = divmod(self.templates.index_of(key), self.templates.width)
+        return x, y
+
+    def at(self, col, row):
+        templates = self.templates
+        if 0 <= col < templates.width and 0 <= row < templates.height:
+            return templates.key_for(col, row)
+        return None
+
+    def exits(self, key):
+        return self.templates.exits_of(key)
+
+    def bounds(self):
+        return 0, 0, self.templates.width - 1, self.templates.height - 1
+
+
+class RecentRooms(OrderedDict):
+    """Shared Room objects created on first lookup, evicting the least recently used"""
+    def __init__(self, templates, capacity=4096):
+        super().__init__()
+        self.templates = templates
+        self.capacity = capacity
+
+    def __getitem__(self, key):
+        room = super().__getitem__(key)
+        self.move_to_end(key)
+        return room
+
+    def __missing__(self, key):
+        room = self[key] = Room(self.templates[key])
+        if len(self) > self.capacity:
+            self.popitem(last=False)
+        return room
+
+
+def generate_world(seed=None, width=400, height=250, cache_size=4096):
+    """Return an endless-mode World; the guardian waits in the far corner
+
+    The player starts in the middle of the grid.
+    """
+    if seed is None:
+        seed = new_seed()
+    templates = GeneratedRooms(seed, width, height, cache_size)
+    lair_x, lair_y = width - 1, height - 1
+    north, west = templates.links(lair_x, lair_y)
+    roles = {
+        'lair': templates.key_for(lair_x, lair_y),
+        'lair_exit': templates.key_for(lair_x, lair_y - 1) if north else templates.key_for(lair_x - 1, lair_y),
+    }
+    return World(templates, templates.key_for(width // 2, height // 2), roles,
+                 rooms=RecentRooms(templates, cache_size))
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Cave Adventure - Scripted Replays
+
+Runs command scripts headlessly with a fixed RNG seed and checks the final
+state of the game. Large seed ranges can be fanned out over a process
+pool, and a single seed can be replayed with full text output to
+reproduce a bug report exactly.
+
+Scripts are read from files in the format of test_playthrough.txt:
+
+    ## Test 2: Retreat from Combat
+    Commands:
+    - north
+    - take dagger     (comments in parentheses are ignored)
+    Expect:
+    - room: warning_chamber
+    - has: shiny dagger
+"""
+
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from adventure import Game
+from dice import RollStream
+from output import BufferedOutput, OutcomeOutput
+
+# Final-state keys understood in expectations
+EXPECT_KEYS = ('room', 'hp', 'max_hp', 'guardian_hp', 'bat_hp', 'inventory', 'has', 'outcome')
+
+
+class Replay:
+    """A command script, the seed to run it with, and the expected result"""
+    def __init__(self, commands, seed=0, expect=None, name=None):
+        self.commands = list(commands)
+        self.seed = seed
+        self.expect = dict(expect) if expect else {}
+        self.name = name
+
+    def with_seed(self, seed):
+        return Replay(self.commands, seed, self.expect, self.name)
+
+
+class ReplayResult:
+    """Final state of a replay and any expectations it failed"""
+    def __init__(self, name, seed, state, failures):
+        self.name = name
+        self.seed = seed
+        self.state = state
+        self.failures = failures
+
+    @property
+    def passed(self):
+        return not self.failures
+
+
+def final_state(game, outcome):
+    """Return the parts of a game's state that expectations can check"""
+    return {
+        'room': game.current_room.key,
+        'hp': game.player_hp,
+        'max_hp': game.player_max_hp,
+        'guardian_hp': game.guardian_hp,
+        'bat_hp': game.bat_hp,
+        'inventory': list(game.inventory),
+        'outcome': outcome,
+    }
+
+
+def check(state, expect):
+    """Return a list of failure messages for expectations that do not hold"""
+    failures = []
+    for key, wanted in expect.items():
+        if key == 'has':
+            missing = [item for item in wanted if item not in state['inventory']]
+            if missing:
+                failures.append(f"missing items: {', '.join(missing)}")
+        elif key == 'inventory':
+            if sorted(state['inventory']) != sorted(wanted):
+                failures.append(f"inventory is {state['inventory']}, expected {wanted}")
+        elif state[key] != wanted:
+            failures.append(f"{key} is {state[key]!r}, expected {wanted!r}")
+    return failures
+
+
+def run_replay(replay, output=None):
+    """Play a script from a fresh game and return a ReplayResult
+
+    Pass an output sink to also see the game's text.
+    """
+    sink = OutcomeOutput(output)
+    game = Game(sink, RollStream(replay.seed))
+    for command in replay.commands:
+        if not game.running:
+            break
+        game.parse_command(command)
+    state = final_state(game, sink.outcome)
+    return ReplayResult(replay.name, replay.seed, state, check(state, replay.expect))
+
+
+def run_many(replays, processes=None, chunksize=256):
+    """Run replays over a process pool; results come back in input order"""
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(run_replay, replays, chunksize=chunksize))
+
+
+def seed_sweep(replay, seeds):
+    """Yield a copy of a replay for every seed"""
+    for seed in seeds:
+        yield replay.with_seed(seed)
+
+
+def _parse_expect(line):
+    key, _, value = line.partition(':')
+    key = key.strip().lower()
+    value = value.strip()
+    if key not in EXPECT_KEYS:
+        raise ValueError(f"Unknown expectation: {key}")
+    if key in ('hp', 'max_hp', 'guardian_hp', 'bat_hp'):
+        return key, int(value)
+    if key in ('has', 'inventory'):
+        return key, [item.strip() for item in value.split(',') if item.strip()]
+    return key, value
+
+
+def load_scripts(path):
+    """Read every scenario from a playthrough file as a list of Replays"""
+    replays = []
+    section = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('## '):
+                replays.append(Replay([], name=line[3:].strip()))
+                section = None
+            elif line.rstrip(':').lower() in ('commands', 'expect'):
+                section = line.rstrip(':').lower()
+            elif line.startswith('- ') and replays and section:
+                text = re.sub(r'\(.*?\)', '', line[2:]).strip()
+                if section == 'commands':
+                    replays[-1].commands.append(text)
+                else:
+                    key, value = _parse_expect(text)
+                    replays[-1].expect[key] = value
+            elif not line:
+                continue
+            else:
+                section = None
+    return [replay for replay in replays if replay.commands]
+
+
+def _parse_seeds(text):
+    start, _, end = text.partition('-')
+    return range(int(start), int(end or start) + 1)
+
+
+def main():
+    """Replay scripts from a file over a range of seeds"""
+    import argparse
+    from collections import Counter
+
+    parser = argparse.ArgumentParser(description="Replay Cave Adventure command scripts")
+    parser.add_argument('script', nargs='?', default='test_playthrough.txt')
+    parser.add_argument('--seeds', default='0-999', help="seed or range, e.g. 42 or 0-9999")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--show', action='store_true',
+                        help="print the game text (use with a single seed)")
+    args = parser.parse_args()
+
+    seeds = _parse_seeds(args.seeds)
+    failed = 0
+    for replay in load_scripts(args.script):
+        if args.show:
+            results = []
+            for seed in seeds:
+                print(f"\n##### {replay.name} (seed {seed})")
+                results.append(run_replay(replay.with_seed(seed), BufferedOutput()))
+        else:
+            results = run_many(seed_sweep(replay, seeds), args.processes)
+
+        outcomes = Counter(result.state['outcome'] for result in results)
+        failures = [result for result in results if not result.passed]
+        failed += len(failures)
+        print(f"{replay.name}: {len(results)} replays, "
+              + ", ".join(f"{k}={v}" for k, v in sorted(outcomes.items()))
+              + f", {len(failures)} failed")
+        for result in failures[:5]:
+            print(f"  seed {result.seed}: {'; '.join(result.failures)}")
+
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Cave Adventure - Route Index
+
+Shortest paths over the rooms' exits. Paths are stored as next-hop
+tables, one per destination: for every room that can reach the
+destination, the direction to take and the remaining distance. A table
+is built with a single breadth-first search backwards from its
+destination, so nothing is computed for destinations nobody travels to.
+precompute() builds every table up front for small worlds.
+
+When an exit changes, only the tables that the change can affect are
+dropped. They are rebuilt on next use.
+
+Worlds whose rooms are generated on demand can't be indexed without
+generating every room; find_path() searches them one path at a time,
+reading only the exits it needs and giving up after a fixed number of
+rooms.
+"""
+
+from collections import deque
+
+
+class RouteIndex:
+    """Next-hop tables over an exit graph"""
+    def __init__(self, exits):
+        """exits maps room key -> {direction: destination room key}"""
+        self.exits = {room: dict(room_exits) for room, room_exits in exits.items()}
+        self.entrances = {room: set() for room in self.exits}
+        for room, room_exits in self.exits.items():
+            for direction, target in room_exits.items():
+                self.entrances.setdefault(target, set()).add((room, direction))
+        self.tables = {}
+
+    def table(self, destination):
+        """Return {room: (direction, distance)} for every room that can reach destination"""
+        table = self.tables.get(destination)
+        if table is None:
+            table = self.tables[destination] = self._search(destination)
+        return table
+
+    def _search(self, destination):
+        table = {destination: (None, 0)}
+        queue = deque([destination])
+        while queue:
+            room = queue.popleft()
+            distance = table[room][1] + 1
+            for source, direction in self.entrances.get(room, ()):
+                if source not in table:
+                    table[source] = (direction, distance)
+                    queue.append(source)
+        return table
+
+    def precompute(self):
+        """Build the tables for every destination (all-pairs shortest paths)"""
+        for room in self.exits:
+            self.table(room)
+
+    def next_hop(self, source, destination):
+        """Return the direction to take from source, or None if unreachable"""
+        hop = self.table(destination).get(source)
+        return hop[0] if hop else None
+
+    def distance(self, source, destination):
+        """Return the number of moves from source to destination, or None"""
+        hop = self.table(destination).get(source)
+        return hop[1] if hop else None
+
+    def path(self, source, destination):
+        """Return the list of directions from source to destination, or None"""
+        table = self.table(destination)
+        if source not in table:
+            return None
+        path = []
+        room = source
+        while room != destination:
+            direction = table[room][0]
+            path.append(direction)
+            room = self.exits[room][direction]
+        return path
+
+    def set_exit(self, room, direction, target):
+        """Add or change an exit; target None removes it"""
+        room_exits = self.exits.setdefault(room, {})
+        self.entrances.setdefault(room, set())
+        old = room_exits.get(direction)
+        if old == target:
+            return
+        if old is not None:
+            self.entrances[old].discard((room, direction))
+            del room_exits[direction]
+            # Only tables that routed through the removed exit change
+            for destination, table in list(self.tables.items()):
+                if table.get(room, (None,))[0] == direction:
+                    del self.tables[destination]
+        if target is not None:
+            room_exits[direction] = target
+            self.entrances.setdefault(target, set()).add((room, direction))
+            self.exits.setdefault(target, {})
+            # Only tables where the new exit gives room a shorter way change
+            for destination, table in list(self.tables.items()):
+                via = table.get(target)
+                if via is None:
+                    continue
+                current = table.get(room)
+                if current is None or via[1] + 1 < current[1]:
+                    del self.tables[destination]
+
+
+def find_path(exits_of, source, destination, limit=None):
+    """Return the list of directions from source to destination, or None
+
+    exits_of(room) returns the room's {direction: room} exits. The search
+    gives up and returns None once it has seen more than limit rooms.
+    """
+    if source == destination:
+        return []
+    came_from = {source: None}
+    queue = deque([source])
+    while queue:
+        room = queue.popleft()
+        for direction, target in exits_of(room).items():
+            if target in came_from:
+                continue
+            came_from[target] = (room, direction)
+            if target == destination:
+                path = []
+                while target != source:
+                    target, direction = came_from[target]
+                    path.append(direction)
+                path.reverse()
+                return path
+            if limit is not None and len(came_from) > limit:
+                return None
+            queue.append(target)
+    return None
@@ -0,0 +1,91 @@
+"""
+Cave Adventure - Combat Rules
+
+Every number that decides a fight, in one object a Game reads from:
+
+    player_hp          starting (and maximum) HP
+    bare_hands_damage  (low, high) damage of an unarmed attack
+    dagger_damage      (low, high) damage of an attack with the dagger
+    shield_bonus       maximum HP gained by taking the shield
+    guardian_hp        the guardian's full HP
+    guardian_damage    (low, high) damage of the guardian's counterattack
+    bat_hp             the bat's full HP
+    bat_damage         (low, high) damage of the bat's counterattack
+
+Damage ranges are inclusive, as passed to randint. The player's attacks
+always deal at least 1 damage, so every fight ends. Rules are immutable:
+replace() returns a variant with some values changed, and key() names a
+set of rules by a hash of its values, so results computed for one (see
+sweep.py) can be cached and found again.
+"""
+
+import hashlib
+import json
+
+FIELDS = ('player_hp', 'bare_hands_damage', 'dagger_damage', 'shield_bonus',
+          'guardian_hp', 'guardian_damage', 'bat_hp', 'bat_damage')
+RANGES = ('bare_hands_damage', 'dagger_damage', 'guardian_damage', 'bat_damage')
+PLAYER_RANGES = ('bare_hands_damage', 'dagger_damage')
+
+
+class CombatRules:
+    """The combat constants of a game"""
+    __slots__ = FIELDS
+
+    def __init__(self, player_hp=10, bare_hands_damage=(1, 4), dagger_damage=(2, 16), shield_bonus=5,
+                 guardian_hp=20, guardian_damage=(1, 8), bat_hp=5, bat_damage=(0, 3)):
+        values = locals()
+        for name in FIELDS:
+            value = values[name]
+            if name in RANGES:
+                low, high = value
+                if not (1 if name in PLAYER_RANGES else 0) <= low <= high:
+                    raise ValueError(f"Bad damage range for {name}: {value!r}")
+                value = (low, high)
+            elif value < (0 if name == 'shield_bonus' else 1):
+                raise ValueError(f"Bad value for {name}: {value!r}")
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CombatRules are immutable; use replace()")
+
+    def enemy_hp(self, enemy):
+        return self.guardian_hp if enemy == 'guardian' else self.bat_hp
+
+    def enemy_damage(self, enemy):
+        return self.guardian_damage if enemy == 'guardian' else self.bat_damage
+
+    def replace(self, **changes):
+        """Return a copy of these rules with some values changed"""
+        return CombatRules(**{**self.as_dict(), **changes})
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in FIELDS}
+
+    def key(self):
+        """Return a short hash of the values, the same in every process and run"""
+        text = json.dumps(self.as_dict(), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+    def changes(self, base=None):
+        """Return the values that differ from base (the standard rules by default)"""
+        base = base if base is not None else STANDARD_RULES
+        return {name: value for name, value in self.as_dict().items() if getattr(base, name) != value}
+
+    def __eq__(self, other):
+        if not isinstance(other, CombatRules):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, name) for name in FIELDS))
+
+    def __reduce__(self):
+        return (CombatRules, tuple(getattr(self, name) for name in FIELDS))
+
+    def __repr__(self):
+        changed = ', '.join(f"{name}={value!r}" for name, value in self.changes().items())
+        return f"CombatRules({changed})"
+
+
+STANDARD_RULES = CombatRules()
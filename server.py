@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Cave Adventure - Multi-Session Server
+
+Hosts many independent Game sessions in a single asyncio event loop over
+a plain line protocol (telnet / netcat friendly). Each connection gets its
+own Game writing to its own buffered output sink; every received line is
+passed to Game.parse_command.
+
+With --metrics, command instrumentation is enabled (see metrics.py) and a
+Prometheus text snapshot is written to the given file periodically. With
+--event-log, every session's game events are recorded (see eventlog.py).
+With --shared, all players explore one cave together (see shared.py).
+Their commands run on a pool of --workers threads, so players in
+different rooms are served at the same time and the cave's per-room
+locks keep them apart.
+Connections from an --operator address may also use operator commands
+such as metrics.
+"""
+
+import asyncio
+import contextlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from adventure import Game
+from eventlog import EventLog
+from output import BufferedOutput
+from shared import SharedCave, SharedGame
+
+PROMPT = "\n> "
+
+
+class Session:
+    """One connected player"""
+    def __init__(self, session_id, reader, writer, event_log=None, cave=None, operator=False):
+        self.session_id = session_id
+        self.reader = reader
+        self.writer = writer
+        self.buffer = io.StringIO()
+        output = BufferedOutput(self.buffer)
+        if event_log is not None:
+            output = event_log.session(output)
+        if cave is not None:
+            self.game = SharedGame(cave, f"Adventurer {session_id}", output=output)
+        else:
+            self.game = Game(output=output)
+        self.game.operator = operator
+
+    def run(self, func, *args):
+        """Call a Game method and return everything it wrote"""
+        func(*args)
+        self.game.output.flush()
+        text = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return text
+
+
+class GameServer:
+    """Line-protocol server hosting many Game sessions in one event loop"""
+    def __init__(self, host='127.0.0.1', port=4000, max_sessions=1000, idle_timeout=300.0,
+                 max_line=1024, write_buffer_limit=64 * 1024, metrics_path=None, metrics_interval=15.0,
+                 event_log=None, cave=None, operators=(), workers=None):
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_line = max_line
+        self.write_buffer_limit = write_buffer_limit
+        self.metrics_path = metrics_path
+        self.metrics_interval = metrics_interval
+        self.event_log = event_log
+        self.cave = cave
+        # Games of a shared cave run on worker threads; private games need no locks
+        self.executor = ThreadPoolExecutor(workers) if cave is not None else None
+        self.operators = frozenset(operators)
+        self.sessions = {}
+        self.next_id = 1
+        self.server = None
+
+    async def start(self):
+        """Start listening; returns the asyncio server"""
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port,
+                                                 limit=self.max_line)
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        exporter = None
+        if self.metrics_path is not None:
+            exporter = asyncio.create_task(self.export_metrics())
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            if exporter is not None:
+                exporter.cancel()
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+
+    async def export_metrics(self):
+        """Enable metrics and write a snapshot every metrics_interval seconds"""
+        stats = metrics.enable()
+        try:
+            while True:
+                await asyncio.sleep(self.metrics_interval)
+                stats.write(self.metrics_path)
+        finally:
+            stats.write(self.metrics_path)
+
+    async def run(self, session, func, *args):
+        """Call a Game method for a session; return everything it wrote"""
+        if self.executor is None:
+            return session.run(func, *args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, session.run, func, *args)
+
+    async def send(self, session, text):
+        """Write to a client, waiting while its socket buffer is full"""
+        session.writer.write(text.encode('utf-8'))
+        await session.writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        if len(self.sessions) >= self.max_sessions:
+            writer.write(b"The cave is full right now. Please try again later.\n")
+            with contextlib.suppress(ConnectionError):
+                await writer.drain()
+            writer.close()
+            return
+
+        # Pause the session (via drain) once this much output is queued
+        writer.transport.set_write_buffer_limits(high=self.write_buffer_limit)
+
+        peer = writer.get_extra_info('peername')
+        operator = bool(peer) and peer[0] in self.operators
+        session = Session(self.next_id, reader, writer, self.event_log, self.cave, operator)
+        self.next_id += 1
+        self.sessions[session.session_id] = session
+        try:
+            await self.send(session, await self.run(session, session.game.show_intro) + PROMPT)
+            await self.command_loop(session)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self.sessions[session.session_id]
+            if self.cave is not None:
+                self.cave.leave(session.game)
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def command_loop(self, session):
+        game = session.game
+        while game.running:
+            try:
+                line = await asyncio.wait_for(session.reader.readline(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                await self.send(session, "\n\nYou have been idle too long. The cave grows dark...\n")
+                return
+            except (asyncio.LimitOverrunError, ValueError):
+                await self.send(session, "\nThat command is too long.\n")
+                return
+
+            if not line:
+                return
+
+            command = line.decode('utf-8', errors='replace').strip()
+            output = await self.run(session, game.parse_command, command) if command else ""
+            await self.send(session, output + (PROMPT if game.running else "\n"))
+
+
+def main():
+    """Run the server from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve Cave Adventure over TCP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4000)
+    parser.add_argument('--max-sessions', type=int, default=1000)
+    parser.add_argument('--idle-timeout', type=float, default=300.0)
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="Collect command metrics and write them to PATH in Prometheus text format")
+    parser.add_argument('--metrics-interval', type=float, default=15.0)
+    parser.add_argument('--event-log', metavar='PATH', help="Append game events to PATH")
+    parser.add_argument('--shared', action='store_true', help="Let every player explore the same cave")
+    parser.add_argument('--workers', type=int,
+                        help="Threads running shared-cave commands (default: Python's thread pool default)")
+    parser.add_argument('--operator', metavar='ADDRESS', action='append', default=[],
+                        help="Allow operator commands such as metrics from this client address (repeatable)")
+    args = parser.parse_args()
+
+    event_log = EventLog(args.event_log) if args.event_log else None
+    server = GameServer(args.host, args.port, args.max_sessions, args.idle_timeout,
+                        metrics_path=args.metrics, metrics_interval=args.metrics_interval,
+                        event_log=event_log, cave=SharedCave() if args.shared else None,
+                        operators=args.operator, workers=args.workers)
+    print(f"Cave Adventure server listening on {args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    finally:
+        if event_log is not None:
+            event_log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Cave Adventure - Shared Caves
+
+In a shared cave many players explore the same set of rooms at once.
+Room items, the guardian's HP and the bat are the cave's rather than each
+player's: a dagger taken by one player is gone for everyone, wounds dealt
+to the guardian by one player stay for the next, and once the bat is
+killed the colony is safe for all. Players see who else is in a room and
+hear others arrive and leave.
+
+Every room has its own lock, so players only wait for each other when
+they act in the same room at the same time. Commands that touch two
+rooms (moving between them) take both locks in room-number order, which
+rules out deadlocks. Fights lock the enemy's home room: the lair for the
+guardian (even when attacked from behind), the colony for the bat.
+server.py runs shared-cave commands on a pool of threads, so the locks
+are what keep concurrent players apart. Under CPython's GIL those threads
+take turns; on a free-threaded build they run in parallel.
+
+Messages for a player (someone arrives, the guardian falls) are queued
+and shown before the output of their next command.
+
+When a player slays the guardian they win, and a new guardian at full
+strength takes his place so the cave stays playable for everyone else.
+"""
+
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from adventure import Game, Room, get_world
+from rules import STANDARD_RULES
+
+
+class RoomState:
+    """The lock and the players of one room"""
+    __slots__ = ('index', 'lock', 'players')
+
+    def __init__(self, index):
+        self.index = index
+        self.lock = threading.Lock()
+        self.players = set()
+
+
+class CaveRooms(dict):
+    """The cave's rooms, each with its own item list, created on first lookup"""
+    def __init__(self, templates):
+        super().__init__()
+        self.templates = templates
+        self._lock = threading.Lock()
+
+    def __missing__(self, key):
+        with self._lock:
+            room = self.get(key)
+            if room is None:
+                template = self.templates[key]
+                room = self[key] = Room(template, list(template.items))
+            return room
+
+
+class SharedCave:
+    """One world shared by many players, with world-level enemy state"""
+    def __init__(self, world=None, rules=None):
+        self.world = world if world is not None else get_world()
+        self.rules = rules if rules is not None else STANDARD_RULES
+        self.rooms = CaveRooms(self.world.templates)
+        self.guardian_hp = self.rules.guardian_hp
+        self.bat_hp = self.rules.bat_hp
+        self.bat_defeated = False
+        self.players = set()
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def state(self, key):
+        """Return the RoomState of a room, creating it on first use"""
+        state = self._states.get(key)
+        if state is None:
+            with self._lock:
+                state = self._states.get(key)
+                if state is None:
+                    state = self._states[key] = RoomState(self.world.templates.index_of(key))
+        return state
+
+    @contextmanager
+    def locked(self, *keys):
+        """Hold the locks of the given rooms, taken in room-number order"""
+        states = sorted({self.state(key) for key in keys}, key=lambda state: state.index)
+        for state in states:
+            state.lock.acquire()
+        try:
+            yield
+        finally:
+            for state in reversed(states):
+                state.lock.release()
+
+    def enemy_room(self, enemy):
+        """Return the key of the room whose lock guards an enemy"""
+        return self.world.roles['lair' if enemy == 'guardian' else 'bat']
+
+    def join(self, player, key):
+        with self._lock:
+            self.players.add(player)
+        with self.locked(key):
+            self.state(key).players.add(player)
+        self.tell(key, f"{player.name} enters the cave.", player)
+
+    def leave(self, player):
+        """Take a player out of the cave; safe to call more than once"""
+        with self._lock:
+            if player not in self.players:
+                return
+            self.players.discard(player)
+        key = player.current_room.key
+        with self.locked(key):
+            self.state(key).players.discard(player)
+        self.tell(key, f"{player.name} is gone.", player)
+
+    def move(self, player, old, new):
+        """Move a player between rooms; the caller holds both rooms' locks"""
+        self.state(old).players.discard(player)
+        self.state(new).players.add(player)
+        self.tell(old, f"{player.name} leaves.", player)
+        self.tell(new, f"{player.name} arrives.", player)
+
+    def others(self, player, key):
+        """Return the names of the other players in a room"""
+        return sorted(other.name for other in tuple(self.state(key).players) if other is not player)
+
+    def tell(self, key, message, sender=None):
+        """Queue a message for every player in a room except the sender"""
+        for player in tuple(self.state(key).players):
+            if player is not sender:
+                player.inbox.append(message)
+
+
+class SharedGame(Game):
+    """One player's view of a SharedCave"""
+    __slots__ = ('cave', 'name', 'inbox')
+
+    def __init__(self, cave, name, output=None, rng=None):
+        self.cave = cave
+        self.name = name
+        self.inbox = deque()
+        super().__init__(output, rng, cave.world, cave.rules)
+
+    # Enemy state belongs to the cave
+    @property
+    def guardian_hp(self):
+        return self.cave.guardian_hp
+
+    @guardian_hp.setter
+    def guardian_hp(self, value):
+        self.cave.guardian_hp = value
+
+    @property
+    def bat_hp(self):
+        return self.cave.bat_hp
+
+    @bat_hp.setter
+    def bat_hp(self, value):
+        self.cave.bat_hp = value
+
+    @property
+    def bat_defeated(self):
+        return self.cave.bat_defeated
+
+    @bat_defeated.setter
+    def bat_defeated(self, value):
+        self.cave.bat_defeated = value
+
+    def setup_enemies(self):
+        pass
+
+    def setup_rooms(self):
+        self.rooms = self.cave.rooms
+        start = self.world.start
+        self.current_room = self.rooms[start]
+        self.visited = {start}
+        self.cave.join(self, start)
+
+    def show_others(self):
+        names = self.cave.others(self, self.current_room.key)
+        if names:
+            self.say("\nAlso here: {}", ', '.join(names))
+
+    def enter_room(self, key):
+        old = self.current_room.key
+        with self.cave.locked(old, key):
+            self.cave.move(self, old, key)
+            super().enter_room(key)
+            self.show_others()
+
+    def look(self):
+        with self.cave.locked(self.current_room.key):
+            super().look()
+            self.show_others()
+
+    def take(self, item):
+        with self.cave.locked(self.current_room.key):
+            super().take(item)
+
+    def attack(self, weapon=None):
+        enemy = self.combat_enemy
+        if not self.in_combat:
+            super().attack(weapon)
+            return
+        with self.cave.locked(self.cave.enemy_room(enemy)):
+            if enemy == 'bat' and self.cave.bat_defeated:
+                self.say("The bat lies dead on the floor - someone got to it first.")
+                self.in_combat = False
+                self.combat_enemy = None
+                return
+            super().attack(weapon)
+
+    def win_game(self):
+        super().win_game()
+        self.cave.guardian_hp = self.rules.guardian_hp
+        self.cave.tell(self.current_room.key,
+                       f"{self.name} has slain the guardian! A new guardian steps from the shadows.", self)
+
+    def show_players(self):
+        """List everyone in the cave and where they are"""
+        players = sorted(tuple(self.cave.players), key=lambda player: player.name)
+        self.say("\n{} adventurer(s) in the cave:", len(players))
+        for player in players:
+            self.say("  {:<20} {}", player.name, player.current_room.name)
+
+    def parse_command(self, command):
+        while self.inbox:
+            self.say(self.inbox.popleft())
+        super().parse_command(command)
+        if not self.running:
+            self.cave.leave(self)
+
+
+SharedGame.rebind_commands()
+SharedGame.register_command(('who', 'players'), SharedGame.show_players)
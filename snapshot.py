@@ -0,0 +1,219 @@
+"""
+Cave Adventure - Game Snapshots
+
+Encodes the complete state of a Game into a few dozen bytes and restores
+it again, so sessions can be parked, moved between processes or
+checkpointed before a risky fight.
+
+Layout (little endian):
+
+    B   format version
+    I   current room number (World.templates.index_of; B before version 3)
+    B   flags (see FLAG_*)
+    4h  player_hp, player_max_hp, guardian_hp, bat_hp
+    Q   RNG seed (version 2+)
+    I   RNG position, i.e. rolls used so far (version 2+)
+    H   number of inventory items (B before version 3), followed by one
+        item reference each
+    H   number of rooms whose items differ from the world (B before
+        version 3), then for each:
+        I room number (B before version 3), B item count, one item
+        reference per item
+
+An item reference is the item's id byte for the items of the catalog in
+items.py, whose ids never change. Any other item, such as one defined by
+a world file, is written by name: 0xff, B length, UTF-8 name (version
+4+; earlier versions only knew the catalog).
+
+Snapshots do not record which world they belong to; restore them with
+the world they were taken in.
+Which rooms the player has visited is not recorded either; after a
+restore the map only marks the current room.
+"""
+
+import struct
+
+from adventure import Game
+from dice import RollStream
+from items import CATALOG_SIZE, ITEMS, Inventory
+
+VERSION = 4
+
+# Marks an item reference written by name
+NAMED_ITEM = 0xff
+
+ENEMIES = (None, 'guardian', 'bat')
+ENEMY_IDS = {enemy: i for i, enemy in enumerate(ENEMIES)}
+
+FLAG_RUNNING = 0x01
+FLAG_SHIELD = 0x02
+FLAG_IN_COMBAT = 0x04
+FLAG_SURPRISED = 0x08
+FLAG_BAT_DEFEATED = 0x10
+ENEMY_SHIFT = 5
+
+_header_v1 = struct.Struct('<BBB4h')
+_header_v2 = struct.Struct('<BBB4hQI')
+_header = struct.Struct('<BIB4hQI')
+_count = struct.Struct('<H')
+_room = struct.Struct('<I')
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot cannot be written or read"""
+
+
+_references = {}
+
+
+def _reference(name):
+    """Return the bytes that stand for an item"""
+    reference = _references.get(name)
+    if reference is None:
+        item_id = ITEMS[name].id
+        if item_id < CATALOG_SIZE:
+            reference = bytes([item_id])
+        else:
+            encoded = name.encode('utf-8')
+            if len(encoded) > 0xff:
+                raise SnapshotError(f"Item name too long: {name}")
+            reference = bytes([NAMED_ITEM, len(encoded)]) + encoded
+        _references[name] = reference
+    return reference
+
+
+def _item_ids(items):
+    if len(items) > 0xff:
+        raise SnapshotError("Too many items in one room")
+    return bytes([len(items)]) + b''.join(map(_reference, items))
+
+
+def _inventory_ids(items):
+    try:
+        count = _count.pack(len(items))
+    except struct.error:
+        raise SnapshotError("Too many items in the inventory") from None
+    return count + b''.join(map(_reference, items))
+
+
+def _item_names(data, pos, count, version):
+    """Read count item references; return (names, position after them)"""
+    names = []
+    for _ in range(count):
+        if pos >= len(data):
+            raise SnapshotError("Corrupt snapshot: truncated item list")
+        reference = data[pos]
+        if reference == NAMED_ITEM and version >= 4:
+            length = data[pos + 1]
+            end = pos + 2 + length
+            if end > len(data):
+                raise SnapshotError("Corrupt snapshot: truncated item name")
+            try:
+                name = str(data[pos + 2:end], 'utf-8')
+            except UnicodeDecodeError:
+                raise SnapshotError("Corrupt snapshot: bad item name") from None
+            names.append(ITEMS.get(name).name)
+            pos = end
+        elif reference < CATALOG_SIZE:
+            names.append(ITEMS.by_id(reference).name)
+            pos += 1
+        else:
+            raise SnapshotError(f"Unknown item id: {reference}")
+    return names, pos
+
+
+def dumps(game):
+    """Encode a Game into bytes"""
+    world = game.world
+    flags = ((FLAG_RUNNING if game.running else 0)
+             | (FLAG_SHIELD if game.has_shield else 0)
+             | (FLAG_IN_COMBAT if game.in_combat else 0)
+             | (FLAG_SURPRISED if game.surprised_guardian else 0)
+             | (FLAG_BAT_DEFEATED if game.bat_defeated else 0)
+             | (ENEMY_IDS[game.combat_enemy] << ENEMY_SHIFT))
+    try:
+        parts = [_header.pack(VERSION, world.templates.index_of(game.current_room.key), flags,
+                              game.player_hp, game.player_max_hp, game.guardian_hp, game.bat_hp,
+                              game.rng.seed, game.rng.position)]
+    except struct.error as e:
+        raise SnapshotError(str(e)) from None
+    parts.append(_inventory_ids(game.inventory))
+
+    changed = []
+    if game.rooms is not world.rooms:
+        index_of = world.templates.index_of
+        # Only rooms the game owns can differ from the world
+        for key, room in game.rooms.maps[0].items():
+            items = room.items
+            if tuple(items) != room.template.items:
+                changed.append(_room.pack(index_of(key)) + _item_ids(items))
+    parts.append(_count.pack(len(changed)))
+    parts.extend(changed)
+    return b''.join(parts)
+
+
+def loads(data, output=None, world=None, rules=None):
+    """Rebuild a Game from bytes produced by dumps()
+
+    world is the World the game was played in (the standard cave by default),
+    rules its CombatRules (the standard rules by default); neither is saved.
+    """
+    try:
+        version = data[0]
+        if version in (2, 3, 4):
+            header = _header_v2 if version == 2 else _header
+            version, room, flags, php, max_hp, ghp, bhp, seed, position = header.unpack_from(data)
+            rng = RollStream(seed, position)
+        elif version == 1:
+            # Version 1 predates per-game RNG streams; start a fresh one
+            header = _header_v1
+            version, room, flags, php, max_hp, ghp, bhp = header.unpack_from(data)
+            rng = None
+        else:
+            raise SnapshotError(f"Unsupported snapshot version: {version}")
+
+        game = Game(output, rng, world, rules)
+        world = game.world
+        game.current_room = game.rooms[world.templates.key_at(room)]
+        game.visited = {game.current_room.key}
+        game.running = bool(flags & FLAG_RUNNING)
+        game.has_shield = bool(flags & FLAG_SHIELD)
+        game.in_combat = bool(flags & FLAG_IN_COMBAT)
+        game.surprised_guardian = bool(flags & FLAG_SURPRISED)
+        game.bat_defeated = bool(flags & FLAG_BAT_DEFEATED)
+        game.combat_enemy = ENEMIES[flags >> ENEMY_SHIFT]
+        game.player_hp = php
+        game.player_max_hp = max_hp
+        game.guardian_hp = ghp
+        game.bat_hp = bhp
+
+        pos = header.size
+        if version >= 3:
+            count = _count.unpack_from(data, pos)[0]
+            pos += _count.size
+        else:
+            count = data[pos]
+            pos += 1
+        names, pos = _item_names(data, pos, count, version)
+        game.inventory = Inventory(names)
+
+        if version >= 3:
+            changed = _count.unpack_from(data, pos)[0]
+            pos += _count.size
+            room_size = _room.size
+        else:
+            changed = data[pos]
+            pos += 1
+            room_size = 1
+        for _ in range(changed):
+            room = _room.unpack_from(data, pos)[0] if version >= 3 else data[pos]
+            count = data[pos + room_size]
+            key = world.templates.key_at(room)
+            names, pos = _item_names(data, pos + room_size + 1, count, version)
+            game.own_room(key).items[:] = names
+    except (struct.error, IndexError) as e:
+        raise SnapshotError(f"Corrupt snapshot: {e}") from None
+
+    if pos != len(data):
+        raise SnapshotError("Corrupt snapshot: trailing data")
+    return game
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Cave Adventure - Optimal Strategy Solver
+
+Solves the whole game, not just single fights: room, inventory, the items
+left in every room, HP, guardian and bat HP, bat_defeated, combat state and
+surprised_guardian. The result is the best possible win rate and a policy
+table that tells a bot the best command for any state in one lookup.
+
+Every state is packed into a single integer. States are split into
+"strata" of everything except the player's position (room, combat state
+and surprised_guardian). Within a stratum, only moving and retreating are
+possible, and neither changes the odds, so a position is worth the best
+position it can reach. Taking or using an item and attacking always make
+progress (an item is used up or an enemy loses HP), so strata form a DAG.
+Each stratum is solved once, as an expectimax over the dice, and shared
+by every path that reaches it (a transposition table).
+
+Strata with the same items and bat_defeated (a "loadout") are solved
+together. Loadouts only lead to loadouts with fewer items left to find or
+use, so the loadouts in each layer are independent and can be solved in
+parallel on a process pool.
+
+The dice follow the game's CombatRules (see rules.py), what items do
+comes from their definitions (see items.py), and worlds are read from
+their exits, items and roles, so small custom caves, their own items and
+rule variants work too, as long as every HP fits in 8 bits.
+"""
+
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from items import GUANO, ITEMS
+
+NONE, GUARDIAN, BAT = range(3)
+
+# Stratum key layout: 8 bits each for php, max_hp, guardian_hp and bat_hp,
+# one for bat_defeated, 4 per item kind for the inventory, then one bit per
+# item that started in a room and is still there
+_HP_BITS = 8
+_BAT_DEFEATED = 1 << 32
+_INVENTORY_SHIFT = 33
+
+
+def _distribution(damage_range):
+    low, high = damage_range
+    p = 1.0 / (high - low + 1)
+    return tuple((d, p) for d in range(low, high + 1))
+
+
+class Rules:
+    """Everything the solver needs to know about a world, as plain data"""
+    def __init__(self, world, player_hp, guardian_hp, bat_hp, combat):
+        templates = world.templates
+        self.keys = tuple(templates)
+        self.index = index = {key: i for i, key in enumerate(self.keys)}
+        roles = {role: index[key] for role, key in world.roles.items()}
+        self.start = index[world.start]
+        self.trap = roles.get('trap')
+        self.bat = roles.get('bat')
+        self.lair = roles.get('lair')
+        self.lair_back = roles.get('lair_back')
+        self.lair_exit = roles.get('lair_exit')
+        self.bat_exit = roles.get('bat_exit')
+        self.player_hp = player_hp
+        self.guardian_hp = guardian_hp
+        self.bat_hp = bat_hp
+        self.combat = combat
+
+        self.exits = tuple(tuple((direction, index[target]) for direction, target in templates[key].exits.items())
+                           for key in self.keys)
+        # Items that start in rooms, one bit each in the stratum key
+        self.slots = tuple((index[key], item) for key in self.keys for item in templates[key].items)
+        self.kinds = tuple(sorted({item for _, item in self.slots} | {GUANO}))
+        self.kind_index = {item: i for i, item in enumerate(self.kinds)}
+        self.mask_shift = _INVENTORY_SHIFT + 4 * len(self.kinds)
+        # What each kind does under these rules
+        self.damage = {item: ITEMS[item].damage_for(combat) for item in self.kinds}
+        self.hp_bonus = {item: ITEMS[item].hp_bonus_for(combat) for item in self.kinds}
+        self.healing = tuple(item for item in self.kinds if ITEMS[item].heals)
+        self.weapons = tuple(item for item in self.kinds if self.damage[item] is not None)
+        most_hp = player_hp + sum(self.hp_bonus[item] for _, item in self.slots)
+        if max(most_hp, guardian_hp, bat_hp) > 0xff:
+            raise ValueError("HP too large for the solver")
+
+        positions = [(room, NONE, s) for room in range(len(self.keys)) for s in (0, 1)]
+        for room, enemy in ((self.lair, GUARDIAN), (self.lair_back, GUARDIAN), (self.bat, BAT)):
+            if room is not None:
+                positions.extend((room, enemy, s) for s in (0, 1))
+        self.positions = tuple(positions)
+        self.position_index = {position: i for i, position in enumerate(positions)}
+
+    def inventory_count(self, key, item):
+        return (key >> (_INVENTORY_SHIFT + 4 * self.kind_index[item])) & 0xf
+
+    def initial_key(self):
+        """Return the stratum key of a new game"""
+        mask = (1 << len(self.slots)) - 1
+        return (self.player_hp | self.player_hp << _HP_BITS | self.guardian_hp << 16
+                | self.bat_hp << 24 | mask << self.mask_shift)
+
+    def state(self, game):
+        """Return (stratum key, position index) for a Game"""
+        inventory = 0
+        for item in game.inventory:
+            if item in self.kind_index:
+                shift = _INVENTORY_SHIFT + 4 * self.kind_index[item]
+                if (inventory >> shift) & 0xf == 0xf:
+                    raise ValueError(f"Too many {item} for the solver")
+                inventory += 1 << shift
+        mask = 0
+        remaining = {}
+        for bit, (room, item) in enumerate(self.slots):
+            remaining.setdefault((room, item), []).append(bit)
+        for (room, item), bits in remaining.items():
+            count = list(game.rooms[self.keys[room]].items).count(item)
+            # take() removes the first copy, so the last ones are still there
+            for bit in bits[len(bits) - count:] if count else ():
+                mask |= 1 << bit
+        bat_defeated = game.bat_defeated
+        key = (game.player_hp | game.player_max_hp << _HP_BITS | game.guardian_hp << 16
+               | (0 if bat_defeated else game.bat_hp) << 24
+               | (_BAT_DEFEATED if bat_defeated else 0) | inventory | mask << self.mask_shift)
+        enemy = {None: NONE, 'guardian': GUARDIAN, 'bat': BAT}[game.combat_enemy if game.in_combat else None]
+        position = self.position_index[(self.index[game.current_room.key], enemy,
+                                        int(game.surprised_guardian))]
+        return key, position
+
+
+class _Solver:
+    """Solves strata on demand, memoizing them in tables"""
+    def __init__(self, rules, tables=None):
+        self.rules = rules
+        self.tables = tables if tables is not None else {}
+        self.actions = ['']
+        self.action_ids = {'': 0}
+        positions = rules.positions
+        self._moves = {}
+        combat = rules.combat
+        self._weapons = {item: _distribution(rules.damage[item]) for item in rules.weapons}
+        self._bare = _distribution(combat.bare_hands_damage)
+        self._guardian = _distribution(combat.guardian_damage)
+        self._bat = _distribution(combat.bat_damage)
+        for bat_defeated in (False, True):
+            # Reverse edges of the moves and retreats within a stratum
+            entrances = [[] for _ in positions]
+            for i, (room, enemy, surprised) in enumerate(positions):
+                if enemy == NONE:
+                    for direction, target in rules.exits[room]:
+                        if target == rules.trap:
+                            continue
+                        if target == rules.bat and not bat_defeated:
+                            to = (target, BAT, surprised)
+                        elif target == rules.lair:
+                            to = (target, GUARDIAN, surprised)
+                        elif target == rules.lair_back:
+                            to = (target, GUARDIAN, 1)
+                        else:
+                            to = (target, NONE, surprised)
+                        entrances[rules.position_index[to]].append((i, self._action(direction)))
+                else:
+                    exit_room = rules.lair_exit if enemy == GUARDIAN else rules.bat_exit
+                    to = (exit_room, NONE, surprised)
+                    entrances[rules.position_index[to]].append((i, self._action('retreat')))
+            self._moves[bat_defeated] = entrances
+
+    def _action(self, command):
+        action = self.action_ids.get(command)
+        if action is None:
+            action = self.action_ids[command] = len(self.actions)
+            self.actions.append(command)
+        return action
+
+    def value(self, key, position):
+        values, _ = self.tables.get(key) or self.solve(key)
+        return values[position]
+
+    def solve(self, key):
+        """Return (values, actions) for every position of a stratum"""
+        rules = self.rules
+        php = key & 0xff
+        max_hp = (key >> _HP_BITS) & 0xff
+        guardian_hp = (key >> 16) & 0xff
+        bat_hp = (key >> 24) & 0xff
+        bat_defeated = bool(key & _BAT_DEFEATED)
+        mask = key >> rules.mask_shift
+
+        positions = rules.positions
+        best = [-1.0] * len(positions)
+        best_action = [0] * len(positions)
+
+        def offer(i, value, command):
+            if value > best[i]:
+                best[i] = value
+                best_action[i] = self._action(command)
+
+        # Items that can be taken, per room
+        takeable = {}
+        for bit, (room, item) in enumerate(rules.slots):
+            if mask >> bit & 1 and (room, item) not in takeable:
+                takeable[(room, item)] = bit
+        healing = [item for item in rules.healing if rules.inventory_count(key, item)]
+        weapons = [item for item in rules.weapons if rules.inventory_count(key, item)]
+
+        for i, (room, enemy, surprised) in enumerate(positions):
+            if enemy == BAT and bat_defeated:
+                continue
+            for (item_room, item), bit in takeable.items():
+                if item_room != room:
+                    continue
+                after = key & ~(1 << (rules.mask_shift + bit))
+                after += 1 << (_INVENTORY_SHIFT + 4 * rules.kind_index[item])
+                bonus = rules.hp_bonus[item]
+                if bonus:
+                    after = (after & ~0xffff) | (php + bonus) | (max_hp + bonus) << _HP_BITS
+                offer(i, self.value(after, i), f"take {item}")
+
+            if php < max_hp:
+                for item in healing:
+                    after = ((key & ~0xff) | max_hp) - (1 << (_INVENTORY_SHIFT + 4 * rules.kind_index[item]))
+                    offer(i, self.value(after, i), f"use {item}")
+
+            if enemy != NONE:
+                offer(i, self._attack(key, i, self._bare), "attack")
+                for item in weapons:
+                    offer(i, self._attack(key, i, self._weapons[item]), f"attack {item}")
+
+        # A position is worth the best position it can walk to: hand out
+        # values best first, walking the moves backwards from each source
+        values = array('d', [0.0] * len(positions))
+        actions = bytearray(len(positions))
+        done = [False] * len(positions)
+        entrances = self._moves[bat_defeated]
+        for source in sorted(range(len(positions)), key=best.__getitem__, reverse=True):
+            if best[source] <= 0.0:
+                break
+            if done[source]:
+                continue
+            done[source] = True
+            values[source] = best[source]
+            actions[source] = best_action[source]
+            queue = deque([source])
+            while queue:
+                for i, action in entrances[queue.popleft()]:
+                    if not done[i]:
+                        done[i] = True
+                        values[i] = best[source]
+                        actions[i] = action
+                        queue.append(i)
+        result = self.tables[key] = (values, bytes(actions))
+        return result
+
+    def _attack(self, key, position, weapon):
+        rules = self.rules
+        room, enemy, surprised = rules.positions[position]
+        php = key & 0xff
+        total = 0.0
+        if enemy == GUARDIAN:
+            guardian_hp = (key >> 16) & 0xff
+            after = rules.position_index[(room, GUARDIAN, 0)]
+            for dealt, p_dealt in weapon:
+                left = guardian_hp - dealt
+                if left <= 0:
+                    total += p_dealt
+                    continue
+                hit = (key & ~(0xff << 16)) | left << 16
+                if surprised:
+                    total += p_dealt * self.value(hit, after)
+                    continue
+                for taken, p_taken in self._guardian:
+                    if php - taken > 0:
+                        total += p_dealt * p_taken * self.value((hit & ~0xff) | (php - taken), after)
+        else:
+            bat_hp = (key >> 24) & 0xff
+            for dealt, p_dealt in weapon:
+                left = bat_hp - dealt
+                if left <= 0:
+                    # The bat drops guano and the fight ends
+                    won = (key & ~(0xff << 24)) | _BAT_DEFEATED
+                    won += 1 << (_INVENTORY_SHIFT + 4 * rules.kind_index[GUANO])
+                    total += p_dealt * self.value(won, rules.position_index[(room, NONE, surprised)])
+                    continue
+                hit = (key & ~(0xff << 24)) | left << 24
+                for taken, p_taken in self._bat:
+                    if php - taken > 0:
+                        total += p_dealt * p_taken * self.value((hit & ~0xff) | (php - taken), position)
+        return total
+
+
+class PolicyTable:
+    """Solved values and best commands for every stratum reachable from the start"""
+    def __init__(self, rules, tables, actions):
+        self.rules = rules
+        self.tables = tables
+        self.actions = tuple(actions)
+
+    def lookup(self, key, position):
+        """Return (win probability, best command) for a packed state"""
+        values, actions = self.tables[key]
+        return values[position], self.actions[actions[position]]
+
+    def for_game(self, game):
+        """Return (win probability, best command) for a Game's current state"""
+        return self.lookup(*self.rules.state(game))
+
+    def best_action(self, game):
+        return self.for_game(game)[1]
+
+    def win_rate(self):
+        """Return the best possible chance of winning a new game"""
+        start = self.rules.position_index[(self.rules.start, NONE, 0)]
+        return self.lookup(self.rules.initial_key(), start)[0]
+
+
+def _loadout(key):
+    return key & ~0xff & ~(0xff << 16) & ~(0xff << 24)
+
+
+def _solve_loadout(rules, loadout, tables):
+    """Solve every stratum of a loadout, given the solved strata it leads to"""
+    solver = _Solver(rules, dict(tables))
+    max_hp = (loadout >> _HP_BITS) & 0xff
+    bat_hps = (0,) if loadout & _BAT_DEFEATED else range(1, rules.bat_hp + 1)
+    for php in range(1, max_hp + 1):
+        for guardian_hp in range(1, rules.guardian_hp + 1):
+            for bat_hp in bat_hps:
+                key = loadout | php | guardian_hp << 16 | bat_hp << 24
+                if key not in solver.tables:
+                    solver.solve(key)
+    return {key: table for key, table in solver.tables.items() if _loadout(key) == loadout}, solver.actions
+
+
+def _successors(rules, loadout):
+    """Return the loadouts a loadout can lead to"""
+    result = set()
+    mask = loadout >> rules.mask_shift
+    max_hp = (loadout >> _HP_BITS) & 0xff
+    seen = set()
+    for bit, (room, item) in enumerate(rules.slots):
+        if mask >> bit & 1 and (room, item) not in seen:
+            seen.add((room, item))
+            after = loadout & ~(1 << (rules.mask_shift + bit))
+            after += 1 << (_INVENTORY_SHIFT + 4 * rules.kind_index[item])
+            bonus = rules.hp_bonus[item]
+            if bonus:
+                after = (after & ~(0xff << _HP_BITS)) | (max_hp + bonus) << _HP_BITS
+            result.add(after)
+    for item in rules.healing:
+        if rules.inventory_count(loadout, item):
+            result.add(loadout - (1 << (_INVENTORY_SHIFT + 4 * rules.kind_index[item])))
+    guano = 1 << (_INVENTORY_SHIFT + 4 * rules.kind_index[GUANO])
+    if not loadout & _BAT_DEFEATED and rules.bat is not None:
+        result.add((loadout | _BAT_DEFEATED) + guano)
+    return result
+
+
+def solve(world=None, processes=1, rules=None):
+    """Solve a world and return its PolicyTable
+
+    rules are the CombatRules to play by (the standard rules by default).
+    processes > 1 solves independent loadouts in parallel; None uses every
+    core.
+    """
+    from adventure import Game
+    from output import NullOutput
+
+    game = Game(NullOutput(), world=world, rules=rules)
+    rules = Rules(game.world, game.player_hp, game.guardian_hp, game.bat_hp, game.rules)
+
+    # Every loadout reachable from the start, and which ones each leads to
+    start = _loadout(rules.initial_key())
+    graph = {}
+    pending = [start]
+    while pending:
+        loadout = pending.pop()
+        if loadout not in graph:
+            graph[loadout] = _successors(rules, loadout)
+            pending.extend(graph[loadout])
+
+    # Layers: a loadout can be solved once everything it leads to is
+    layers = []
+    solved = set()
+    while len(solved) < len(graph):
+        layer = [loadout for loadout, after in graph.items()
+                 if loadout not in solved and after <= solved]
+        layers.append(layer)
+        solved.update(layer)
+
+    tables = {}
+    actions = None
+    pool = ProcessPoolExecutor(max_workers=processes) if processes != 1 else None
+    try:
+        for layer in layers:
+            jobs = []
+            for loadout in layer:
+                needed = {key: table for key, table in tables.items() if _loadout(key) in graph[loadout]}
+                jobs.append((rules, loadout, needed))
+            if pool is None or len(jobs) == 1:
+                results = [_solve_loadout(*job) for job in jobs]
+            else:
+                results = list(pool.map(_solve_loadout, *zip(*jobs)))
+            for solved_tables, solved_actions in results:
+                # Action ids are assigned in order of first use, so every
+                # worker's ids must be mapped into one shared list
+                if actions is None:
+                    actions = list(solved_actions)
+                ids = []
+                for command in solved_actions:
+                    if command not in actions:
+                        actions.append(command)
+                    ids.append(actions.index(command))
+                remap = bytes(ids)
+                for key, (values, moves) in solved_tables.items():
+                    tables[key] = (values, moves.translate(remap.ljust(256, b'\0')))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return PolicyTable(rules, tables, actions)
+
+
+def play(game, table):
+    """Play a game to the end following a policy table"""
+    while game.running:
+        command = table.best_action(game)
+        if not command:
+            game.parse_command('quit')
+            break
+        game.parse_command(command)
+
+
+def main():
+    """Solve the standard cave and print the best win rate and opening"""
+    import argparse
+    import time
+
+    from adventure import Game
+    from output import NullOutput
+
+    parser = argparse.ArgumentParser(description="Solve Cave Adventure for the best possible strategy")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = solve(processes=args.processes)
+    elapsed = time.perf_counter() - start
+    print(f"Solved {len(table.tables):,} strata ({len(table.tables) * len(table.rules.positions):,} states) "
+          f"in {elapsed:.1f}s")
+    print(f"Best possible win rate: {table.win_rate():.4%}")
+
+    # Follow the policy until the first roll of the dice
+    game = Game(NullOutput())
+    opening = []
+    while game.running and not game.in_combat and len(opening) < 100:
+        command = table.best_action(game)
+        if not command:
+            break
+        opening.append(command)
+        game.parse_command(command)
+    print("Opening: " + ", ".join(opening))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Cave Adventure - Balance Sweeps
+
+Simulates the standard fights (see SCENARIOS) under every combination of
+a grid of rule changes and prints two tables, win rate and average turns
+per fight, one row per variant:
+
+    python3 sweep.py --vary guardian_hp=15,20,25 --vary dagger_damage=2-16,4-12
+
+Each value given with --vary is a number, or low-high for a damage range
+(see rules.py for the names). Cells are simulated with combat_sim over a
+process pool, one cell per task.
+
+Every finished cell is stored in a JSON cache file, keyed by the hash of
+its rules (CombatRules.key()) together with the scenario, the number of
+fights and the seed. Cells are seeded, so a cached result is exactly what
+simulating it again would give, and a re-run, or a grid that overlaps an
+earlier one, only simulates the cells it hasn't seen.
+"""
+
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from combat_sim import simulate
+from rules import FIELDS, RANGES, STANDARD_RULES
+
+# (label, enemy, dagger, shield, surprised)
+SCENARIOS = (
+    ('guardian bare', 'guardian', False, False, False),
+    ('guardian dagger', 'guardian', True, False, False),
+    ('guardian full', 'guardian', True, True, False),
+    ('guardian surprise', 'guardian', True, True, True),
+    ('bat bare', 'bat', False, False, False),
+    ('bat dagger', 'bat', True, False, False),
+)
+
+
+def parse_vary(specs):
+    """Turn 'name=v1,v2,...' strings into an ordered {name: [values]} grid"""
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        name = name.strip()
+        if name not in FIELDS:
+            raise ValueError(f"Unknown rule: {name} (one of {', '.join(FIELDS)})")
+        parsed = []
+        for value in values.split(','):
+            if name in RANGES:
+                low, _, high = value.partition('-')
+                parsed.append((int(low), int(high or low)))
+            else:
+                parsed.append(int(value))
+        grid[name] = parsed
+    return grid
+
+
+def variants(grid, base=STANDARD_RULES):
+    """Return the rules for every combination of the grid's values"""
+    names = list(grid)
+    return [base.replace(**dict(zip(names, values)))
+            for values in itertools.product(*(grid[name] for name in names))]
+
+
+def cell_key(rules, scenario, fights, seed):
+    return f"{rules.key()}:{scenario}:{fights}:{seed}"
+
+
+def run_cell(rules, scenario, fights, seed):
+    """Simulate one cell; return its result as a small dict"""
+    _, enemy, dagger, shield, surprised = next(s for s in SCENARIOS if s[0] == scenario)
+    stats = simulate(fights, enemy, dagger, shield, surprised, seed=seed, rules=rules)
+    return {'fights': stats.fights, 'wins': stats.wins, 'win_rate': stats.win_rate,
+            'average_turns': stats.average_turns}
+
+
+def load_cache(path):
+    if path is None or not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_cache(path, cache):
+    """Write the cache file, replacing it atomically"""
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, separators=(',', ':'), sort_keys=True)
+    os.replace(temporary, path)
+
+
+class Sweep:
+    """The results of a grid of rule variants, filled in by run()"""
+    def __init__(self, grid, fights=100000, seed=0, scenarios=None, base=STANDARD_RULES):
+        self.grid = grid
+        self.fights = fights
+        self.seed = seed
+        self.scenarios = scenarios if scenarios is not None else [s[0] for s in SCENARIOS]
+        self.rules = variants(grid, base)
+        self.results = {}
+        self.simulated = 0
+        self.cached = 0
+
+    def run(self, processes=None, cache=None):
+        """Compute every cell not already in cache (a dict, updated in place)"""
+        cache = cache if cache is not None else {}
+        todo = []
+        for rules in self.rules:
+            for scenario in self.scenarios:
+                key = cell_key(rules, scenario, self.fights, self.seed)
+                if key in cache:
+                    self.results[key] = cache[key]
+                    self.cached += 1
+                else:
+                    todo.append((key, rules, scenario))
+        if todo:
+            jobs = [(rules, scenario, self.fights, self.seed) for _, rules, scenario in todo]
+            if processes == 1 or len(jobs) == 1:
+                results = [run_cell(*job) for job in jobs]
+            else:
+                with ProcessPoolExecutor(max_workers=processes) as pool:
+                    results = list(pool.map(run_cell, *zip(*jobs)))
+            for (key, _, _), result in zip(todo, results):
+                self.results[key] = cache[key] = result
+            self.simulated += len(todo)
+        return self
+
+    def result(self, rules, scenario):
+        return self.results[cell_key(rules, scenario, self.fights, self.seed)]
+
+    def _label(self, rules):
+        parts = []
+        for name in self.grid:
+            value = getattr(rules, name)
+            parts.append(f"{name}={value[0]}-{value[1]}" if name in RANGES else f"{name}={value}")
+        return ' '.join(parts) or 'standard'
+
+    def table(self, field, fmt):
+        """Return one statistic for every cell as text, a row per variant"""
+        labels = [self._label(rules) for rules in self.rules]
+        width = max(len(label) for label in labels + ['rules'])
+        widths = [max(len(scenario), 8) for scenario in self.scenarios]
+        lines = [f"{'rules':{width}}  " + '  '.join(f"{s:>{w}}" for s, w in zip(self.scenarios, widths))]
+        for label, rules in zip(labels, self.rules):
+            cells = [format(self.result(rules, scenario)[field], fmt) for scenario in self.scenarios]
+            lines.append(f"{label:{width}}  " + '  '.join(f"{c:>{w}}" for c, w in zip(cells, widths)))
+        return lines
+
+    def report(self):
+        lines = [f"{len(self.rules)} variants x {len(self.scenarios)} scenarios, {self.fights:,} fights per cell "
+                 f"({self.simulated} simulated, {self.cached} cached)", "", "Win rate:"]
+        lines += self.table('win_rate', '.2%')
+        lines += ["", "Average turns:"]
+        lines += self.table('average_turns', '.2f')
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            'fights': self.fights,
+            'seed': self.seed,
+            'variants': [{'rules': {name: getattr(rules, name) for name in self.grid},
+                          'key': rules.key(),
+                          'results': {scenario: self.result(rules, scenario) for scenario in self.scenarios}}
+                         for rules in self.rules],
+        }
+
+
+def main():
+    """Run a balance sweep from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sweep Cave Adventure combat rules")
+    parser.add_argument('--vary', action='append', default=[], metavar='RULE=V1,V2,...',
+                        help="Values to try for a rule, e.g. guardian_hp=15,20 or dagger_damage=2-16,3-12")
+    parser.add_argument('-n', '--fights', type=int, default=100000, help="Fights per cell")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scenario', action='append', choices=[s[0] for s in SCENARIOS],
+                        help="Fights to simulate (default: all)")
+    parser.add_argument('--processes', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--cache', default='sweep_cache.json',
+                        help="Results cache file (default sweep_cache.json)")
+    parser.add_argument('--no-cache', action='store_true', help="Neither read nor write the cache")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    try:
+        sweep = Sweep(parse_vary(args.vary), args.fights, args.seed, args.scenario)
+    except ValueError as error:
+        parser.error(str(error))
+    cache = {} if args.no_cache else load_cache(args.cache)
+    sweep.run(args.processes, cache)
+    if not args.no_cache and sweep.simulated:
+        save_cache(args.cache, cache)
+    if args.json:
+        print(json.dumps(sweep.to_dict(), indent=2))
+    else:
+        print(sweep.report())
+
+
+if __name__ == "__main__":
+    main()
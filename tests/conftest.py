@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adventure import RoomTemplate, World  # noqa: E402
+
+
+def make_small_world():
+    """Three rooms with no back way into the lair, so fights can be lost"""
+    return World({
+        'hall': RoomTemplate("Hall", "A hall.", {'east': 'lair', 'north': 'colony'}, ["shiny dagger"]),
+        'colony': RoomTemplate("Colony", "Bats.", {'south': 'hall'}, ["ancient shield"]),
+        'lair': RoomTemplate("Lair", "The guardian.", {'west': 'hall'}),
+    }, 'hall', {'bat': 'colony', 'bat_exit': 'hall', 'lair': 'lair', 'lair_exit': 'hall'})
+
+
+@pytest.fixture
+def small_world():
+    return make_small_world()
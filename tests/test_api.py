@@ -0,0 +1,149 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+from api import MAX_BODY, GameApi, MemoryStore, make_server, open_store
+
+
+@pytest.fixture
+def store():
+    return MemoryStore()
+
+
+def _serve(api):
+    server = make_server(api, port=0)
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def node(store):
+    server = _serve(GameApi(store))
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def request(port, method, path, body=None):
+    """Send a request; return (status, decoded JSON body)"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    if isinstance(body, dict):
+        body = json.dumps(body)
+    connection.request(method, path, body)
+    return _response(connection)
+
+
+def raw_request(port, method, path, headers):
+    """Send a request with exactly these headers (http.client adds Content-Length otherwise)"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    connection.putrequest(method, path)
+    for name, value in headers.items():
+        connection.putheader(name, value)
+    connection.endheaders()
+    return _response(connection)
+
+
+def _response(connection):
+    response = connection.getresponse()
+    result = response.status, json.loads(response.read())
+    connection.close()
+    return result
+
+
+def test_create_and_play(node):
+    status, created = request(node, 'POST', '/session')
+    assert status == 200
+    session = created['session']
+    assert created['state']['room'] == 'swallows_nest'
+    assert any('room' in line for line in created['output'])
+
+    status, moved = request(node, 'POST', '/command', {'session': session, 'command': 'north'})
+    assert status == 200
+    assert moved['state']['room'] == 'the_arsenal'
+    assert moved['output'][0]['room'] == 'the_arsenal'
+
+    request(node, 'POST', '/command', {'session': session, 'command': 'take dagger'})
+    status, state = request(node, 'GET', f'/session/{session}')
+    assert status == 200
+    assert state['state']['inventory'] == ['shiny dagger']
+
+    assert request(node, 'DELETE', f'/session/{session}') == (200, {})
+    assert request(node, 'GET', f'/session/{session}')[0] == 404
+
+
+@pytest.mark.parametrize('method, path, body', [
+    ('POST', '/command', {'session': 'missing', 'command': 'look'}),
+    ('GET', '/session/missing', None),
+    ('POST', '/elsewhere', None),
+    ('GET', '/elsewhere', None),
+    ('GET', '/session/', None),
+])
+def test_not_found(node, method, path, body):
+    status, response = request(node, method, path, body)
+    assert status == 404 and 'error' in response
+
+
+def test_create_without_content_length(node):
+    status, created = raw_request(node, 'POST', '/session', {})
+    assert status == 200 and created['session']
+
+
+@pytest.mark.parametrize('body', [
+    'not json',
+    '[1, 2]',
+    {'session': 'x'},
+    {'session': 'x', 'command': 5},
+    {'session': 'x', 'command': 'look ' * 300},
+])
+def test_bad_requests(node, body):
+    status, response = request(node, 'POST', '/command', body)
+    assert status == 400 and 'error' in response
+
+
+@pytest.mark.parametrize('length', ('two', '-1'))
+def test_bad_content_length(node, length):
+    status, response = raw_request(node, 'POST', '/session', {'Content-Length': length})
+    assert status == 400 and 'error' in response
+
+
+def test_large_body_is_refused(node):
+    assert request(node, 'POST', '/command', 'x' * (MAX_BODY + 1))[0] == 413
+
+
+def test_finished_game(node):
+    session = request(node, 'POST', '/session')[1]['session']
+    request(node, 'POST', '/command', {'session': session, 'command': 'quit'})
+    assert request(node, 'POST', '/command', {'session': session, 'command': 'look'})[0] == 409
+
+
+def test_nodes_share_a_store(store, node):
+    other = _serve(GameApi(store))
+    try:
+        port = other.server_address[1]
+        session = request(node, 'POST', '/session')[1]['session']
+        request(node, 'POST', '/command', {'session': session, 'command': 'north'})
+        # The other node moves the game on; the first must not use its cached copy
+        assert request(port, 'POST', '/command', {'session': session, 'command': 'east'})[1]['state']['room'] \
+            == 'warning_chamber'
+        assert request(node, 'GET', f'/session/{session}')[1]['state']['room'] == 'warning_chamber'
+    finally:
+        other.shutdown()
+        other.server_close()
+
+
+@pytest.mark.parametrize('url', ('sqlite:{}/sessions.db', 'dbm:{}/sessions'))
+def test_stores(tmp_path, url):
+    store = open_store(url.format(tmp_path))
+    try:
+        store.put('a', b'1')
+        store.put_many([('b', b'2'), ('a', None)])
+        assert store.get('a') is None and store.get('b') == b'2'
+        assert store.keys() == ['b']
+        store.delete('b')
+        assert store.get('b') is None
+    finally:
+        store.close()
+    with pytest.raises(ValueError):
+        open_store('redis:somewhere')
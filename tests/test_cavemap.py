@@ -0,0 +1,62 @@
+import io
+import random
+
+import pytest
+
+from adventure import Game, get_world
+from cavemap import VIEW_COLUMNS, VIEW_ROWS, MapView
+from output import BufferedOutput, NullOutput
+from procgen import generate_world
+
+DIRECTIONS = ('north', 'south', 'east', 'west', 'up', 'down', 'forward', 'back')
+
+
+def _walk(world, seed, steps):
+    """Yield (room, visited) along a random walk that avoids fights and traps"""
+    game = Game(NullOutput(), world=world)
+    game.bat_defeated = True
+    avoid = {world.roles.get(role) for role in ('trap', 'lair', 'lair_back')}
+    rng = random.Random(seed)
+    for _ in range(steps):
+        exits = [d for d, target in game.current_room.exits.items() if target not in avoid]
+        game.parse_command(rng.choice(exits))
+        yield game.current_room.key, set(game.visited)
+
+
+@pytest.mark.parametrize('world, columns, rows', [
+    (get_world(), None, None),
+    (get_world(), 3, 3),
+    (generate_world(6), VIEW_COLUMNS, VIEW_ROWS),
+])
+def test_incremental_redraw_matches_a_full_redraw(world, columns, rows):
+    layout = world.layout()
+    view = MapView(layout, columns, rows)
+    for room, visited in _walk(world, 1, 150):
+        lines = list(view.render(room, visited))
+        fresh = MapView(layout, columns, rows)
+        fresh._draw(view.window)
+        assert fresh.render(room, visited) == lines
+
+
+def test_player_and_visited_marks():
+    world = get_world()
+    lines = MapView(world.layout()).render(world.start, {world.start, 'the_arsenal'})
+    text = '\n'.join(lines)
+    assert text.count('[@]') == 1 and text.count('[*]') == 1
+    assert text.count('[') == len(world.templates)
+
+
+def _map(world, command):
+    buffer = io.StringIO()
+    game = Game(BufferedOutput(buffer), world=world)
+    game.parse_command(command)
+    game.output.flush()
+    return buffer.getvalue()
+
+
+def test_full_map_of_a_generated_cave_shows_the_window():
+    world = generate_world(2)
+    text = _map(world, 'map full')
+    assert "too large to map whole" in text
+    assert text.split("too large to map whole")[1].split('\n', 1)[1] == _map(world, 'map')
+    assert world.templates.template_at.cache_info().currsize == 1
@@ -0,0 +1,33 @@
+import pytest
+
+from adventure import Game
+from combat_odds import OPTIMAL, get_table, make_solver, odds_for_game
+from items import DAGGER, GUANO
+from output import NullOutput
+
+
+def _fight(max_hp, player_hp):
+    game = Game(NullOutput())
+    game.inventory.add(DAGGER)
+    game.inventory.add(GUANO)
+    game.in_combat = True
+    game.combat_enemy = 'guardian'
+    game.has_shield = True
+    game.player_max_hp = max_hp
+    game.player_hp = player_hp
+    return game
+
+
+def test_standard_loadout_uses_the_table():
+    game = _fight(15, 5)
+    expected = get_table(OPTIMAL).lookup('guardian', True, True, 5, game.guardian_hp, False, True)
+    assert odds_for_game(game, OPTIMAL) is expected
+
+
+def test_other_max_hp_is_solved():
+    # Another HP item on top of the shield raises the cap guano heals to
+    game = _fight(18, 5)
+    solve = make_solver('guardian', True, 18, OPTIMAL)
+    odds = odds_for_game(game, OPTIMAL)
+    assert odds.win == pytest.approx(solve(5, game.guardian_hp, False, True).win)
+    assert odds.win > odds_for_game(_fight(15, 5), OPTIMAL).win
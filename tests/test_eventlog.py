@@ -0,0 +1,99 @@
+import os
+
+from adventure import Game
+from dice import RollStream
+from eventlog import Aggregator, EventLog, read_events
+
+
+def test_rotation_at_max_bytes(tmp_path):
+    path = str(tmp_path / 'events.log')
+    log = EventLog(path, max_bytes=400, backups=2, buffer_size=1)
+    for number in range(100):
+        log.record('s', 'tick', {'n': number})
+    log.close()
+    files = log.files()
+    assert files == [f"{path}.2", f"{path}.1", path]
+    # Rotated files were full; the oldest lines are gone and the rest are in order
+    assert all(os.path.getsize(name) >= 400 for name in files[:-1])
+    numbers = [event['n'] for event in read_events(files)]
+    assert numbers == list(range(numbers[0], 100)) and numbers[0] > 0
+
+
+def test_rotation_without_backups(tmp_path):
+    path = str(tmp_path / 'events.log')
+    log = EventLog(path, max_bytes=200, backups=0, buffer_size=1)
+    for number in range(50):
+        log.record('s', 'tick', {'n': number})
+    log.close()
+    assert log.files() == [path]
+    assert [event['n'] for event in read_events([path])][-1] == 49
+
+
+def test_buffered_lines_are_written_on_flush(tmp_path):
+    path = str(tmp_path / 'events.log')
+    log = EventLog(path)
+    log.record('s', 'tick', {})
+    assert os.path.getsize(path) == 0
+    log.flush()
+    assert [event['e'] for event in read_events([path])] == ['tick']
+    log.close()
+
+
+def _events(session, *events):
+    return [dict(data, s=session, e=kind) for kind, data in events]
+
+
+def test_aggregator_totals():
+    events = (
+        _events('a', ('session_started', {}), ('room_entered', {'room': 'hall'}),
+                ('item_taken', {'item': 'shiny dagger', 'room': 'hall'}), ('room_entered', {'room': 'lair'}),
+                ('combat_started', {'enemy': 'guardian'}), ('damage_dealt', {'source': 'player', 'amount': 5}),
+                ('damage_dealt', {'source': 'player', 'amount': 0}), ('game_won', {}))
+        + _events('b', ('session_started', {}), ('room_entered', {'room': 'hall'}),
+                  ('room_entered', {'room': 'hall'}), ('combat_started', {'enemy': 'bat'}),
+                  ('player_died', {'room': 'hall', 'cause': 'bat'}))
+        + _events('c', ('session_started', {}), ('player_died', {'room': 'pit', 'cause': 'trap'})))
+    stats = Aggregator().add_all(events)
+    assert stats.sessions == 3 and stats.events == len(events)
+    assert stats.reached == {'hall': 2, 'lair': 1}
+    assert stats.entries == {'hall': 3, 'lair': 1}
+    assert stats.deaths == {'hall': {'bat': 1}, 'pit': {'trap': 1}}
+    assert stats.funnel == {'started': 3, 'found dagger': 1, 'fought guardian': 1, 'won': 1}
+    assert stats.fights['guardian'] == {'started': 1, 'won': 1}
+    assert stats.fights['bat'] == {'started': 1, 'lost': 1}
+    assert stats.damage['player'] == {'total': 5, 'hits': 1, 'misses': 1}
+    # Finished sessions are no longer tracked
+    assert not stats._open
+
+
+def test_least_recent_session_is_evicted():
+    stats = Aggregator(max_sessions=2)
+    for session in ('a', 'b'):
+        stats.add_all(_events(session, ('session_started', {}), ('room_entered', {'room': 'hall'})))
+    stats.add_all(_events('a', ('room_entered', {'room': 'cave'})))
+    stats.add_all(_events('c', ('session_started', {})))
+    assert stats.evicted == 1
+    assert list(stats._open) == ['a', 'c']
+    # b is forgotten: back in the hall it counts as reaching it again
+    stats.add_all(_events('b', ('room_entered', {'room': 'hall'})))
+    assert stats.reached['hall'] == 3
+    assert stats.evicted == 2 and list(stats._open) == ['c', 'b']
+    # Sessions still tracked only reach a room once
+    stats.add_all(_events('b', ('room_entered', {'room': 'hall'})))
+    assert stats.reached['hall'] == 3 and stats.entries['hall'] == 4
+
+
+def test_logged_games_add_up(tmp_path):
+    path = str(tmp_path / 'events.log')
+    log = EventLog(path)
+    for seed in range(20):
+        game = Game(log.session(), RollStream(seed))
+        for command in ('north', 'take dagger', 'east', 'east', 'attack dagger', 'attack dagger',
+                        'attack dagger', 'attack dagger', 'attack dagger', 'attack dagger'):
+            game.parse_command(command)
+    log.close()
+    stats = Aggregator().add_all(read_events([path]))
+    assert stats.sessions == 20
+    assert stats.funnel['found dagger'] == 20 and stats.funnel['fought guardian'] == 20
+    assert stats.fights['guardian']['won'] + stats.fights['guardian']['lost'] <= 20
+    assert stats.reached['warning_chamber'] == 20
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from adventure import Game
+from dice import RollStream
+from items import DAGGER, ITEMS, SHIELD, Item, ItemIndex
+from output import NullOutput
+from rules import CombatRules
+from worldfile import WorldFileError, compile_world, load_json, load_world
+
+WORLD = {
+    'start': 'hall',
+    'roles': {'lair': 'lair', 'lair_exit': 'hall'},
+    'rooms': {
+        'hall': {'name': "Hall", 'description': "A hall.", 'exits': {'east': 'lair'},
+                 'items': ["test sword", "test helmet", "test mushroom", DAGGER]},
+        'lair': {'name': "Lair", 'description': "The guardian.", 'exits': {'west': 'hall'}},
+    },
+    'items': {
+        "test sword": {'damage': [30, 30]},
+        "test helmet": {'max_hp_bonus': 3},
+        "test mushroom": {'heals': True},
+    },
+}
+
+
+@pytest.fixture
+def world_file(tmp_path):
+    path = tmp_path / 'world.json'
+    path.write_text(json.dumps(WORLD))
+    return path
+
+
+def test_standard_items_follow_the_rules():
+    rules = CombatRules(dagger_damage=(5, 6), shield_bonus=9)
+    game = Game(NullOutput(), world=None, rules=rules)
+    assert game.item_damage(DAGGER) == (5, 6)
+    assert game.item_hp_bonus(SHIELD) == 9
+    assert Game(NullOutput()).item_damage(DAGGER) == (2, 16)
+
+
+@pytest.mark.parametrize('compiled', (False, True))
+def test_world_file_items_have_their_stats(world_file, tmp_path, compiled):
+    world = load_json(world_file)
+    if compiled:
+        path = tmp_path / 'world.cave'
+        compile_world(world, path)
+        world = load_world(path)
+    game = Game(NullOutput(), RollStream(0), world)
+    for command in ('take sword', 'take helmet', 'take mushroom', 'take dagger'):
+        game.parse_command(command)
+    assert game.player_max_hp == game.rules.player_hp + 3
+    assert game.inventory.weapon(game.rules).name == "test sword"
+    game.parse_command('east')
+    game.parse_command('attack sword')
+    assert not game.running and game.guardian_hp <= 0
+
+
+def test_redefining_an_item_differently_fails(world_file, tmp_path):
+    load_json(world_file)
+    other = dict(WORLD, items={"test sword": {'damage': [1, 2]}})
+    path = tmp_path / 'other.json'
+    path.write_text(json.dumps(other))
+    with pytest.raises(WorldFileError):
+        load_json(path)
+
+
+@pytest.mark.parametrize('spec', ({'damage': [0, 3]}, {'damage': [4, 3]}, {'damage': 'guardian_hp'},
+                                  {'max_hp_bonus': -1}, {'max_hp_bonus': 'dagger_damage'}, {'heals': 'yes'}))
+def test_bad_definitions_are_rejected(tmp_path, spec):
+    path = tmp_path / 'bad.json'
+    path.write_text(json.dumps(dict(WORLD, items={"test bad item": spec})))
+    with pytest.raises(WorldFileError):
+        load_json(path)
+    assert "test bad item" not in ITEMS
+
+
+def test_plain_item_takes_its_definition():
+    index = ItemIndex()
+    plain = index.get("lamp")
+    defined = index.define(Item("lamp", heals=True))
+    assert defined is plain and plain.heals and plain.id == 0
+    assert index.define(Item("lamp", heals=True)) is plain
+    with pytest.raises(ValueError):
+        index.define(Item("lamp", damage=(1, 2)))
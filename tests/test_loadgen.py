@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from adventure import Game
+from loadgen import DEFAULT_MODEL, KINDS, LoadConfig, LoadTest, Player, check_model, start_offset
+from output import NullOutput
+
+
+def test_check_model():
+    rows = check_model({'start': {'move': 1}, 'combat': {'attack': 3, 'retreat': 0, 'use': 1}})
+    assert rows == {'start': (['move'], [1]), 'combat': (['attack', 'use'], [3, 4])}
+    assert set(check_model(DEFAULT_MODEL)) == set(DEFAULT_MODEL)
+
+
+@pytest.mark.parametrize('model, message', [
+    ({'combat': {'attack': 1}}, "'start' row"),
+    ({'start': {'move': 1}}, "'combat' row"),
+    ({'start': {'move': 1}, 'combat': {'attack': 1}, 'dance': {'move': 1}}, "Unknown model row"),
+    ({'start': {'move': 1}, 'combat': {'attack': 1, 'sing': 1}}, "Unknown command kind"),
+    ({'start': {'move': 0}, 'combat': {'attack': 1}}, "no positive weights"),
+])
+def test_check_model_rejects(model, message):
+    with pytest.raises(ValueError, match=message):
+        check_model(model)
+
+
+def test_start_offset_linear():
+    offsets = [start_offset(index, 4, 8.0, 'linear') for index in range(4)]
+    assert offsets == [0.0, 2.0, 4.0, 6.0]
+
+
+def test_start_offset_step():
+    offsets = [start_offset(index, 10, 10.0, 'step', steps=5) for index in range(10)]
+    assert offsets == [0.0, 0.0, 2.0, 2.0, 4.0, 4.0, 6.0, 6.0, 8.0, 8.0]
+
+
+@pytest.mark.parametrize('sessions, ramp, profile', [
+    (10, 5.0, 'instant'), (10, 0.0, 'linear'), (1, 5.0, 'step'),
+])
+def test_start_offset_all_at_once(sessions, ramp, profile):
+    assert all(start_offset(index, sessions, ramp, profile) == 0.0 for index in range(sessions))
+
+
+def test_start_offset_unknown_profile():
+    with pytest.raises(ValueError):
+        start_offset(1, 10, 5.0, 'sawtooth')
+
+
+@pytest.mark.parametrize('arguments', [
+    {'sessions': 0}, {'workers': 0}, {'duration': 0}, {'interval': -1},
+    {'think': 'sometimes'}, {'profile': 'sawtooth'}, {'model': {'start': {'move': 1}}},
+])
+def test_config_is_checked(arguments):
+    with pytest.raises(ValueError):
+        LoadConfig(**arguments)
+
+
+def test_players_follow_the_model():
+    model = check_model({'start': {'take': 1}, 'take': {'move': 1}, 'combat': {'use': 1}})
+    rng = random.Random(0)
+    player = Player()
+    player.game = Game(NullOutput())
+    # No item in the first room, so 'take' becomes a move
+    kind, command = player.next_command(model, rng)
+    assert kind == 'move' and command in player.game.current_room.exits
+    player.game.parse_command('north')
+    player.last = 'start'
+    assert player.next_command(model, rng) == ('take', "take shiny dagger")
+    kind, command = player.next_command(model, rng)
+    assert kind == 'move' and command in player.game.current_room.exits
+    player.game.in_combat = True
+    assert player.next_command(model, rng) == ('use', "use guano")
+
+
+def test_short_run():
+    config = LoadConfig(sessions=20, workers=2, duration=0.3, interval=0.1, think='none', seed=1)
+    test = LoadTest(config).run()
+    assert len(test.intervals) == 3
+    assert test.commands > 0 and test.games['started'] >= 20
+    assert test.intervals[-1].sessions == 20
+    assert set(test.latency) <= set(KINDS)
+    assert sum(histogram.count for histogram in test.latency.values()) == test.commands
+    assert "Throughput" in test.report()
+    assert test.to_dict()['commands'] == test.commands
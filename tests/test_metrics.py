@@ -0,0 +1,101 @@
+import re
+
+import pytest
+
+import metrics
+from adventure import Game, Room
+from dice import RollStream
+from metrics import BUCKETS, Histogram
+from output import EventOutput, NullOutput
+from shared import SharedCave, SharedGame
+
+SAMPLE = re.compile(r'^([a-z_]+)(?:\{([^}]*)\})? (\S+)$')
+
+
+@pytest.fixture
+def stats():
+    originals = (Game.parse_command, Game.take, Room.describe, SharedGame.take)
+    try:
+        yield metrics.enable()
+    finally:
+        metrics.disable()
+    assert (Game.parse_command, Game.take, Room.describe, SharedGame.take) == originals
+
+
+def test_commands_and_handlers_are_counted(stats):
+    game = Game(NullOutput())
+    for command in ('north', 'n', 'take dagger', 'look', 'dance', 'go', ''):
+        game.parse_command(command)
+    assert stats.commands == {'move': 3, 'take': 1, 'look': 1, 'unknown': 1}
+    assert stats.errors == {'unknown_command': 1}
+    # 'go' alone is answered by the parser without calling move()
+    assert {name: h.count for name, h in stats.handler_latency.items()} == {'move': 2, 'take': 1, 'describe': 2}
+
+
+def test_shared_game_handlers_are_counted_once(stats):
+    game = SharedGame(SharedCave(), "Tester", NullOutput())
+    for command in ('north', 'take dagger', 'look'):
+        game.parse_command(command)
+    assert stats.commands == {'move': 1, 'take': 1, 'look': 1}
+    assert stats.handler_latency['take'].count == 1
+
+
+def test_outcomes(stats):
+    game = Game(NullOutput(), RollStream(1))
+    for command in ('north', 'east', 'north'):
+        game.parse_command(command)
+    assert stats.outcomes == {'died_trap': 1}
+
+
+def test_metrics_command_is_for_operators(stats):
+    player, operator = Game(EventOutput()), Game(EventOutput(), operator=True)
+    for game in (player, operator):
+        game.parse_command('metrics')
+    assert [kind for kind, _ in player.output.log] == ['unknown_command']
+    assert operator.output.log == []
+    assert stats.commands['show_metrics'] == 1
+
+
+def test_stats_is_status():
+    assert Game.commands['stats'] is Game.commands['status']
+
+
+def test_histogram_quantiles():
+    histogram = Histogram()
+    for seconds in (2e-6,) * 90 + (0.2,) * 10:
+        histogram.observe(seconds)
+    assert histogram.quantile(0.5) == 2.5e-6
+    assert histogram.quantile(0.95) == 0.25
+    assert Histogram().merge(histogram).merge(histogram).count == 200
+
+
+def test_prometheus_text(stats, tmp_path):
+    game = Game(NullOutput())
+    for command in ('north', 'take dagger', 'dance'):
+        game.parse_command(command)
+    path = tmp_path / 'cave.prom'
+    stats.write(path)
+    text = path.read_text()
+    assert text == stats.prometheus()
+
+    types = {}
+    samples = []
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split()
+            types[name] = kind
+        elif not line.startswith('# HELP '):
+            match = SAMPLE.match(line)
+            assert match, line
+            samples.append(match.groups())
+    assert types['cave_commands_total'] == 'counter'
+    assert types['cave_command_duration_seconds'] == 'histogram'
+    assert ('cave_commands_total', 'command="take"', '1') in samples
+    assert ('cave_errors_total', 'kind="unknown_command"', '1') in samples
+
+    # Buckets are cumulative and end with +Inf, which equals the count
+    buckets = [(labels, int(value)) for name, labels, value in samples
+               if name == 'cave_command_duration_seconds_bucket' and 'command="move"' in labels]
+    assert len(buckets) == len(BUCKETS) + 1
+    assert [value for _, value in buckets] == sorted(value for _, value in buckets)
+    assert buckets[-1] == ('command="move",le="+Inf"', 1)
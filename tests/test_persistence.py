@@ -0,0 +1,116 @@
+import time
+
+import pytest
+
+import snapshot
+from adventure import Game
+from api import MemoryStore, open_store
+from output import NullOutput
+from persistence import WriteBehindStore, recover
+
+
+class FlakyStore(MemoryStore):
+    """A MemoryStore whose put_many() fails while `broken` is set"""
+    def __init__(self):
+        super().__init__()
+        self.broken = False
+        self.batches = []
+
+    def put_many(self, items):
+        items = list(items)
+        self.batches.append(items)
+        if self.broken:
+            raise OSError("disk full")
+        super().put_many(items)
+
+
+@pytest.fixture
+def backend():
+    return FlakyStore()
+
+
+@pytest.fixture
+def store(backend):
+    # Autosave never fires by itself; the tests flush by hand
+    store = WriteBehindStore(backend, interval=3600)
+    yield store
+    backend.broken = False
+    store.close()
+
+
+def test_saves_are_coalesced(store, backend):
+    for data in (b'1', b'2', b'3'):
+        store.put('a', data)
+    store.put('b', b'x')
+    assert store.get('a') == b'3' and backend.get('a') is None
+    store.flush()
+    assert backend.batches == [[('a', b'3'), ('b', b'x')]]
+    assert store.batches == 1 and store.written == 2
+
+
+def test_unchanged_snapshots_are_skipped(store, backend):
+    store.put('a', b'1')
+    store.flush()
+    store.put('a', b'1')
+    store.flush()
+    assert store.skipped == 1 and len(backend.batches) == 1
+    store.delete('a')
+    store.flush()
+    assert backend.get('a') is None and store.get('a') is None
+    # Once deleted, the same snapshot is new again
+    store.put('a', b'1')
+    assert store.skipped == 1
+
+
+def test_failed_flush_is_merged_back(store, backend):
+    store.put('a', b'1')
+    store.put('b', b'1')
+    backend.broken = True
+    with pytest.raises(OSError):
+        store.flush()
+    # Nothing is lost and reads do not go back in time
+    assert store.get('a') == b'1' and backend.get('a') is None
+    # A save made after the failure is newer than the failed batch
+    store.put('b', b'2')
+    backend.broken = False
+    store.flush()
+    assert backend.get('a') == b'1' and backend.get('b') == b'2'
+    assert store.batches == 1 and store.written == 2
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_background_writer_retries(backend):
+    backend.broken = True
+    store = WriteBehindStore(backend, interval=0.01)
+    try:
+        store.put('a', b'1')
+        _wait_for(lambda: store.failures >= 2)
+        assert store.get('a') == b'1'
+        backend.broken = False
+        _wait_for(lambda: backend.get('a') is not None)
+    finally:
+        store.close()
+    assert store.failures >= 2 and backend.get('a') == b'1'
+
+
+def test_close_writes_what_is_left(backend):
+    store = WriteBehindStore(backend, interval=3600)
+    store.put('a', b'1')
+    store.close()
+    assert backend.get('a') == b'1'
+
+
+def test_recover(tmp_path):
+    store = open_store(f'sqlite:{tmp_path}/sessions.db')
+    good = snapshot.dumps(Game(NullOutput()))
+    store.put_many([('good', good), ('torn', good[:len(good) // 2]), ('junk', b'junk')])
+    assert recover(store) == (1, 2)
+    assert store.keys() == ['good']
+    assert recover(store) == (1, 0)
+    store.close()
@@ -0,0 +1,58 @@
+import pytest
+
+from adventure import Game
+from output import NullOutput
+from procgen import generate_world
+from routes import find_path
+
+OPPOSITE = {'north': 'south', 'south': 'north', 'east': 'west', 'west': 'east'}
+
+
+def _rooms(world, keys):
+    return [(world.templates[key].name, world.templates[key].description, dict(world.templates[key].exits),
+             list(world.templates[key].items)) for key in keys]
+
+
+def test_same_seed_same_cave():
+    keys = [f"cave_{x}_{y}" for x in range(0, 400, 37) for y in range(0, 250, 23)]
+    first, again, other = generate_world(11), generate_world(11), generate_world(12)
+    assert _rooms(first, keys) == _rooms(again, keys)
+    assert first.roles == again.roles and first.start == again.start
+    assert _rooms(first, keys) != _rooms(other, keys)
+
+
+def test_rooms_are_only_generated_when_used():
+    world = generate_world(3)
+    game = Game(NullOutput(), world=world)
+    assert world.templates.template_at.cache_info().currsize == 1
+    game.parse_command(next(iter(game.current_room.exits)))
+    assert world.templates.template_at.cache_info().currsize == 2
+
+
+@pytest.mark.parametrize('seed', (1, 2, 3))
+def test_passages_go_both_ways_and_reach_the_lair(seed):
+    world = generate_world(seed, width=30, height=20)
+    templates = world.templates
+    for key in templates:
+        for direction, target in templates.exits_of(key).items():
+            assert templates.exits_of(target)[OPPOSITE[direction]] == key
+    lair = world.roles['lair']
+    assert lair in templates.exits_of(world.roles['lair_exit']).values()
+    assert find_path(templates.exits_of, world.start, lair) is not None
+    # Passages go both ways, so everything reached from the lair can reach it
+    reached = {lair}
+    queue = [lair]
+    while queue:
+        for target in templates.exits_of(queue.pop()).values():
+            if target not in reached:
+                reached.add(target)
+                queue.append(target)
+    assert len(reached) == len(templates)
+
+
+def test_recent_rooms_are_evicted():
+    world = generate_world(4, width=20, height=20, cache_size=8)
+    for key in list(world.templates)[:20]:
+        world.rooms[key]
+    assert len(world.rooms) == 8
+    assert list(world.rooms) == list(world.templates)[12:20]
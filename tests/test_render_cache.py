@@ -0,0 +1,47 @@
+import pytest
+
+from adventure import ROOM_STYLES, Game
+from output import NullOutput
+
+
+def _fresh(room, style):
+    return ROOM_STYLES[style](room.template, room.items)
+
+
+@pytest.mark.parametrize('style', sorted(ROOM_STYLES))
+def test_rendered_once_and_reused(small_world, style):
+    room = small_world.rooms['hall']
+    text = room.render(style)
+    assert text == _fresh(room, style)
+    assert room.render(style) is text
+
+
+def test_taking_an_item_changes_only_that_game(small_world):
+    game, other = Game(NullOutput(), world=small_world), Game(NullOutput(), world=small_world)
+    before = other.current_room.render()
+    assert "shiny dagger" in before
+    game.parse_command('take dagger')
+    assert "shiny dagger" not in game.current_room.render()
+    assert game.current_room.render() == _fresh(game.current_room, 'plain')
+    assert other.current_room.render() is before
+
+
+def test_removed_item_drops_the_cache(small_world):
+    game = Game(NullOutput(), world=small_world)
+    room = game.own_room('colony')
+    texts = {style: room.render(style) for style in ROOM_STYLES}
+    room.remove_item("ancient shield")
+    for style, text in texts.items():
+        assert room.render(style) != text
+        assert room.render(style) == _fresh(room, style)
+
+
+def test_changed_exits_are_shown(small_world):
+    game = Game(NullOutput(), world=small_world)
+    owned = game.own_room('colony')
+    shared = small_world.rooms['hall']
+    old = shared.render(), owned.render()
+    small_world.set_exit('hall', 'west', 'colony')
+    small_world.set_exit('colony', 'up', 'hall')
+    assert shared.render() != old[0] and shared.render() == _fresh(shared, 'plain')
+    assert owned.render() != old[1] and owned.render() == _fresh(owned, 'plain')
@@ -0,0 +1,110 @@
+import random
+
+from adventure import Game, RoomTemplate, World
+from output import NullOutput
+from routes import RouteIndex, find_path
+
+# a - b - c - d in a line, with a one-way drop from d back to a
+LINE = {'a': {'east': 'b'}, 'b': {'west': 'a', 'east': 'c'}, 'c': {'west': 'b', 'east': 'd'},
+        'd': {'west': 'c', 'down': 'a'}}
+
+
+def _distances(index):
+    return {(source, destination): index.distance(source, destination)
+            for source in index.exits for destination in index.exits}
+
+
+def _check_hops(index):
+    """Every next hop leads one step closer (ties may pick any direction)"""
+    for (source, destination), distance in _distances(index).items():
+        if distance:
+            step = index.exits[source][index.next_hop(source, destination)]
+            assert index.distance(step, destination) == distance - 1
+
+
+def test_next_hop_tables():
+    index = RouteIndex(LINE)
+    assert index.table('d') == {'d': (None, 0), 'c': ('east', 1), 'b': ('east', 2), 'a': ('east', 3)}
+    assert index.path('a', 'd') == ['east', 'east', 'east']
+    assert index.path('d', 'a') == ['down']
+    assert index.distance('c', 'a') == 2
+    assert index.path('b', 'b') == []
+
+
+def test_unreachable_rooms():
+    index = RouteIndex({'a': {'east': 'b'}, 'b': {}, 'c': {}})
+    assert index.next_hop('b', 'a') is None
+    assert index.path('a', 'c') is None
+    assert index.distance('c', 'b') is None
+
+
+def test_set_exit_matches_a_fresh_index():
+    rng = random.Random(5)
+    rooms = [f"r{i}" for i in range(12)]
+    exits = {room: {} for room in rooms}
+    index = RouteIndex(exits)
+    index.precompute()
+    directions = ('north', 'south', 'east', 'west')
+    for _ in range(200):
+        room, direction = rng.choice(rooms), rng.choice(directions)
+        target = rng.choice(rooms + [None])
+        index.set_exit(room, direction, target)
+        if target is None:
+            exits[room].pop(direction, None)
+        else:
+            exits[room][direction] = target
+        assert _distances(index) == _distances(RouteIndex(exits))
+        _check_hops(index)
+
+
+def test_set_exit_keeps_unaffected_tables():
+    index = RouteIndex(LINE)
+    index.precompute()
+    kept = index.tables['a']
+    # A new exit into d cannot shorten any way to a
+    index.set_exit('b', 'north', 'd')
+    assert index.tables['a'] is kept
+    assert 'd' not in index.tables
+    assert index.path('a', 'd') == ['east', 'north']
+
+
+def test_find_path_gives_up_at_the_limit():
+    chain = {f"r{i}": {'east': f"r{i + 1}"} for i in range(50)}
+    chain['r50'] = {}
+    assert find_path(chain.__getitem__, 'r0', 'r50') == ['east'] * 50
+    assert find_path(chain.__getitem__, 'r0', 'r50', limit=10) is None
+
+
+def _corridor_world():
+    return World({
+        'hall': RoomTemplate("Hall", "A hall.", {'east': 'colony'}),
+        'colony': RoomTemplate("Colony", "Bats.", {'west': 'hall', 'east': 'vault'}),
+        'vault': RoomTemplate("Vault", "A vault.", {'west': 'colony', 'north': 'pit'}),
+        'pit': RoomTemplate("Pit", "A pit.", {}),
+        'lair': RoomTemplate("Lair", "The guardian.", {}),
+    }, 'hall', {'bat': 'colony', 'bat_exit': 'hall', 'trap': 'pit', 'lair': 'lair', 'lair_exit': 'hall'})
+
+
+def test_travel_stops_at_a_fight():
+    game = Game(NullOutput(), world=_corridor_world())
+    game.parse_command('travel vault')
+    assert game.current_room.key == 'colony'
+    assert game.in_combat and game.combat_enemy == 'bat'
+
+
+def test_travel_stops_at_death():
+    game = Game(NullOutput(), world=_corridor_world())
+    game.bat_defeated = True
+    game.parse_command('travel pit')
+    assert not game.running
+    assert game.current_room.key == 'vault'
+
+
+def test_travel_follows_changed_exits():
+    world = _corridor_world()
+    game = Game(NullOutput(), world=world)
+    game.bat_defeated = True
+    world.set_exit('hall', 'north', 'vault')
+    game.parse_command('travel vault')
+    assert game.current_room.key == 'vault'
+    assert game.visited == {'hall', 'vault'}
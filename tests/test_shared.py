@@ -0,0 +1,88 @@
+import threading
+
+from dice import RollStream
+from output import EventOutput, NullOutput
+from rules import CombatRules
+from shared import SharedCave, SharedGame
+
+TO_LAIR = ('north', 'east', 'east')
+
+
+def _player(cave, name, seed=0, output=None):
+    return SharedGame(cave, name, output if output is not None else NullOutput(), RollStream(seed))
+
+
+def test_one_guardian_per_cave():
+    cave = SharedCave(rules=CombatRules(guardian_hp=200))
+    first, second = _player(cave, "First", 1), _player(cave, "Second", 2)
+    for command in TO_LAIR + ('attack',):
+        first.parse_command(command)
+    wounded = cave.guardian_hp
+    assert wounded < 200
+    assert second.guardian_hp == wounded
+    for command in TO_LAIR:
+        second.parse_command(command)
+    assert second.in_combat and second.guardian_hp == wounded
+
+
+def test_new_guardian_after_a_win():
+    # One bare-handed blow always kills this guardian
+    cave = SharedCave(rules=CombatRules(guardian_hp=4, bare_hands_damage=(4, 4)))
+    output = EventOutput()
+    winner, watcher = _player(cave, "Winner", output=output), _player(cave, "Watcher")
+    for command in TO_LAIR + ('attack',):
+        winner.parse_command(command)
+    assert not winner.running
+    assert 'game_won' in [kind for kind, _ in output.log]
+    assert cave.guardian_hp == 4
+    assert winner not in cave.players and watcher in cave.players
+    # The watcher is in the start room, not the lair, so only hears of it there
+    assert not any("slain" in message for message in watcher.inbox)
+    for command in TO_LAIR:
+        watcher.parse_command(command)
+    assert watcher.in_combat and watcher.guardian_hp == 4
+
+
+def test_items_and_the_bat_are_shared():
+    cave = SharedCave()
+    first, second = _player(cave, "First"), _player(cave, "Second")
+    first.parse_command('north')
+    first.parse_command('take dagger')
+    second.parse_command('north')
+    second.parse_command('take dagger')
+    assert "shiny dagger" in first.inventory and "shiny dagger" not in second.inventory
+    cave.bat_defeated = True
+    assert first.bat_defeated and second.bat_defeated
+
+
+def test_players_see_each_other():
+    cave = SharedCave()
+    first, second = _player(cave, "First"), _player(cave, "Second")
+    second.parse_command('north')
+    first.parse_command('north')
+    assert list(second.inbox) == ["First arrives."]
+    assert cave.others(first, 'the_arsenal') == ["Second"]
+    second.parse_command('look')
+    assert not second.inbox
+    first.parse_command('quit')
+    assert cave.others(second, 'the_arsenal') == []
+
+
+def test_one_dagger_among_many_threads():
+    cave = SharedCave()
+    players = [_player(cave, f"Player {number}") for number in range(16)]
+    for player in players:
+        player.parse_command('north')
+    start = threading.Barrier(len(players))
+
+    def grab(player):
+        start.wait()
+        player.parse_command('take dagger')
+
+    threads = [threading.Thread(target=grab, args=(player,)) for player in players]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum("shiny dagger" in player.inventory for player in players) == 1
+    assert "shiny dagger" not in cave.rooms['the_arsenal'].items
@@ -0,0 +1,168 @@
+import os
+import random
+import struct
+
+import pytest
+
+import snapshot
+from adventure import Game
+from dice import RollStream
+from items import DAGGER, GUANO, SHIELD
+from output import EventOutput
+from replay import load_scripts
+
+COMMANDS = ('north', 'south', 'east', 'west', 'up', 'down', 'forward', 'back', 'take dagger',
+            'take shield', 'use guano', 'attack', 'attack dagger', 'retreat', 'look')
+
+# Item ids as written by every format version so far
+OLD_IDS = {DAGGER: 0, SHIELD: 1, GUANO: 2}
+
+
+def playthroughs():
+    """(commands, seed) pairs: the scripted tests and some seeded random walks"""
+    scripts = load_scripts(os.path.join(os.path.dirname(__file__), '..', 'test_playthrough.txt'))
+    result = [(replay.commands, seed) for replay in scripts for seed in (0, 1, 2)]
+    rng = random.Random(1)
+    for _ in range(6):
+        result.append(([rng.choice(COMMANDS) for _ in range(60)], rng.getrandbits(32)))
+    return result
+
+
+def record(commands, seed):
+    """Play commands; return the snapshot before each one, plus one at the end, and their events"""
+    output = EventOutput()
+    game = Game(output, RollStream(seed))
+    snapshots = [snapshot.dumps(game)]
+    events = []
+    for command in commands:
+        if not game.running:
+            break
+        start = len(output.log)
+        game.parse_command(command)
+        events.append(output.log[start:])
+        snapshots.append(snapshot.dumps(game))
+    return snapshots, events
+
+
+@pytest.mark.parametrize('commands, seed', playthroughs())
+def test_restore_at_every_step(commands, seed):
+    snapshots, events = record(commands, seed)
+    for step, data in enumerate(snapshots):
+        output = EventOutput()
+        game = snapshot.loads(data, output)
+        assert snapshot.dumps(game) == data
+        for later in range(step, len(events)):
+            start = len(output.log)
+            game.parse_command(commands[later])
+            assert output.log[start:] == events[later], (step, later, commands[later])
+            assert snapshot.dumps(game) == snapshots[later + 1], (step, later, commands[later])
+
+
+def _encode_old(game, version):
+    """Encode a game of the standard world in format version 1 or 2"""
+    world = game.world
+    flags = ((snapshot.FLAG_RUNNING if game.running else 0)
+             | (snapshot.FLAG_SHIELD if game.has_shield else 0)
+             | (snapshot.FLAG_IN_COMBAT if game.in_combat else 0)
+             | (snapshot.FLAG_SURPRISED if game.surprised_guardian else 0)
+             | (snapshot.FLAG_BAT_DEFEATED if game.bat_defeated else 0)
+             | (snapshot.ENEMY_IDS[game.combat_enemy] << snapshot.ENEMY_SHIFT))
+    values = [version, world.templates.index_of(game.current_room.key), flags,
+              game.player_hp, game.player_max_hp, game.guardian_hp, game.bat_hp]
+    if version == 1:
+        data = struct.pack('<BBB4h', *values)
+    else:
+        data = struct.pack('<BBB4hQI', *values, game.rng.seed, game.rng.position)
+    inventory = list(game.inventory)
+    data += bytes([len(inventory)] + [OLD_IDS[item] for item in inventory])
+    owned = game.rooms.maps[0] if game.rooms is not world.rooms else {}
+    changed = [(key, room.items) for key, room in owned.items() if tuple(room.items) != room.template.items]
+    data += bytes([len(changed)])
+    for key, items in changed:
+        data += bytes([world.templates.index_of(key), len(items)] + [OLD_IDS[item] for item in items])
+    return data
+
+
+def _state(game):
+    return (game.current_room.key, game.running, game.has_shield, game.in_combat, game.surprised_guardian,
+            game.bat_defeated, game.combat_enemy, game.player_hp, game.player_max_hp, game.guardian_hp,
+            game.bat_hp, list(game.inventory),
+            {key: list(room.items) for key, room in game.rooms.items() if room.items})
+
+
+@pytest.mark.parametrize('version', (1, 2))
+@pytest.mark.parametrize('commands, seed', playthroughs()[:3])
+def test_old_versions(version, commands, seed):
+    game = Game(EventOutput(), RollStream(seed))
+    for command in commands:
+        if not game.running:
+            break
+        game.parse_command(command)
+        restored = snapshot.loads(_encode_old(game, version))
+        assert _state(restored) == _state(game)
+        if version == 2:
+            assert (restored.rng.seed, restored.rng.position) == (game.rng.seed, game.rng.position)
+            assert snapshot.dumps(restored) == snapshot.dumps(game)
+
+
+def _played():
+    game = Game(EventOutput(), RollStream(3))
+    for command in ('north', 'take dagger', 'east', 'east', 'attack dagger'):
+        game.parse_command(command)
+    return game
+
+
+def test_truncated_snapshots_are_rejected():
+    data = snapshot.dumps(_played())
+    for end in range(len(data)):
+        with pytest.raises(snapshot.SnapshotError):
+            snapshot.loads(data[:end])
+
+
+def test_trailing_data_is_rejected():
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.loads(snapshot.dumps(_played()) + b'\0')
+
+
+def test_unknown_version_is_rejected():
+    data = snapshot.dumps(_played())
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.loads(bytes([99]) + data[1:])
+
+
+def test_unknown_item_id_is_rejected():
+    data = bytearray(snapshot.dumps(_played()))
+    # The inventory holds just the dagger, right after the header and its count
+    position = snapshot._header.size + snapshot._count.size
+    assert data[position] == OLD_IDS[DAGGER]
+    data[position] = snapshot.NAMED_ITEM - 1
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.loads(bytes(data))
+
+
+def test_bad_item_name_is_rejected():
+    data = bytearray(snapshot.dumps(_played()))
+    position = snapshot._header.size + snapshot._count.size
+    data[position:position + 1] = bytes([snapshot.NAMED_ITEM, 2, 0xff, 0xfe])
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.loads(bytes(data))
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.loads(bytes(data[:position + 3]))
+
+
+def test_world_file_items_are_saved_by_name(small_world):
+    game = Game(EventOutput(), RollStream(5), small_world)
+    game.inventory.add("test lantern")
+    game.own_room('colony').items.append("test crown \u2654")
+    data = snapshot.dumps(game)
+    restored = snapshot.loads(data, world=small_world)
+    assert list(restored.inventory) == ["test lantern"]
+    assert list(restored.rooms['colony'].items) == [SHIELD, "test crown \u2654"]
+    assert snapshot.dumps(restored) == data
+
+
+def test_unknown_room_is_rejected():
+    data = bytearray(snapshot.dumps(_played()))
+    struct.pack_into('<I', data, 1, 10**6)
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.loads(bytes(data))
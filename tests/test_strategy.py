@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+import snapshot
+import strategy
+from adventure import Game
+from conftest import make_small_world
+from dice import RollStream
+from output import NullOutput
+from rules import CombatRules
+
+COMMANDS = ('north', 'south', 'east', 'west', 'take dagger', 'take shield', 'use guano', 'attack',
+            'attack dagger', 'retreat')
+
+
+@pytest.fixture(scope='module')
+def small_table():
+    return strategy.solve(make_small_world())
+
+
+def _play_from(game, table, seed):
+    game.rng = RollStream(seed)
+    strategy.play(game, table)
+    return game.guardian_hp <= 0
+
+
+def test_standard_cave_is_always_won():
+    table = strategy.solve()
+    assert table.win_rate() == pytest.approx(1.0)
+    for seed in range(200):
+        game = Game(NullOutput(), RollStream(seed))
+        strategy.play(game, table)
+        assert game.guardian_hp <= 0, seed
+
+
+def test_parallel_solve_matches_serial(small_world):
+    serial = strategy.solve(small_world)
+    parallel = strategy.solve(small_world, processes=2)
+    assert serial.tables.keys() == parallel.tables.keys()
+    for key, (values, actions) in serial.tables.items():
+        other_values, other_actions = parallel.tables[key]
+        assert list(values) == list(other_values)
+        assert ([serial.actions[a] for a in actions]
+                == [parallel.actions[a] for a in other_actions])
+
+
+def test_win_rate_matches_play(small_world, small_table):
+    games = 2000
+    wins = sum(_play_from(Game(NullOutput(), world=small_world), small_table, seed) for seed in range(games))
+    # About 4.5 standard deviations
+    assert wins / games == pytest.approx(small_table.win_rate(), abs=0.03)
+
+
+def test_values_match_play_from_reached_states(small_world, small_table):
+    rng = random.Random(2)
+    checked = 0
+    while checked < 3:
+        game = Game(NullOutput(), RollStream(rng.getrandbits(32)), small_world)
+        for _ in range(rng.randint(2, 12)):
+            game.parse_command(rng.choice(COMMANDS))
+        if not game.running:
+            continue
+        value, _ = small_table.for_game(game)
+        if not 0.05 < value < 0.95:
+            continue
+        data = snapshot.dumps(game)
+        games = 1000
+        wins = sum(_play_from(snapshot.loads(data, world=small_world), small_table, seed)
+                   for seed in range(games))
+        assert wins / games == pytest.approx(value, abs=0.07)
+        checked += 1
+
+
+def test_rules_are_followed(small_world):
+    easy = strategy.solve(small_world, rules=CombatRules(guardian_hp=5))
+    hard = strategy.solve(small_world, rules=CombatRules(guardian_damage=(4, 10)))
+    standard = strategy.solve(small_world)
+    assert easy.win_rate() > standard.win_rate() > hard.win_rate()
@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from adventure import Game
+from dice import RollStream
+from output import NullOutput
+from rules import CombatRules
+from vecenv import BAT_DEFEATED, IN_COMBAT, SURPRISED, VecEnv
+
+
+def _env_state(env, i):
+    flags = env.flags[i]
+    inventory = sorted(item for k, item in enumerate(env.items) for _ in range(env.inventory[i] >> 4 * k & 0xf))
+    return (env.rooms[env.room[i]], env.player_hp[i], env.max_hp[i], env.guardian_hp[i], env.bat_hp[i],
+            bool(flags & IN_COMBAT), bool(flags & SURPRISED), bool(flags & BAT_DEFEATED),
+            env.rngs[i].position, inventory)
+
+
+def _game_state(game):
+    return (game.current_room.key, game.player_hp, game.player_max_hp, game.guardian_hp, game.bat_hp,
+            game.in_combat, game.surprised_guardian, game.bat_defeated, game.rng.position, sorted(game.inventory))
+
+
+def _lockstep(world=None, rules=None, episodes=300, seed=1):
+    """Play random actions in a VecEnv and in a Game side by side; return the outcomes"""
+    env = VecEnv(1, world=world, seed=seed, max_steps=10**9, rules=rules)
+    rng = random.Random(seed)
+    outcomes = {'won': 0, 'died': 0}
+    for episode in range(episodes):
+        env.reset()
+        game = Game(NullOutput(), RollStream(env.rngs[0].seed), world, rules)
+        for step in range(300):
+            action = rng.randrange(len(env.actions))
+            game.parse_command(env.actions[action])
+            _, rewards, dones = env.step([action])
+            if dones[0]:
+                assert not game.running, (episode, step)
+                outcome = 'won' if game.guardian_hp <= 0 else 'died'
+                assert rewards[0] == (1 if outcome == 'won' else -1)
+                outcomes[outcome] += 1
+                break
+            assert game.running, (episode, step)
+            assert _env_state(env, 0) == _game_state(game), (episode, step, env.actions[action])
+    return outcomes
+
+
+def test_matches_game():
+    outcomes = _lockstep()
+    assert outcomes['won'] and outcomes['died']
+
+
+def test_matches_game_with_other_rules():
+    rules = CombatRules(player_hp=14, dagger_damage=(3, 9), shield_bonus=2, guardian_hp=12, bat_damage=(1, 5))
+    outcomes = _lockstep(rules=rules)
+    assert outcomes['won'] and outcomes['died']
+
+
+def test_matches_game_in_another_world(small_world):
+    outcomes = _lockstep(small_world)
+    assert outcomes['won'] and outcomes['died']
+
+
+def test_games_are_independent():
+    env = VecEnv(8, seed=3)
+    env.reset()
+    single = VecEnv(1, seed=3)
+    single.reset()
+    single.rngs[0] = RollStream(env.rngs[5].seed)
+    rng = random.Random(4)
+    for _ in range(200):
+        actions = [rng.randrange(len(env.actions)) for _ in range(8)]
+        _, _, dones = env.step(actions)
+        single.step([actions[5]])
+        if dones[5]:
+            break
+        assert _env_state(env, 5) == _env_state(single, 0)
+
+
+def test_unknown_action():
+    env = VecEnv(1, seed=0)
+    env.reset()
+    with pytest.raises(ValueError):
+        env.step([len(env.actions)])
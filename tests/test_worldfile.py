@@ -0,0 +1,75 @@
+import pytest
+
+import worldfile
+from adventure import DEFAULT_WORLD, Game
+from dice import RollStream
+from output import EventOutput
+from worldfile import WorldFileError, compile_world, load_json, open_compiled
+
+COMMANDS = ('north', 'take dagger', 'west', 'west', 'south', 'east', 'south', 'take shield', 'look',
+            'north', 'east', 'north', 'east', 'north', 'attack dagger', 'attack dagger', 'attack dagger')
+
+
+@pytest.fixture
+def compiled(tmp_path):
+    path = tmp_path / 'caves.cave'
+    compile_world(load_json(DEFAULT_WORLD), path)
+    return path
+
+
+def _room(template):
+    return template.name, template.description, dict(template.exits), list(template.items)
+
+
+def test_round_trip(compiled):
+    source = load_json(DEFAULT_WORLD)
+    world = open_compiled(compiled)
+    assert world.start == source.start
+    assert world.roles == source.roles
+    assert sorted(world.templates) == sorted(source.templates)
+    for key in source.templates:
+        template = world.templates[key]
+        assert template.key == key
+        assert _room(template) == _room(source.templates[key])
+        assert world.templates.key_at(world.templates.index_of(key)) == key
+    assert 'no_such_room' not in world.templates
+    with pytest.raises(KeyError):
+        world.templates.index_of('no_such_room')
+
+
+def test_compiled_world_plays_the_same(compiled):
+    logs = []
+    for world in (load_json(DEFAULT_WORLD), open_compiled(compiled)):
+        output = EventOutput()
+        game = Game(output, RollStream(7), world)
+        for command in COMMANDS:
+            game.parse_command(command)
+        logs.append(output.log)
+    assert logs[0] == logs[1]
+
+
+def test_truncated_file_is_rejected(compiled, tmp_path):
+    data = compiled.read_bytes()
+    path = tmp_path / 'short.cave'
+    for end in (0, 4, worldfile._header.size - 1):
+        path.write_bytes(data[:end])
+        with pytest.raises(WorldFileError):
+            open_compiled(path)
+
+
+def test_not_a_compiled_file(tmp_path):
+    path = tmp_path / 'other.cave'
+    path.write_bytes(b'JUNK' + bytes(100))
+    with pytest.raises(WorldFileError):
+        open_compiled(path)
+
+
+def test_full_hash_table_does_not_hang(compiled):
+    # A corrupt table with no empty slot: lookups of missing keys must still end
+    world = open_compiled(compiled)
+    table = world.templates
+    data = bytearray(compiled.read_bytes())
+    for slot in range(table._slots):
+        worldfile._slot.pack_into(data, table._table + slot * worldfile._slot.size, 1)
+    compiled.write_bytes(bytes(data))
+    assert 'no_such_room' not in open_compiled(compiled).templates
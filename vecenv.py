@@ -0,0 +1,249 @@
+"""
+Cave Adventure - Vectorized Environment
+
+A reset()/step() interface for training play-testing agents that runs N
+games in lockstep. Instead of N Game objects, the state of every game
+lives in one typed array per field (room, HP, inventory, ...), and one
+step() call advances all of them. The rules are those of Game.move,
+attack, take, use and retreat, including the order of dice rolls, so a
+game seeded the same way plays out identically in both.
+
+Actions are small integers indexing VecEnv.actions: the eight directions,
+"take <item>" for every item in the world, "use <item>" for every item
+that heals (the bat's guano at least), "attack", "attack <item>" for every
+weapon and "retreat". What items do comes from their definitions (see
+items.py). An action the game would refuse (walking into a wall,
+attacking outside a fight) leaves the game unchanged, just like the
+command would.
+
+Observations are kept as a struct of arrays too: a tuple of one array per
+field in OBS_FIELDS order, so obs[k][i] is field OBS_FIELDS[k] of game i.
+They are copies, so they stay valid after the next step.
+
+Rewards are +1 for winning and -1 for dying. A game that ends, or runs
+for max_steps, reports done and is reset in the same step, so the
+observation returned for it is the first of its next episode.
+"""
+
+import random
+from array import array
+
+from adventure import get_world
+from dice import RollStream
+from items import GUANO, ITEMS
+from rules import STANDARD_RULES
+
+DIRECTIONS = ('north', 'south', 'east', 'west', 'down', 'up', 'forward', 'back')
+
+OBS_FIELDS = ('room', 'player_hp', 'max_hp', 'guardian_hp', 'bat_hp', 'inventory', 'room_items', 'flags')
+OBS_SIZE = len(OBS_FIELDS)
+
+# Bits of the flags field
+IN_COMBAT = 0x01
+FIGHTING_BAT = 0x02     # set with IN_COMBAT when the enemy is the bat
+SURPRISED = 0x04
+BAT_DEFEATED = 0x08
+HAS_SHIELD = 0x10
+
+# Kinds of room, for the move table
+_PLAIN, _TRAP, _BAT, _LAIR, _LAIR_BACK = range(5)
+
+
+class VecEnv:
+    """N games of Cave Adventure stepped together
+
+    inventory holds 4 bits per item kind (a count, in VecEnv.items order);
+    room_items has one bit per item that started in a room and is still
+    there. Pass a seed to make every episode reproducible, and CombatRules
+    to play by other rules than the standard ones.
+    """
+    def __init__(self, n, world=None, seed=None, max_steps=1000, rules=None):
+        self.n = n
+        self.world = world = world if world is not None else get_world()
+        self.rules = rules if rules is not None else STANDARD_RULES
+        self.max_steps = max_steps
+        self._seeds = random.Random(seed)
+
+        templates = world.templates
+        keys = list(templates)
+        index = {key: i for i, key in enumerate(keys)}
+        self.rooms = keys
+        self.start = index[world.start]
+        roles = world.roles
+        kind = [_PLAIN] * len(keys)
+        for role, room_kind in (('trap', _TRAP), ('bat', _BAT), ('lair', _LAIR), ('lair_back', _LAIR_BACK)):
+            if role in roles:
+                kind[index[roles[role]]] = room_kind
+        self._lair_exit = index[roles['lair_exit']] if 'lair_exit' in roles else 0
+        self._bat_exit = index[roles['bat_exit']] if 'bat_exit' in roles else 0
+
+        # Items: slots are (room, item) in starting order; kinds are distinct names
+        self.slots = [(index[key], item) for key in keys for item in templates[key].items]
+        self.items = sorted({item for _, item in self.slots} | {GUANO})
+        item_index = {item: i for i, item in enumerate(self.items)}
+        self._guano_shift = 4 * item_index[GUANO]
+        self._full_items = sum(1 << bit for bit in range(len(self.slots)))
+        healing = [item for item in self.items if ITEMS[item].heals]
+        weapons = [item for item in self.items if ITEMS[item].damage_for(self.rules) is not None]
+
+        self.actions = list(DIRECTIONS)
+        self.actions += [f"take {item}" for item in self.items if any(item == name for _, name in self.slots)]
+        self.actions += [f"use {item}" for item in healing]
+        self.actions += ["attack"] + [f"attack {item}" for item in weapons] + ["retreat"]
+        self._directions = len(DIRECTIONS)
+        # Every command names its item in full, so take() finds exactly
+        # that item: (bit, room, inventory shift, max HP bonus) of every
+        # slot it could be taken from, the first one present is taken
+        self._take = {}
+        for item in self.items:
+            if f"take {item}" in self.actions:
+                bonus = ITEMS[item].hp_bonus_for(self.rules)
+                self._take[self.actions.index(f"take {item}")] = [
+                    (bit, room, 4 * item_index[item], bonus)
+                    for bit, (room, name) in enumerate(self.slots) if name == item]
+        # Inventory shift of the item used, or of the weapon attacked with
+        self._use = {self.actions.index(f"use {item}"): 4 * item_index[item] for item in healing}
+        self._attack = self.actions.index("attack")
+        self._weapons = {self.actions.index(f"attack {item}"): (4 * item_index[item],
+                                                                 ITEMS[item].damage_for(self.rules))
+                         for item in weapons}
+        self._retreat = self.actions.index("retreat")
+
+        # (destination, kind of destination) for every room and direction, or None
+        self._moves = []
+        for key in keys:
+            exits = templates[key].exits
+            for direction in DIRECTIONS:
+                target = exits.get(direction)
+                self._moves.append(None if target is None else (index[target], kind[index[target]]))
+
+        # Starting values come from a fresh Game so they always match it
+        from adventure import Game
+        from output import NullOutput
+        game = Game(NullOutput(), world=world, rules=self.rules)
+        self._initial = (game.player_hp, game.player_max_hp, game.guardian_hp, game.bat_hp)
+
+        self.room = array('H', [0]) * n
+        self.player_hp = array('h', [0]) * n
+        self.max_hp = array('h', [0]) * n
+        self.guardian_hp = array('h', [0]) * n
+        self.bat_hp = array('h', [0]) * n
+        self.inventory = array('Q', [0]) * n
+        self.room_items = array('Q', [0]) * n
+        self.flags = array('B', [0]) * n
+        self.steps = array('I', [0]) * n
+        self.rngs = [None] * n
+        self.rewards = array('b', [0]) * n
+        self.dones = bytearray(n)
+
+    def _reset_one(self, i):
+        self.room[i] = self.start
+        self.player_hp[i], self.max_hp[i], self.guardian_hp[i], self.bat_hp[i] = self._initial
+        self.inventory[i] = 0
+        self.room_items[i] = self._full_items
+        self.flags[i] = 0
+        self.steps[i] = 0
+        self.rngs[i] = RollStream(self._seeds.getrandbits(64))
+
+    def reset(self):
+        """Start a new episode in every game and return the observations"""
+        for i in range(self.n):
+            self._reset_one(i)
+        return self.observe()
+
+    def observe(self):
+        """Return the observations of every game, one array per field"""
+        return tuple(getattr(self, field)[:] for field in OBS_FIELDS)
+
+    def step(self, actions):
+        """Apply one action per game; return (observations, rewards, dones)"""
+        room, player_hp, max_hp = self.room, self.player_hp, self.max_hp
+        guardian_hp, bat_hp = self.guardian_hp, self.bat_hp
+        inventory, room_items, flags = self.inventory, self.room_items, self.flags
+        steps, rngs, rewards, dones = self.steps, self.rngs, self.rewards, self.dones
+        moves, directions = self._moves, self._directions
+        take, use, attack, weapons, retreat = (self._take, self._use, self._attack,
+                                               self._weapons, self._retreat)
+        guano_shift = self._guano_shift
+        max_steps = self.max_steps
+        rules = self.rules
+        bare_hands_damage = rules.bare_hands_damage
+        guardian_damage, bat_damage = rules.guardian_damage, rules.bat_damage
+
+        for i, action in enumerate(actions):
+            reward = 0
+            flag = flags[i]
+            if action < directions:
+                if not flag & IN_COMBAT:
+                    move = moves[room[i] * directions + action]
+                    if move is not None:
+                        target, kind = move
+                        if kind == _TRAP:
+                            reward = -1
+                        else:
+                            room[i] = target
+                            if kind == _BAT and not flag & BAT_DEFEATED:
+                                flags[i] = flag | IN_COMBAT | FIGHTING_BAT
+                            elif kind == _LAIR:
+                                flags[i] = flag | IN_COMBAT
+                            elif kind == _LAIR_BACK:
+                                flags[i] = flag | IN_COMBAT | SURPRISED
+            elif action in take:
+                items = room_items[i]
+                here = room[i]
+                for bit, item_room, shift, bonus in take[action]:
+                    if item_room == here and items >> bit & 1:
+                        room_items[i] = items & ~(1 << bit)
+                        inventory[i] += 1 << shift
+                        if bonus:
+                            flags[i] = flag | HAS_SHIELD
+                            max_hp[i] += bonus
+                            player_hp[i] += bonus
+                        break
+            elif action in use:
+                shift = use[action]
+                if inventory[i] >> shift & 0xf and player_hp[i] < max_hp[i]:
+                    player_hp[i] = max_hp[i]
+                    inventory[i] -= 1 << shift
+            elif action == attack or action in weapons:
+                if flag & IN_COMBAT:
+                    rng = rngs[i]
+                    weapon = weapons.get(action)
+                    if weapon is not None and inventory[i] >> weapon[0] & 0xf:
+                        dealt = rng.randint(*weapon[1])
+                    else:
+                        dealt = rng.randint(*bare_hands_damage)
+                    if flag & FIGHTING_BAT:
+                        left = bat_hp[i] = bat_hp[i] - dealt
+                        if left <= 0:
+                            inventory[i] += 1 << guano_shift
+                            flags[i] = flag & ~(IN_COMBAT | FIGHTING_BAT) | BAT_DEFEATED
+                        else:
+                            hp = player_hp[i] = player_hp[i] - rng.randint(*bat_damage)
+                            if hp <= 0:
+                                reward = -1
+                    else:
+                        left = guardian_hp[i] = guardian_hp[i] - dealt
+                        if left <= 0:
+                            reward = 1
+                        elif flag & SURPRISED:
+                            flags[i] = flag & ~SURPRISED
+                        else:
+                            hp = player_hp[i] = player_hp[i] - rng.randint(*guardian_damage)
+                            if hp <= 0:
+                                reward = -1
+            elif action == retreat:
+                if flag & IN_COMBAT:
+                    room[i] = self._bat_exit if flag & FIGHTING_BAT else self._lair_exit
+                    flags[i] = flag & ~(IN_COMBAT | FIGHTING_BAT)
+            else:
+                raise ValueError(f"Unknown action: {action}")
+
+            rewards[i] = reward
+            count = steps[i] = steps[i] + 1
+            if reward or count >= max_steps:
+                dones[i] = 1
+                self._reset_one(i)
+            else:
+                dones[i] = 0
+        return self.observe(), rewards, dones
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Cave Adventure - World Files
+
+Caves are described in JSON (see caves.json) and can be compiled into a
+binary .cave file that is memory-mapped rather than parsed. Opening a
+compiled world costs the same however many rooms it has: rooms are found
+through a hash table in the file and only decoded when a game first
+looks at them, and a room's description is only decoded when it is
+shown. Every process that opens the same file shares its pages through
+the OS page cache.
+
+JSON format:
+
+    {"start": "<room key>",
+     "roles": {"trap": "<room key>", ...},      (see World.roles)
+     "rooms": {"<room key>": {"name": "...", "description": "...",
+                              "exits": {"<direction>": "<room key>"},
+                              "items": ["..."]}},
+     "items": {"<item name>": {"damage": [low, high],
+                               "max_hp_bonus": n, "heals": true,
+                               "aliases": ["..."]}}}
+
+The "items" section is optional and defines what the world's own items
+do (see items.py); damage and max_hp_bonus may also name a CombatRules
+field such as "dagger_damage". Items it leaves out do nothing special.
+
+Compiled layout (little endian, string references are offset/length pairs
+into the string area):
+
+    header   4s magic "CAVE", H version, H role count, I room count,
+             I start room number, I hash table slots, 5I section offsets
+             (exits, items, hash table, roles, strings), then (version 2)
+             a string reference to the item definitions as JSON
+    rooms    one fixed-size record per room, by room number: key, name,
+             description, first exit and exit count, first item and item count
+    exits    direction, destination room number
+    items    item name
+    hash     FNV-1a of the room key -> room number + 1 (0 = empty slot),
+             open addressing with linear probing
+    roles    role name, room number
+    strings  UTF-8 text
+"""
+
+import json
+import mmap
+import struct
+
+from adventure import RoomTable, RoomTemplate, World
+from items import ITEMS, Item
+from rules import FIELDS, RANGES
+
+MAGIC = b'CAVE'
+VERSION = 2
+
+_prefix = struct.Struct('<4sH')
+_header_v1 = struct.Struct('<4sHHIII5I')
+_header = struct.Struct('<4sHHIII5III')
+_room = struct.Struct('<IHIHIIIHIH')
+_exit = struct.Struct('<IHI')
+_item = struct.Struct('<IH')
+_slot = struct.Struct('<I')
+_role = struct.Struct('<IHI')
+
+
+class WorldFileError(ValueError):
+    """Raised when a world file cannot be read or compiled"""
+
+
+def _hash(data):
+    """FNV-1a, 32 bit"""
+    h = 0x811c9dc5
+    for byte in data:
+        h = ((h ^ byte) * 0x01000193) & 0xffffffff
+    return h
+
+
+def _parse_item(name, spec):
+    """Build an Item from its definition in a world file, checking every property"""
+    damage = spec.get('damage')
+    if isinstance(damage, list):
+        damage = tuple(damage)
+    if not (damage is None or damage in RANGES
+            or (isinstance(damage, tuple) and len(damage) == 2
+                and all(type(value) is int for value in damage) and 1 <= damage[0] <= damage[1])):
+        raise ValueError(f"bad damage {spec.get('damage')!r}")
+    bonus = spec.get('max_hp_bonus', 0)
+    if not (bonus in FIELDS and bonus not in RANGES or type(bonus) is int and bonus >= 0):
+        raise ValueError(f"bad max_hp_bonus {bonus!r}")
+    heals = spec.get('heals', False)
+    aliases = spec.get('aliases', [])
+    if type(heals) is not bool or not all(isinstance(alias, str) for alias in aliases):
+        raise ValueError("bad heals or aliases")
+    return Item(name, aliases, damage, bonus, heals)
+
+
+def define_items(definitions, path):
+    """Register the items a world file defines"""
+    if not isinstance(definitions, dict):
+        raise WorldFileError(f"{path}: items must be an object")
+    for name, spec in definitions.items():
+        try:
+            if not isinstance(spec, dict):
+                raise ValueError("not an object")
+            ITEMS.define(_parse_item(name, spec))
+        except ValueError as e:
+            raise WorldFileError(f"{path}: item {name!r}: {e}") from None
+
+
+def _definition(item):
+    """Return the world file definition of an Item, or None if it does nothing special"""
+    spec = {}
+    if item.aliases:
+        spec['aliases'] = list(item.aliases)
+    if item.damage is not None:
+        spec['damage'] = item.damage if isinstance(item.damage, str) else list(item.damage)
+    if item.max_hp_bonus:
+        spec['max_hp_bonus'] = item.max_hp_bonus
+    if item.heals:
+        spec['heals'] = True
+    return spec or None
+
+
+def load_json(path):
+    """Read a world from a JSON file"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    define_items(data.get('items', {}), path)
+    try:
+        rooms = {key: RoomTemplate(room['name'], room['description'],
+                                   room.get('exits'), room.get('items'))
+                 for key, room in data['rooms'].items()}
+        world = World(rooms, data['start'], data.get('roles'))
+    except (KeyError, TypeError) as e:
+        raise WorldFileError(f"{path}: missing or malformed field {e}") from None
+    _check(world, path)
+    return world
+
+
+def _check(world, path):
+    templates = world.templates
+    if world.start not in templates:
+        raise WorldFileError(f"{path}: unknown start room {world.start!r}")
+    for role, key in world.roles.items():
+        if key not in templates:
+            raise WorldFileError(f"{path}: role {role!r} names unknown room {key!r}")
+    for key in templates:
+        for direction, target in templates[key].exits.items():
+            if target not in templates:
+                raise WorldFileError(f"{path}: exit {direction!r} of {key!r} leads to unknown room {target!r}")
+
+
+class CompiledRoomTable(RoomTable):
+    """Room templates read on demand from a compiled world file"""
+    def __init__(self, data):
+        self._data = data
+        magic, version = _prefix.unpack_from(data)
+        if magic != MAGIC:
+            raise WorldFileError("Not a compiled world file")
+        if version == 1:
+            header = _header_v1
+            self._definitions = (0, 0)
+        elif version == VERSION:
+            header = _header
+            self._definitions = header.unpack_from(data)[-2:]
+        else:
+            raise WorldFileError(f"Unsupported world file version: {version}")
+        (_, _, self._role_count, self._count, self._start, self._slots,
+         self._exits, self._items, self._table, self._roles, self._strings) = header.unpack_from(data)[:11]
+        self._rooms_at = header.size
+        self._templates = {}
+
+    def _string(self, offset, length):
+        start = self._strings + offset
+        return str(self._data[start:start + length], 'utf-8')
+
+    def __getitem__(self, key):
+        return self.template_at(self.index_of(key))
+
+    def __iter__(self):
+        return map(self.key_at, range(self._count))
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def _find(self, key):
+        data = self._data
+        encoded = key.encode('utf-8')
+        mask = self._slots - 1
+        slot = _hash(encoded) & mask
+        # A well-formed table always has an empty slot; a corrupt one may not
+        for _ in range(self._slots):
+            entry = _slot.unpack_from(data, self._table + slot * _slot.size)[0]
+            if not entry:
+                return None
+            index = entry - 1
+            offset, length = _room.unpack_from(data, self._rooms_at + index * _room.size)[:2]
+            start = self._strings + offset
+            if data[start:start + length] == encoded:
+                return index
+            slot = (slot + 1) & mask
+        return None
+
+    def key_at(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._string(*_room.unpack_from(self._data, self._rooms_at + index * _room.size)[:2])
+
+    def index_of(self, key):
+        index = self._find(key)
+        if index is None:
+            raise KeyError(key)
+        return index
+
+    def template_at(self, index):
+        """Return the template of room number index, decoding it on first use"""
+        template = self._templates.get(index)
+        if template is None:
+            data = self._data
+            (key_off, key_len, name_off, name_len, desc_off, desc_len,
+             first_exit, exit_count, first_item, item_count) = _room.unpack_from(data, self._rooms_at + index * _room.size)
+            exits = {}
+            for i in range(first_exit, first_exit + exit_count):
+                offset, length, target = _exit.unpack_from(data, self._exits + i * _exit.size)
+                exits[self._string(offset, length)] = self.key_at(target)
+            items = [self._string(*_item.unpack_from(data, self._items + i * _item.size))
+                     for i in range(first_item, first_item + item_count)]
+            start = self._strings + desc_off
+            template = RoomTemplate(self._string(name_off, name_len), (data, start, start + desc_len),
+                                    exits, items, self._string(key_off, key_len))
+            self._templates[index] = template
+        return template
+
+    def start(self):
+        return self.key_at(self._start)
+
+    def roles(self):
+        roles = {}
+        for i in range(self._role_count):
+            offset, length, index = _role.unpack_from(self._data, self._roles + i * _role.size)
+            roles[self._string(offset, length)] = self.key_at(index)
+        return roles
+
+    def item_definitions(self):
+        """Return the world's item definitions, as in the JSON format"""
+        offset, length = self._definitions
+        return json.loads(self._string(offset, length)) if length else {}
+
+
+def open_compiled(path):
+    """Memory-map a compiled world file"""
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise WorldFileError(f"{path}: empty file") from None
+    try:
+        templates = CompiledRoomTable(data)
+        definitions = templates.item_definitions()
+    except (struct.error, ValueError):
+        raise WorldFileError(f"{path}: truncated world file") from None
+    define_items(definitions, path)
+    return World(templates, templates.start(), templates.roles())
+
+
+def load_world(path):
+    """Read a world from a compiled .cave file or a JSON file"""
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        return open_compiled(path)
+    return load_json(path)
+
+
+def compile_world(world, path):
+    """Write a world to path in the compiled format"""
+    templates = world.templates
+    keys = list(templates)
+    index = {key: i for i, key in enumerate(keys)}
+    strings = bytearray()
+    offsets = {}
+
+    def ref(text):
+        encoded = text.encode('utf-8')
+        offset = offsets.get(encoded)
+        if offset is None:
+            offset = offsets[encoded] = len(strings)
+            strings.extend(encoded)
+        return offset, len(encoded)
+
+    rooms, exits, items = bytearray(), bytearray(), bytearray()
+    definitions = {}
+    for key in keys:
+        template = templates[key]
+        first_exit, first_item = len(exits) // _exit.size, len(items) // _item.size
+        for direction, target in template.exits.items():
+            exits += _exit.pack(*ref(direction), index[target])
+        for item in template.items:
+            items += _item.pack(*ref(item))
+            if item not in definitions:
+                definitions[item] = _definition(ITEMS[item])
+        rooms += _room.pack(*ref(key), *ref(template.name), *ref(template.description),
+                            first_exit, len(template.exits), first_item, len(template.items))
+
+    slots = 1
+    while slots < 2 * len(keys):
+        slots *= 2
+    table = [0] * slots
+    for i, key in enumerate(keys):
+        slot = _hash(key.encode('utf-8')) & (slots - 1)
+        while table[slot]:
+            slot = (slot + 1) & (slots - 1)
+        table[slot] = i + 1
+    table = struct.pack(f'<{slots}I', *table)
+
+    roles = b''.join(_role.pack(*ref(role), index[key]) for role, key in world.roles.items())
+    definitions = {name: spec for name, spec in definitions.items() if spec is not None}
+    definitions = ref(json.dumps(definitions, separators=(',', ':'))) if definitions else (0, 0)
+
+    exits_at = _header.size + len(rooms)
+    items_at = exits_at + len(exits)
+    table_at = items_at + len(items)
+    roles_at = table_at + len(table)
+    strings_at = roles_at + len(roles)
+    header = _header.pack(MAGIC, VERSION, len(world.roles), len(keys), index[world.start], slots,
+                          exits_at, items_at, table_at, roles_at, strings_at, *definitions)
+    with open(path, 'wb') as f:
+        f.write(b''.join([header, rooms, exits, items, table, roles, strings]))
+
+
+def main():
+    """Compile a JSON world into a .cave file"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile a Cave Adventure world file")
+    parser.add_argument('source', help="JSON world file")
+    parser.add_argument('output', nargs='?', help="compiled file (default: source with .cave extension)")
+    args = parser.parse_args()
+
+    output = args.output or args.source.rsplit('.', 1)[0] + '.cave'
+    world = load_json(args.source)
+    compile_world(world, output)
+    print(f"Compiled {len(world.templates)} rooms into {output}")
+
+
+if __name__ == "__main__":
+    main()